@@ -6,17 +6,61 @@
 
 import streamlit as st
 import io
+import json
 import pandas as pd
 from bridge import (
-    raw_file,
-    act8_fil,
-    generate_bridge_excel,
-    action2, action3, action5, action6,
-    action7, action9, action15, action16,
-    action17, action18, action19, action20, action21, action22,
-    make_RAW2, run_action8m_and_raw3
+    RULES, ACTIONS_7_22,
+    load_workbook, profile_call, run_pipeline, run_report, workbook_bytes, workbook_digest
 )
 
+# Results are shared across sessions and users. Each cache is keyed by the
+# digests of the uploads it depends on plus the rule-set version, keeps at
+# most CACHE_ENTRIES results and drops them after CACHE_TTL (parsed
+# workbooks are also kept on disk, see bridge.CACHE_MAX_BYTES).
+CACHE_TTL = "12h"
+CACHE_ENTRIES = 8
+
+# Profiling panel columns: stage record field -> heading
+PROFILE_COLUMNS = {
+    "stage": "Stage", "function": "Function", "start": "Start (s)", "wall": "Wall (s)",
+    "cpu": "CPU (s)", "memory": "Memory (MB)", "rows_in": "Rows In", "rows_out": "Rows Out",
+    "cache": "Cache",
+}
+
+
+# The stages below fill `_profile` (not part of the cache keys) with a record
+# per stage they run (see bridge.run_report); on a cache hit they run nothing.
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_ENTRIES, show_spinner=False)
+def parsed_workbook(digest, _data, _profile=None, _stage="read"):
+    """Parsing stage: the upload as a DataFrame."""
+    return profile_call(_profile, _stage, load_workbook, _data)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_ENTRIES, show_spinner=False)
+def raw_actions(raw_digest, rules_version, _raw_data, _profile=None):
+    """Action 7-22 stages: they read RAW only, so any Action 8 upload reuses them."""
+    RAW_loaded = parsed_workbook(raw_digest, _raw_data, _profile, "read RAW")
+    results = run_pipeline({"RAW_loaded": RAW_loaded}, targets=ACTIONS_7_22, profile=_profile)
+    return {name: results[name] for name in ACTIONS_7_22}
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_ENTRIES, show_spinner=False)
+def bridge_outputs(raw_digest, act8_digest, rules_version, _raw_data, _act8_data, _profile=None):
+    """Actions 2/3/5/6, the counts and the Excel/Parquet/CSV files of an upload pair."""
+    inputs = {
+        "RAW_loaded": parsed_workbook(raw_digest, _raw_data, _profile, "read RAW"),
+        "ACT8_loaded": parsed_workbook(act8_digest, _act8_data, _profile, "read ACT8"),
+        **raw_actions(raw_digest, rules_version, _raw_data, _profile),
+    }
+    results = run_pipeline(inputs, targets=["counts", "excel", "parquet", "csv"], profile=_profile)
+    return {
+        "counts": results["counts"],
+        "excel": results["excel"].getvalue(),
+        "parquet": results["parquet"].getvalue(),
+        "csv": results["csv"].getvalue(),
+    }
+
+
 st.set_page_config(page_title="Iowa DOT Bridge Metrics", layout="wide")
 st.title("Iowa DOT Bridge Metrics")
 st.text("Upload the RAW and Action 8 Excel files.\nClick Run.")
@@ -36,73 +80,38 @@ if st.button("Run"):
         st.error("Please upload both files before running.")
     else:
         with st.spinner("Processing..."):
-            RAW_loaded = pd.read_excel(raw_file_uploader)
-            ACT8_loaded = pd.read_excel(act8_file_uploader)
-
-            RAW = raw_file(RAW_loaded)
-            ACT8 = act8_fil(ACT8_loaded)
-
-            ACT7 = action7(RAW)
-            ACT9_F = action9(RAW)
-            ACT9_CT_S = len(ACT9_F[ACT9_F["Standard/Non-Standard"] == "Standard"])
-            ACT9_CT_NS = len(ACT9_F[ACT9_F["Standard/Non-Standard"] == "Non-Standard"])
-            ACT15_F = action15(RAW)
-            ACT16_F = action16(RAW)
-            ACT17_F = action17(RAW)
-            ACT18_F = action18(RAW)
-            ACT19_F = action19(RAW)
-            ACT19_CT_SD = len(ACT19_F[ACT19_F["Action 19 Sub-Category"] == "Severe Deterioration"])
-            ACT19_CT_SB = len(ACT19_F[ACT19_F["Action 19 Sub-Category"] == "Standard Bridge"])
-            ACT19_CT_BLT = len(ACT19_F[ACT19_F["Action 19 Sub-Category"] == "Bridge was load tested."])
-            ACT19_CT_NP = len(ACT19_F[ACT19_F["Action 19 Sub-Category"] == "Not Permitted"])
-            ACT20 = action20(RAW)
-            ACT21 = action21(RAW)
-            ACT22_F = action22(RAW)
-
-            RAW2, _ = make_RAW2(
-                RAW.copy(), ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F,
-                ACT17_F, ACT18_F, ACT19_F, ACT20, ACT21, ACT22_F
+            raw_data = workbook_bytes(raw_file_uploader)
+            act8_data = workbook_bytes(act8_file_uploader)
+
+            # Stages run as soon as their inputs are ready (Actions 7-22 side by
+            # side, the RAW2 and RAW3 branches in parallel, then the exports);
+            # cached stages are skipped
+            profile = {}
+            results = bridge_outputs(
+                workbook_digest(raw_data), workbook_digest(act8_data), RULES["version"],
+                raw_data, act8_data, profile
             )
 
-            ACT2 = action2(RAW2)
-            ACT3 = action3(RAW2)
-
-            ACT8M, RAW3 = run_action8m_and_raw3(RAW.copy(), ACT8.copy())
-
-            ACT5 = action5(RAW3)
-            ACT6 = action6(RAW3)
-
-            excel_file = generate_bridge_excel(
-                RAW, RAW2, RAW3,
-                ACT2, ACT3, ACT5, ACT6,
-                ACT7, ACT8, ACT9_F, ACT9_CT_S, ACT9_CT_NS,
-                ACT15_F, ACT16_F, ACT17_F, ACT18_F,
-                ACT19_F, ACT19_CT_SB, ACT19_CT_SD, ACT19_CT_NP, ACT19_CT_BLT,
-                ACT20, ACT21, ACT22_F
+            # A cached step left no stage records behind
+            cached = {
+                "RAW upload parsed": "read RAW",
+                "Action 8 upload parsed": "read ACT8",
+                "Actions 7-22": "ACT7",
+                "Outputs": "counts",
+            }
+            report = run_report(
+                profile,
+                raw=raw_file_uploader.name, act8=act8_file_uploader.name,
+                counts=results["counts"],
+                cache={step: "miss" if stage in profile else "hit" for step, stage in cached.items()},
             )
 
             # Save everything in session state
-            st.session_state.excel_file = excel_file
-            st.session_state.counts = {
-                "Action 2": len(ACT2),
-                "Action 3": len(ACT3),
-                "Action 5": len(ACT5),
-                "Action 6": len(ACT6),
-                "Action 7": len(ACT7),
-                "Action 8 (Uploaded)": len(ACT8),
-                "Action 9": len(ACT9_F),
-                "Action 15": len(ACT15_F),
-                "Action 16": len(ACT16_F),
-                "Action 17": len(ACT17_F),
-                "Action 18": len(ACT18_F),
-                "Action 19": len(ACT19_F),
-                "Action 20": len(ACT20),
-                "Action 21": len(ACT21),
-                "Action 22": len(ACT22_F),
-                "RAW (Original)": len(RAW),
-                "RAW2 (RAW - Actions 7-22)": len(RAW2),
-                "RAW3 (RAW - Action 8)": len(RAW3)
-            }
+            st.session_state.excel_file = results["excel"]
+            st.session_state.parquet_file = results["parquet"]
+            st.session_state.csv_file = results["csv"]
+            st.session_state.counts = results["counts"]
+            st.session_state.report = report
             st.session_state.results_ready = True
 
         st.success("Processing complete!")
@@ -124,3 +133,32 @@ if st.session_state.results_ready:
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
+    st.download_button(
+        label="Download Bridge Metrics Parquet (zip)",
+        data=st.session_state.parquet_file,
+        file_name="Bridge_Metrics_Output_parquet.zip",
+        mime="application/zip"
+    )
+
+    st.download_button(
+        label="Download Bridge Metrics CSV (zip)",
+        data=st.session_state.csv_file,
+        file_name="Bridge_Metrics_Output_csv.zip",
+        mime="application/zip"
+    )
+
+    # Where the time and memory went: parsing, the regex-heavy actions or the writers
+    report = st.session_state.report
+    with st.expander("Profiling"):
+        st.text(f"Wall {report['wall']:.2f}s, CPU {report['cpu']:.2f}s over {len(report['stages'])} stages")
+        st.table(pd.DataFrame(list(report["cache"].items()), columns=["Step", "Streamlit Cache"]))
+        stages = pd.DataFrame(report["stages"], columns=list(PROFILE_COLUMNS))
+        stages["memory"] = pd.to_numeric(stages["memory"]) / (1024 * 1024)
+        st.dataframe(stages.rename(columns=PROFILE_COLUMNS), hide_index=True)
+
+        st.download_button(
+            label="Download Run Report (JSON)",
+            data=json.dumps(report, indent=2),
+            file_name="Bridge_Metrics_Run_Report.json",
+            mime="application/json"
+        )
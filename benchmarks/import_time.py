@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Cold import time of bridge, each run in a fresh interpreter.
+
+    python benchmarks/import_time.py [--budget SECONDS] [--runs N]
+
+Measures `import bridge` on top of pandas and numpy (which the rule
+engine needs anyway) and exits with status 1 if:
+- the best of the runs takes longer than the budget
+  (default 0.1s, or BRIDGE_IMPORT_BUDGET)
+- importing bridge loads a dependency that must be imported lazily, on
+  first use (LAZY_MODULES)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded only by the code that needs them (Excel writers and readers, UI, CLI)
+LAZY_MODULES = [
+    "streamlit", "openpyxl", "xlsxwriter", "xlrd", "python_calamine",
+    "multiprocessing", "argparse",
+]
+
+# Run in a fresh interpreter: time `import bridge` after pandas/numpy
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import numpy, pandas
+t1 = time.perf_counter()
+base = set(sys.modules)
+import bridge
+t2 = time.perf_counter()
+print(json.dumps({
+    "pandas": t1 - t0,
+    "bridge": t2 - t1,
+    "loaded": sorted(set(sys.modules) - base),
+}))
+"""
+
+
+def measure():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=float(os.environ.get("BRIDGE_IMPORT_BUDGET", 0.1)),
+                        help="seconds allowed for import bridge on top of pandas/numpy")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = [measure() for _ in range(args.runs)]
+    best = min(run["bridge"] for run in runs)
+    pandas_time = min(run["pandas"] for run in runs)
+    eager = sorted({
+        name.split(".")[0] for run in runs for name in run["loaded"]
+        if name.split(".")[0] in LAZY_MODULES
+    })
+
+    print(f"pandas + numpy: {pandas_time:.3f}s")
+    print(f"bridge:         {best:.3f}s (budget {args.budget:.3f}s, best of {args.runs})")
+    failed = False
+    if best > args.budget:
+        print("FAIL: import bridge is over budget")
+        failed = True
+    if eager:
+        print(f"FAIL: imported at load instead of on first use: {', '.join(eager)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Peak memory of a full bridge run, in a fresh interpreter.
+
+    python benchmarks/peak_memory.py [--raw RAW.xlsx --act8 ACT8.xlsx | --rows N] [--ratio N]
+
+Loads both workbooks (or generates synthetic inputs of --rows RAW rows,
+default 10000, see benchmarks/synthetic.py), then runs the whole pipeline (counts, Excel,
+Parquet and CSV) and measures how far the resident set grows above what
+it was once the inputs were loaded. Exits with status 1 if that growth
+is more than:
+- `ratio` times the in-memory size of the two input frames (default 6,
+  or BRIDGE_MEMORY_RATIO)
+- plus `base` MB the run needs whatever the input (thread stacks, the
+  allocator's arenas; default 32, or BRIDGE_MEMORY_BASE)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter so nothing from earlier runs is counted
+PROBE = """
+import gc, json, resource, sys
+import bridge
+
+def status(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+if sys.argv[1] == "--rows":
+    sys.path.insert(0, "benchmarks")
+    import synthetic
+    RAW, ACT8 = synthetic.inputs(int(sys.argv[2]))
+else:
+    RAW = bridge.load_workbook(sys.argv[1])
+    ACT8 = bridge.load_workbook(sys.argv[2])
+gc.collect()
+input_bytes = int(RAW.memory_usage(deep=True).sum() + ACT8.memory_usage(deep=True).sum())
+targets = ["counts", "excel", "parquet", "csv"]
+
+# Warm up on a few rows: the modules the exports import on first use are
+# not part of the per-row cost
+bridge.run_pipeline({"RAW_loaded": RAW.head(50), "ACT8_loaded": ACT8.head(50)}, targets=targets)
+gc.collect()
+
+# Reset the high-water mark (Linux) so the load itself is not counted
+try:
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    before = status("VmRSS")
+except OSError:
+    before = None
+
+bridge.run_pipeline({"RAW_loaded": RAW, "ACT8_loaded": ACT8}, targets=targets)
+
+if before is None:
+    # ru_maxrss: kilobytes on Linux, bytes on macOS; includes the load
+    before = 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+else:
+    peak = status("VmHWM")
+print(json.dumps({"input": input_bytes, "before": before, "peak": peak, "rows": len(RAW)}))
+"""
+
+
+def measure(*args):
+    """Run the probe on (RAW path, Action 8 path), or on ("--rows", N) for synthetic inputs."""
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, *args], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--raw", help="RAW workbook")
+    parser.add_argument("--act8", help="Action 8 workbook")
+    parser.add_argument("--rows", type=int, default=10000, help="synthetic RAW rows, without --raw/--act8")
+    parser.add_argument("--ratio", type=float, default=float(os.environ.get("BRIDGE_MEMORY_RATIO", 6)),
+                        help="allowed growth of the resident set, as a multiple of the input frames")
+    parser.add_argument("--base", type=float, default=float(os.environ.get("BRIDGE_MEMORY_BASE", 32)),
+                        help="MB allowed on top of the ratio, whatever the input")
+    args = parser.parse_args(argv)
+    if (args.raw is None) != (args.act8 is None):
+        parser.error("--raw and --act8 go together")
+
+    if args.raw:
+        run = measure(os.path.abspath(args.raw), os.path.abspath(args.act8))
+    else:
+        run = measure("--rows", str(args.rows))
+    mb = 1024 * 1024
+    growth = max(run["peak"] - run["before"], 0)
+    ratio = max(growth - args.base * mb, 0) / max(run["input"], 1)
+
+    print(f"input frames:  {run['input'] / mb:.1f} MB ({run['rows']} RAW rows)")
+    print(f"peak growth:   {growth / mb:.1f} MB")
+    print(f"above base:    {ratio:.1f}x input (limit {args.ratio:.1f}x + {args.base:.0f} MB)")
+    if ratio > args.ratio:
+        print("FAIL: the run needs too much memory for its input")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
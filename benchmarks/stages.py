@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Run time of each bridge stage on synthetic inputs, against stored baselines.
+
+    python benchmarks/stages.py [--sizes 1000 10000 100000 1000000] [--update]
+
+For each size, RAW / Action 8 inputs are generated (benchmarks/synthetic.py,
+same seed every time) and these are timed one at a time, each on its own
+(actions build their own evaluation context, as when called directly):
+raw_file, act8_fil, action7-22 on RAW, make_RAW2, action2/3 on RAW2,
+run_action8m_and_raw3, action5/6 on RAW3 and generate_bridge_excel.
+A stage's time is the best of up to `repeat` runs (fewer once it has
+taken 2 seconds). Exits with status 1 if a stage takes longer than:
+- its baseline (benchmarks/baselines.json) times `threshold` (default
+  1.5, or BRIDGE_BENCH_THRESHOLD)
+- plus `slack` seconds (default 0.02), so timer noise on tiny stages
+  does not fail the run
+--update records the times as the new baselines instead. Baselines are
+machine-specific: record them on the machine that checks them.
+generate_bridge_excel is skipped above --excel-rows (default 100000),
+as the Excel writer alone takes minutes on a million rows.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bridge # noqa: E402
+import synthetic # noqa: E402
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+SIZES = [1000, 10000, 100000]
+
+# Actions on RAW, in make_RAW2's argument order after ACT7 and ACT8
+RAW_ACTIONS = ["action7", "action9", "action15", "action16", "action17", "action18",
+               "action19", "action20", "action21", "action22"]
+
+
+def best_time(func, repeat, budget=2.0):
+    """(best run time, result) of func() over up to `repeat` runs (stops after `budget` seconds)."""
+    best, spent, result = None, 0.0, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        spent += seconds
+        if spent >= budget:
+            break
+    return best, result
+
+
+def _count(frame, col, value):
+    return int((frame[col] == value).sum())
+
+
+def time_stages(rows, repeat=3, excel_rows=100000, seed=0):
+    """Stage name -> seconds on `rows` synthetic RAW rows."""
+    RAW_loaded, ACT8_loaded = synthetic.inputs(rows, seed)
+    times = {}
+
+    def timed(name, func):
+        times[name], result = best_time(func, repeat)
+        return result
+
+    RAW = timed("raw_file", lambda: bridge.raw_file(RAW_loaded))
+    ACT8 = timed("act8_fil", lambda: bridge.act8_fil(ACT8_loaded))
+    results = {action: timed(action, lambda: bridge.ACTIONS[action](RAW)) for action in RAW_ACTIONS}
+
+    RAW2 = timed("make_RAW2", lambda: bridge.make_RAW2(
+        RAW, results["action7"], ACT8, *[results[action] for action in RAW_ACTIONS[1:]]
+    )[0])
+    for action in ["action2", "action3"]:
+        results[action] = timed(action, lambda: bridge.ACTIONS[action](RAW2))
+
+    RAW3 = timed("run_action8m_and_raw3", lambda: bridge.run_action8m_and_raw3(RAW, ACT8)[1])
+    for action in ["action5", "action6"]:
+        results[action] = timed(action, lambda: bridge.ACTIONS[action](RAW3))
+
+    if rows <= excel_rows:
+        frames = bridge.export_frames(
+            RAW, RAW2, RAW3,
+            results["action2"], results["action3"], results["action5"], results["action6"],
+            results["action7"], ACT8, *[results[action] for action in RAW_ACTIONS[1:]]
+        )
+        ACT9, ACT19 = frames["ACTION9"], frames["ACTION19"]
+        timed("generate_bridge_excel", lambda: bridge.generate_bridge_excel(
+            RAW, frames["RAW2"], frames["RAW3"],
+            frames["ACTION2"], frames["ACTION3"], frames["ACTION5"], frames["ACTION6"],
+            frames["ACTION7"], frames["ACTION8"], ACT9,
+            _count(ACT9, "Standard/Non-Standard", "Standard"),
+            _count(ACT9, "Standard/Non-Standard", "Non-Standard"),
+            frames["ACTION15"], frames["ACTION16"], frames["ACTION17"], frames["ACTION18"], ACT19,
+            _count(ACT19, "Action 19 Sub-Category", "Standard Bridge"),
+            _count(ACT19, "Action 19 Sub-Category", "Severe Deterioration"),
+            _count(ACT19, "Action 19 Sub-Category", "Not Permitted"),
+            _count(ACT19, "Action 19 Sub-Category", "Bridge was load tested."),
+            frames["ACTION20"], frames["ACTION21"], frames["ACTION22"]
+        ))
+    return times
+
+
+def load_baselines(path=BASELINES):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, metavar="ROWS",
+                        help="RAW rows of each run (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, best kept")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("BRIDGE_BENCH_THRESHOLD", 1.5)),
+                        help="allowed slowdown against the baseline, as a ratio")
+    parser.add_argument("--slack", type=float, default=0.02, help="seconds allowed on top of the ratio")
+    parser.add_argument("--excel-rows", type=int, default=100000,
+                        help="largest size generate_bridge_excel is timed at")
+    parser.add_argument("--baselines", default=BASELINES, help="baseline file (default: benchmarks/baselines.json)")
+    parser.add_argument("--update", action="store_true", help="store the times as the new baselines")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baselines)
+    failed = []
+    for rows in args.sizes:
+        times = time_stages(rows, args.repeat, args.excel_rows)
+        stored = baselines.get(str(rows), {})
+        print(f"{rows} rows:")
+        for stage, seconds in times.items():
+            baseline = stored.get(stage)
+            if baseline is None:
+                print(f"  {stage:<24} {seconds:>9.4f}s")
+                continue
+            slower = seconds > baseline * args.threshold + args.slack
+            print(f"  {stage:<24} {seconds:>9.4f}s  baseline {baseline:.4f}s  {seconds / baseline:>5.2f}x"
+                  + ("  REGRESSION" if slower else ""))
+            if slower:
+                failed.append(f"{stage} at {rows} rows")
+        if args.update:
+            baselines[str(rows)] = {stage: round(seconds, 6) for stage, seconds in times.items()}
+
+    if args.update:
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+        print(f"baselines written to {args.baselines}")
+        return 0
+    if failed:
+        print("FAIL: slower than the baseline: " + ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
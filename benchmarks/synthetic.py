@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Seeded synthetic RAW and Action 8 workbooks, for benchmarks.
+
+    python benchmarks/synthetic.py --rows 10000 --raw RAW.xlsx --act8 ACT8.xlsx [--seed 0]
+
+RAW has every column the actions read, with code distributions like an
+Iowa DOT export (Parent Asset groups, B.LR.04 methods, NBI 041/043, span
+material and type codes, years built and reconstructed) and comments
+drawn from the keyword lists in bridge.RULES, so every action and
+sub-category selects rows. Filler columns bring it to `columns` columns
+(at least 42, the key columns). The Action 8 upload is derived from it:
+a sample of the RAW rows with some key values typed as text (as in a
+file from another system), duplicates and rows RAW does not have.
+The same rows and seed always give the same frames.
+Files are written as .xlsx, .parquet or .csv, by extension.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bridge # noqa: E402
+
+# Value -> weight of the coded columns (np.nan: missing)
+PARENT_ASSET = {
+    **{f"State Bridges > District {i}": 3 for i in range(1, 7)},
+    **{f"County Bridges > {county}": 7 for county in
+       ["Polk", "Story", "Linn", "Scott", "Johnson", "Black Hawk", "Dubuque", "Woodbury"]},
+    **{f"City Bridges > {city}": 4 for city in ["Ames", "Des Moines", "Cedar Rapids", "Davenport"]},
+    "Border Bridges": 2,
+    np.nan: 1,
+}
+LOAD_RATING_METHOD = {"AR": 30, "EJ": 25, "LFR": 15, "ASR": 12, "LRFR": 10, "LFD": 4, " ej": 1, "ar": 1, np.nan: 2}
+OPEN_POSTED_CLOSED = {"A": 80, "B": 3, "P": 8, "R": 3, "K": 2, "D": 1, "E": 1, np.nan: 2}
+LOAD_POSTING_STATUS = {"O": 70, "PP": 8, "PR": 5, "TP": 3, "TR": 2, "C": 2, np.nan: 10}
+STRUCTURE_TYPE = {
+    101: 4, 102: 4, 104: 3, 119: 6, 121: 1, 201: 2, 202: 4, 204: 2, 219: 6, 221: 1,
+    302: 10, 303: 4, 310: 2, 319: 6, 402: 5, 502: 6, 505: 4, 601: 3, 605: 3,
+    701: 3, 702: 5, 300: 1, 400: 1, 810: 1,
+}
+SPAN_MATERIAL = {
+    "C01": 6, "C02": 5, "C03": 2, "C04": 1, "C05": 2, "CX": 1, "S01": 12, "S02": 10,
+    "M01": 3, "M02": 2, "T01": 3, "T02": 2, "T03": 2, "T04": 1, "TX": 1, "X": 1, np.nan: 4,
+}
+SPAN_TYPE = {"F01": 5, "F02": 4, "F03": 2, "F04": 2, "P01": 4, "P02": 5, "G01": 20, "G02": 10,
+             "A01": 3, "B01": 8, "S01": 6, np.nan: 5}
+OPERATING_RATING_METHOD = {0: 5, 1: 25, 2: 20, 3: 5, 5: 5, 6: 10, 7: 4, 8: 2,
+                           "A": 3, "C": 2, "D": 2, "F": 3, "f": 1, "2": 1, np.nan: 8}
+NBI_DESIGN_LOAD = {"A": 20, 5: 20, 6: 10, 4: 6, 2: 4, "0": 2, np.nan: 8}
+DESIGN_LOAD = {"HL93": 20, "HS20": 25, "HS25": 5, "H15": 4, np.nan: 20}
+TRAFFIC_TONS = {0: 70, 10: 6, 20.5: 5, 25: 4, 35: 3, np.nan: 12}
+
+# Words that no rule looks for
+NEUTRAL_WORDS = ["rated per plans", "rated by inspection", "deck", "girder", "pier", "abutment",
+                 "approach slab", "see file", "checked 2023"]
+
+
+def _words(columns, rules=None):
+    """Every word the rules' contains tests look for in `columns`."""
+    found = []
+
+    def walk(expr):
+        if isinstance(expr, dict):
+            if expr.get("op") == "contains" and expr.get("col") in columns:
+                found.extend(expr["words"])
+            for value in expr.values():
+                walk(value)
+        elif isinstance(expr, list):
+            for value in expr:
+                walk(value)
+
+    walk(bridge.RULES if rules is None else rules)
+    return sorted(set(found))
+
+
+def _draw(rng, weights, size):
+    """size values drawn from a value -> weight dict (as an object array)."""
+    values = np.empty(len(weights), dtype=object)
+    values[:] = list(weights)
+    p = np.array(list(weights.values()), dtype=float)
+    return values[rng.choice(len(values), size=size, p=p / p.sum())]
+
+
+def _years(rng, size, missing, zero=0.0, low=1900):
+    """Years (float), mostly 1950-1990 like the state's bridge stock."""
+    years = np.clip(np.round(rng.normal(1968, 22, size)), low, 2024)
+    draw = rng.random(size)
+    years[draw < missing] = np.nan
+    years[(draw >= missing) & (draw < missing + zero)] = 0
+    return years
+
+
+def _comments(rng, size, words, blank=0.45):
+    """Comment text: blank, a number now and then, else a sentence with 0-2 rule keywords."""
+    out = np.empty(size, dtype=object)
+    draw = rng.random(size)
+    out[draw < blank * 0.8] = np.nan
+    out[(draw >= blank * 0.8) & (draw < blank)] = ""
+    numbers = (draw >= blank) & (draw < blank + 0.02)
+    out[numbers] = rng.integers(1, 100, numbers.sum())
+    text = np.flatnonzero(draw >= blank + 0.02)
+    count = rng.integers(0, 3, len(text))
+    first = np.array(words, dtype=object)[rng.integers(0, len(words), len(text))]
+    second = np.array(words, dtype=object)[rng.integers(0, len(words), len(text))]
+    neutral = np.array(NEUTRAL_WORDS, dtype=object)[rng.integers(0, len(NEUTRAL_WORDS), len(text))]
+    out[text] = ["; ".join([a, b, c][2 - k:]) for a, b, c, k in zip(first, second, neutral, count)]
+    return out
+
+
+def raw_frame(rows, seed=0, columns=60, duplicates=0.005):
+    """A RAW export of about `rows` rows (plus `duplicates` of them repeated)."""
+    rng = np.random.default_rng(seed)
+    n = rows
+    d = {}
+    d["Bridge ID"] = np.array([f"{i:06d}" for i in rng.permutation(max(n * 2, 10))[:n]], dtype=object)
+    d["Bridge ID"][rng.integers(0, n)] = "180TH ST." # Row with a manual override
+    d["Parent Asset"] = _draw(rng, PARENT_ASSET, n)
+    d["NBI 027 Year Built"] = _years(rng, n, missing=0.05)
+    d["B.W.01: Year Built"] = np.where(rng.random(n) < 0.7, d["NBI 027 Year Built"], _years(rng, n, 0.3, 0.05))
+    reconst = d["NBI 027 Year Built"] + rng.integers(10, 50, n)
+    reconst[rng.random(n) < 0.65] = 0
+    reconst[rng.random(n) < 0.15] = np.nan
+    d["NBI 106 Year Reconst"] = np.minimum(reconst, 2024)
+    d["NBI 063 Method Used Operating Rating"] = _draw(rng, OPERATING_RATING_METHOD, n)
+    d["NBI 064 Operating Rating"] = np.where(rng.random(n) < 0.15, np.nan, np.round(rng.gamma(6, 7, n), 1))
+    d["B.LR.04: Load Rating Method"] = _draw(rng, LOAD_RATING_METHOD, n)
+    d["B.LR.06: Operating Load Rating Factor"] = np.where(
+        rng.random(n) < 0.3, np.nan, np.round(rng.lognormal(0.4, 0.4, n), 3)
+    )
+    structure = _draw(rng, STRUCTURE_TYPE, n).astype(float)
+    structure[rng.random(n) < 0.08] = np.nan
+    d["NBI 043 Main Structure Type"] = structure
+    d["B.SP.04: Span Material - Main"] = _draw(rng, SPAN_MATERIAL, n)
+    d["B.SP.06: Span Type - Main"] = _draw(rng, SPAN_TYPE, n)
+    d["NBI 041 Open, Posted Or Closed"] = _draw(rng, OPEN_POSTED_CLOSED, n)
+    d["B.PS.01: Load Posting Status"] = _draw(rng, LOAD_POSTING_STATUS, n)
+    d["NBI 031 Design Load"] = _draw(rng, NBI_DESIGN_LOAD, n)
+    d["B.LR.01: Design Load"] = _draw(rng, DESIGN_LOAD, n)
+    for col in ["critical location", "critical location.1"]:
+        words = _words([col]) + ["deck", "girder", "pier", "abutment"]
+        d[col] = np.where(rng.random(n) < 0.6, np.nan, np.array(words, dtype=object)[rng.integers(0, len(words), n)])
+    for col in bridge.TONS:
+        d[col] = _draw(rng, TRAFFIC_TONS, n).astype(float)
+    words = _words(["Comments", "Comment Inv Rating"])
+    d["Comments"] = _comments(rng, n, words)
+    d["Comment Inv Rating"] = _comments(rng, n, words, blank=0.35)
+
+    # Columns no action reads (inspection data, coordinates, ...)
+    for i in range(max(columns, 42) - len(d)):
+        if i % 3 == 0:
+            d[f"Field {i + 1}"] = np.round(rng.uniform(0, 100, n), 2)
+        elif i % 3 == 1:
+            d[f"Field {i + 1}"] = np.array(["N", "Y", "A", "B", "C"], dtype=object)[rng.integers(0, 5, n)]
+        else:
+            d[f"Field {i + 1}"] = rng.integers(0, 10, n).astype(float)
+
+    RAW = pd.DataFrame(d)
+    repeated = RAW.iloc[rng.choice(n, int(n * duplicates), replace=False)]
+    return pd.concat([RAW, repeated], ignore_index=True)
+
+
+def act8_frame(RAW, seed=0, fraction=0.1):
+    """An Action 8 upload matching RAW: a sample of its rows, typed as another export would."""
+    rng = np.random.default_rng(seed + 1)
+    ACT8 = RAW.iloc[np.sort(rng.choice(len(RAW), max(int(len(RAW) * fraction), 1), replace=False))].copy()
+
+    # Years as text ("1965") in about half the rows
+    for col in ["NBI 027 Year Built", "B.W.01: Year Built"]:
+        text = ACT8[col].map(lambda x: x if pd.isna(x) else str(int(x))).astype(object)
+        ACT8[col] = np.where(rng.random(len(ACT8)) < 0.5, text, ACT8[col].astype(object))
+
+    # Rows RAW does not have, and rows listed twice
+    extra = ACT8.iloc[:max(len(ACT8) // 50, 1)].copy()
+    extra["Bridge ID"] = [f"X{i:05d}" for i in range(len(extra))]
+    return pd.concat([ACT8, extra, ACT8.iloc[:max(len(ACT8) // 100, 1)]], ignore_index=True)
+
+
+def inputs(rows, seed=0):
+    """(RAW, Action 8) as load_workbook gives them (see set_column_dtypes)."""
+    RAW = raw_frame(rows, seed)
+    return bridge.set_column_dtypes(RAW), bridge.set_column_dtypes(act8_frame(RAW, seed))
+
+
+def write(frame, path):
+    """Write frame as .xlsx, .parquet or .csv (by extension)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        frame.to_excel(path, index=False)
+    elif ext == ".parquet":
+        # Mixed columns (numbers and text) as text, as Parquet needs one type per column
+        mixed = [col for col in frame.columns
+                 if frame[col].dtype == object and pd.api.types.infer_dtype(frame[col], skipna=True) != "string"]
+        frame.assign(**{col: frame[col].map(lambda x: x if pd.isna(x) else str(x)) for col in mixed}).to_parquet(path, index=False)
+    elif ext == ".csv":
+        frame.to_csv(path, index=False)
+    else:
+        raise ValueError(f"Unsupported file type: {path} (expected .xlsx, .parquet or .csv)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, required=True, help="RAW rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--columns", type=int, default=60, help="RAW columns (at least 42)")
+    parser.add_argument("--raw", required=True, help="RAW file to write")
+    parser.add_argument("--act8", required=True, help="Action 8 file to write")
+    args = parser.parse_args(argv)
+
+    RAW = raw_frame(args.rows, args.seed, args.columns)
+    write(RAW, args.raw)
+    write(act8_frame(RAW, args.seed), args.act8)
+    print(f"wrote {args.raw} ({len(RAW)} rows) and {args.act8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,324 +7,1327 @@
 import pandas as pd
 import numpy as np
 import datetime as dt
-import openpyxl
 import re
-import streamlit as st
+import importlib.util
+import hashlib
+import json
+import pickle
+import os
 import io # Added for BytesIO
+import zipfile
+import concurrent.futures
+import threading
+import functools
+import tempfile
+import shutil
+import time
+import glob
+import sys
+
+# Frames are shared between stages (and with the caller) rather than copied:
+# under copy-on-write a frame derived from another never writes through to
+# it, so the uploads stay read-only however the stages use them. Always on
+# from pandas 3.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 # -------------------------------
 # Helper Functions
 # -------------------------------
 
+# First bytes of each workbook format: .xlsx is a zip, .xls an OLE2 file
+WORKBOOK_MAGIC = {
+    "xlsx": b"PK\x03\x04",
+    "xls": b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+}
+
+
+def workbook_bytes(source):
+    """
+    Bytes of a workbook given as a path, bytes or file-like object
+    (e.g. a Streamlit UploadedFile).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def workbook_format(data):
+    """'xlsx' or 'xls', detected from the workbook's first bytes."""
+    for fmt, magic in WORKBOOK_MAGIC.items():
+        if data.startswith(magic):
+            return fmt
+    raise ValueError("Not an Excel workbook (.xlsx or .xls)")
+
+
+def read_workbook(source):
+    """
+    Read the first sheet of a workbook into a DataFrame.
+    - The format is detected from the content, not the file name
+    - python-calamine (Rust) parses both formats when installed; otherwise
+      openpyxl reads .xlsx and xlrd reads .xls
+    """
+    data = workbook_bytes(source)
+    fmt = workbook_format(data)
+    if importlib.util.find_spec("python_calamine") is not None:
+        engine = "calamine"
+    else:
+        engine = "openpyxl" if fmt == "xlsx" else "xlrd"
+    return pd.read_excel(io.BytesIO(data), engine=engine)
+
+
+# Low-cardinality code columns, stored as categoricals
+CODE_COLUMNS = [
+    "Parent Asset",
+    "B.LR.04: Load Rating Method",
+    "NBI 041 Open, Posted Or Closed",
+    "B.PS.01: Load Posting Status",
+    "B.SP.04: Span Material - Main",
+    "B.SP.06: Span Type - Main",
+    "NBI 031 Design Load",
+]
+
+# Free-text columns, stored as Arrow strings when pyarrow is installed
+TEXT_COLUMNS = ["Comments", "Comment Inv Rating", "critical location", "critical location.1"]
+
+
+def set_column_dtypes(df):
+    """
+    Dtype policy applied when a sheet is loaded:
+    - Code columns holding only text become categoricals
+    - Free-text columns holding only text become Arrow-backed strings
+    - Columns with numbers or mixed values are left as read, so every
+      reading of them (numeric, astype(str), keys) is unchanged
+    """
+    try:
+        import pyarrow # noqa: F401 (optional, only used as the string storage)
+        text_dtype = pd.StringDtype("pyarrow")
+    except ImportError:
+        text_dtype = None
+
+    for col in CODE_COLUMNS + TEXT_COLUMNS:
+        if col not in df.columns or df[col].dtype != object:
+            continue
+        values = df[col]
+        missing = values.isna()
+        if (pd.api.types.infer_dtype(values[~missing], skipna=False) != "string"
+                or pd.api.types.infer_dtype(values[missing], skipna=False) not in ("floating", "empty")):
+            continue # Numbers, None or other objects in the column
+        if col in CODE_COLUMNS:
+            df[col] = values.astype("category")
+        elif text_dtype is not None:
+            df[col] = values.astype(text_dtype)
+    return df
+
+
+def _unique_rows(df):
+    """df.drop_duplicates(), sharing df's data when no row repeats (copy-on-write)."""
+    duplicated = df.duplicated()
+    return df[~duplicated] if duplicated.any() else df.copy(deep=False)
+
+
 def raw_file(input_df):
     """
     Process the raw input DataFrame and return the cleaned RAW DataFrame.
     """
-    processed_df = input_df.copy()
-    processed_df = processed_df.drop_duplicates()
-    return processed_df
+    processed_df = _unique_rows(input_df)
+    return set_column_dtypes(processed_df)
 
 def act8_fil(input_df):
     """
     Process the ACT8 DataFrame and return the cleaned version.
     """
-    processed_df = input_df.copy()
-    processed_df = processed_df.drop_duplicates()
-    return processed_df
+    processed_df = _unique_rows(input_df)
+    return set_column_dtypes(processed_df)
 
 # -------------------------------
-# Action Item Functions (From Part 1)
+# Parsed Workbook Cache
 # -------------------------------
+#
+# Parsed, typed workbooks are kept on disk keyed by the digest of the
+# uploaded bytes, so re-uploading the same export (even after a server
+# restart) skips the parse. Columns Arrow can hold are stored as an Arrow
+# IPC file and reopened memory-mapped; mixed object columns (numbers and
+# text in one column) go to a pickle beside it. Least recently used
+# entries are evicted past CACHE_MAX_BYTES. Bump CACHE_VERSION whenever
+# read_workbook or set_column_dtypes change what a workbook parses to.
 
-def action7(RAW):
+CACHE_VERSION = 1
+CACHE_DIR = os.environ.get(
+    "BRIDGE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bridge-metrics")
+)
+CACHE_MAX_BYTES = int(os.environ.get("BRIDGE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+# Object columns whose values Arrow stores and gives back as they were
+_ARROW_OBJECT_KINDS = ("string", "boolean", "empty")
+
+
+def workbook_digest(data):
+    """Cache key of a workbook's bytes."""
+    return hashlib.sha256(b"v%d:" % CACHE_VERSION + data).hexdigest()
+
+
+def load_workbook(source, cache_dir=None, max_bytes=None):
     """
-    Process Action 7:
-    - Remove certain districts
-    - Filter by Year Built, Load Rating, Main Structure Type, Open/Posted status
-    - Exclude rows with specific critical locations and comment patterns
+    read_workbook + set_column_dtypes, cached on disk by the bytes' digest.
+    Without pyarrow the workbook is simply parsed every time.
     """
-    ACT7 = RAW.copy()
+    data = workbook_bytes(source)
+    try:
+        import pyarrow # noqa: F401
+    except ImportError:
+        return set_column_dtypes(read_workbook(data))
+
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    path = os.path.join(cache_dir, workbook_digest(data))
+
+    df = _cache_load(path)
+    _note_cache("miss" if df is None else "hit")
+    if df is None:
+        df = set_column_dtypes(read_workbook(data))
+        os.makedirs(cache_dir, exist_ok=True)
+        _cache_store(path, df)
+        _cache_evict(cache_dir, max_bytes)
+    return df
+
+
+def _cache_store(path, df):
+    """Write df as path.arrow (plus path.pkl for mixed object columns)."""
+    import pyarrow as pa
+
+    # Column positions: mixed object columns, and the object columns Arrow stores
+    kinds = [
+        pd.api.types.infer_dtype(df.iloc[:, i], skipna=True) if df.dtypes.iloc[i] == object else None
+        for i in range(df.shape[1])
+    ]
+    mixed = [i for i, kind in enumerate(kinds) if kind is not None and kind not in _ARROW_OBJECT_KINDS]
+    stored = [i for i in range(df.shape[1]) if i not in mixed]
+    objects = [j for j, i in enumerate(stored) if kinds[i] is not None]
+
+    table = pa.Table.from_pandas(df.iloc[:, stored], preserve_index=False)
+    meta = {"stored": stored, "mixed": mixed, "objects": objects}
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"bridge": json.dumps(meta).encode(),
+        b"bridge_columns": pickle.dumps(df.columns), # Headers need not be strings
+    })
+
+    # Written under temporary names and renamed, the .arrow file last, so a
+    # reader never sees a half-written entry
+    if mixed:
+        df.iloc[:, mixed].reset_index(drop=True).to_pickle(path + ".pkl.tmp")
+        os.replace(path + ".pkl.tmp", path + ".pkl")
+    with pa.OSFile(path + ".arrow.tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".arrow.tmp", path + ".arrow")
+
+
+def _cache_load(path):
+    """The cached DataFrame at path, or None if there is no usable entry."""
+    import pyarrow as pa
+
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path + ".arrow")).read_all()
+        meta = json.loads(table.schema.metadata[b"bridge"])
+        columns = pickle.loads(table.schema.metadata[b"bridge_columns"])
+        mixed = pd.read_pickle(path + ".pkl") if meta["mixed"] else None
+    except (OSError, KeyError, ValueError, pa.ArrowInvalid):
+        return None
+    os.utime(path + ".arrow") # Most recently used
+
+    df = table.to_pandas()
+    for j in range(df.shape[1]):
+        values = df.iloc[:, j]
+        if j in meta["objects"]:
+            # Back to object, with Arrow nulls (None) as the NaN the parser gave
+            values = values.astype(object)
+            df.isetitem(j, values.where(values.notna(), np.nan))
+        elif isinstance(values.dtype, pd.StringDtype):
+            df.isetitem(j, values.astype(pd.StringDtype("pyarrow")))
+    if mixed is not None:
+        df = pd.concat([df, mixed], axis=1)
+    df = df.iloc[:, np.argsort(meta["stored"] + meta["mixed"])]
+    df.columns = columns
+    return df
+
+
+def _cache_evict(cache_dir, max_bytes):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".arrow"):
+            path = os.path.join(cache_dir, name[:-len(".arrow")])
+            size = os.path.getsize(path + ".arrow")
+            if os.path.exists(path + ".pkl"):
+                size += os.path.getsize(path + ".pkl")
+            entries.append((os.path.getmtime(path + ".arrow"), size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries)[:-1]: # Never the entry just written
+        if total <= max_bytes:
+            break
+        for ext in (".arrow", ".pkl"):
+            if os.path.exists(path + ext):
+                os.remove(path + ext)
+        total -= size
 
-    # Remove State Bridges by district
-    districts = [f"State Bridges > District {i}" for i in range(1, 7)]
-    ACT7 = ACT7[~ACT7["Parent Asset"].isin(districts)]
 
-    # Remove old bridges (Year Built < 1994)
-    ACT7 = ACT7[~((ACT7["NBI 027 Year Built"] <= 1994) |
-                  (ACT7["NBI 027 Year Built"].isna() & (ACT7["B.W.01: Year Built"] <= 1994)))]
+# -------------------------------
+# Rule Specification
+# -------------------------------
+#
+# Every filter used by the action functions is declared here as data so the
+# thresholds, code lists and comment keywords can be re-tuned each reporting
+# cycle without touching the action code. Bump "version" whenever a rule
+# changes.
+#
+# An expression is one of:
+#   "name"                          a shared predicate from "predicates"
+#   {"all": [expr, ...]}            every expression is true
+#   {"any": [expr, ...]}            at least one expression is true
+#   {"not": expr}                   the expression is false
+#   {"col": ..., "op": ..., ...}    a column test (see below)
+#
+# Column tests:
+#   "op"        eq, ne, lt, le, gt, ge ("value"), isin ("values"), isna, notna,
+#               contains ("words", optional "escape" and raw "regex"
+#               alternatives; always case-insensitive), startswith/endswith
+#               ("values")
+#   "as"        how the column is read before the test:
+#               numeric   pd.to_numeric(errors="coerce")
+#               numeric0  numeric, missing as 0
+#               int0      numeric0 truncated to int
+#               str       astype(str)
+#               strip     astype(str), stripped
+#               upper     astype(str), stripped and upper-cased
+#               number    numbers as int where whole, other values as they are
+#               code      number as text, stripped ("119.0" -> "119")
+#   "fallback"  a second test applied where this column is missing, e.g.
+#               NBI 027 Year Built falling back to B.W.01: Year Built
+
+STAN_PAT = [r"(?<!non[-\s])standard", r"(?<!non[-\s])std"]
+
+TONS = [
+    "Multi Lane Traffic: Type SU4 Tons", "Multi Lane Traffic: Type SU5 Tons",
+    "Multi Lane Traffic: Type SU6 Tons", "Multi Lane Traffic: Type SU7 Tons",
+    "One Lane Traffic: Type SU4 Tons", "One Lane Traffic: Type SU5 Tons",
+    "One Lane Traffic: Type SU6 Tons", "One Lane Traffic: Type SU7 Tons"
+]
+
+RULES = {
+    "version": 1,
+
+    "predicates": {
+        # Parent Asset groups
+        "state_district": {"col": "Parent Asset", "op": "isin",
+                           "values": [f"State Bridges > District {i}" for i in range(1, 7)]},
+        "county_city": {"col": "Parent Asset", "op": "contains",
+                        "words": ["County Bridges", "City Bridges"]},
+        "state_border": {"col": "Parent Asset", "op": "contains",
+                         "words": ["State Bridges", "Border Bridges"]},
+
+        # Closed (K), or NBI 041 missing and Load Posting Status == C
+        "closed": {"col": "NBI 041 Open, Posted Or Closed", "op": "eq", "value": "K"},
+        "closed_posted": {"col": "NBI 041 Open, Posted Or Closed", "op": "eq", "value": "K",
+                          "fallback": {"col": "B.PS.01: Load Posting Status", "op": "eq", "value": "C"}},
+
+        # Load Rating Method == X
+        "lrm_ASR": {"col": "B.LR.04: Load Rating Method", "op": "eq", "value": "ASR"},
+        "lrm_LFR": {"col": "B.LR.04: Load Rating Method", "op": "eq", "value": "LFR"},
+        "lrm_AR": {"col": "B.LR.04: Load Rating Method", "op": "eq", "value": "AR"},
+        "lrm_EJ": {"col": "B.LR.04: Load Rating Method", "op": "eq", "value": "EJ"},
+
+        # Year Built: NBI 027, falling back to B.W.01 when NBI 027 is missing
+        "built_le_1994": {"col": "NBI 027 Year Built", "as": "numeric", "op": "le", "value": 1994,
+                          "fallback": {"col": "B.W.01: Year Built", "as": "numeric", "op": "le", "value": 1994}},
+        "built_lt_2010": {"col": "NBI 027 Year Built", "as": "numeric", "op": "lt", "value": 2010,
+                          "fallback": {"col": "B.W.01: Year Built", "as": "numeric", "op": "lt", "value": 2010}},
+        "built_le_1972": {"col": "NBI 027 Year Built", "as": "numeric", "op": "le", "value": 1972,
+                          "fallback": {"col": "B.W.01: Year Built", "as": "numeric", "op": "lt", "value": 1972}},
+        "built_le_1992": {"col": "NBI 027 Year Built", "as": "numeric", "op": "le", "value": 1992,
+                          "fallback": {"col": "B.W.01: Year Built", "as": "numeric", "op": "lt", "value": 1992}},
+        "built_gt_1972": {"col": "NBI 027 Year Built", "as": "numeric", "op": "gt", "value": 1972,
+                          "fallback": {"col": "B.W.01: Year Built", "as": "numeric", "op": "gt", "value": 1972}},
+        "built_gt_1992": {"col": "NBI 027 Year Built", "as": "numeric", "op": "gt", "value": 1992,
+                          "fallback": {"col": "B.W.01: Year Built", "as": "numeric", "op": "gt", "value": 1992}},
+
+        # Year Reconstructed (missing or 0 means not reconstructed)
+        "recon_na": {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "isna"},
+        "recon_le_1972": {"any": ["recon_na", {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "le", "value": 1972}]},
+        "recon_le_1992": {"any": ["recon_na", {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "le", "value": 1992}]},
+        "recon_gt_1972": {"any": ["recon_na", {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "eq", "value": 0},
+                                  {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "gt", "value": 1972}]},
+        "recon_gt_1992": {"any": ["recon_na", {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "eq", "value": 0},
+                                  {"col": "NBI 106 Year Reconst", "as": "numeric", "op": "gt", "value": 1992}]},
+
+        # Main Structure Type ending in 19 (or missing with a frame/pipe span type)
+        "nbi043_19": {"col": "NBI 043 Main Structure Type", "as": "str", "op": "endswith", "values": ["19"]},
+        "nbi043_na": {"col": "NBI 043 Main Structure Type", "op": "isna"},
+        "span_ty_fp": {"col": "B.SP.06: Span Type - Main", "op": "isin",
+                       "values": ["F01", "F02", "F03", "F04", "P01", "P02"]},
+        "type_19": {"any": ["nbi043_19", {"all": ["nbi043_na", "span_ty_fp"]}]},
+        "type_not_19": {"any": [{"not": "nbi043_19"}, {"all": ["nbi043_na", {"not": "span_ty_fp"}]}]},
+
+        # Traffic: only SU7 has tons (multi-lane or one-lane), or no tons at all
+        "su7_only": {"any": [
+            {"all": [{"col": "Multi Lane Traffic: Type SU4 Tons", "as": "numeric0", "op": "eq", "value": 0},
+                     {"col": "Multi Lane Traffic: Type SU5 Tons", "as": "numeric0", "op": "eq", "value": 0},
+                     {"col": "Multi Lane Traffic: Type SU6 Tons", "as": "numeric0", "op": "eq", "value": 0},
+                     {"col": "Multi Lane Traffic: Type SU7 Tons", "as": "numeric0", "op": "gt", "value": 0}]},
+            {"all": [{"col": "One Lane Traffic: Type SU4 Tons", "as": "numeric0", "op": "eq", "value": 0},
+                     {"col": "One Lane Traffic: Type SU5 Tons", "as": "numeric0", "op": "eq", "value": 0},
+                     {"col": "One Lane Traffic: Type SU6 Tons", "as": "numeric0", "op": "eq", "value": 0},
+                     {"col": "One Lane Traffic: Type SU7 Tons", "as": "numeric0", "op": "gt", "value": 0}]},
+        ]},
+        "su7_only_int": {"any": [
+            {"all": [{"col": "Multi Lane Traffic: Type SU4 Tons", "as": "int0", "op": "eq", "value": 0},
+                     {"col": "Multi Lane Traffic: Type SU5 Tons", "as": "int0", "op": "eq", "value": 0},
+                     {"col": "Multi Lane Traffic: Type SU6 Tons", "as": "int0", "op": "eq", "value": 0},
+                     {"col": "Multi Lane Traffic: Type SU7 Tons", "as": "int0", "op": "gt", "value": 0}]},
+            {"all": [{"col": "One Lane Traffic: Type SU4 Tons", "as": "int0", "op": "eq", "value": 0},
+                     {"col": "One Lane Traffic: Type SU5 Tons", "as": "int0", "op": "eq", "value": 0},
+                     {"col": "One Lane Traffic: Type SU6 Tons", "as": "int0", "op": "eq", "value": 0},
+                     {"col": "One Lane Traffic: Type SU7 Tons", "as": "int0", "op": "gt", "value": 0}]},
+        ]},
+        "no_tons": {"all": [
+            {"col": "Multi Lane Traffic: Type SU4 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "Multi Lane Traffic: Type SU5 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "Multi Lane Traffic: Type SU6 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "Multi Lane Traffic: Type SU7 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU4 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU5 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU6 Tons", "as": "numeric0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU7 Tons", "as": "numeric0", "op": "eq", "value": 0},
+        ]},
+        "no_tons_int": {"all": [
+            {"col": "Multi Lane Traffic: Type SU4 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "Multi Lane Traffic: Type SU5 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "Multi Lane Traffic: Type SU6 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "Multi Lane Traffic: Type SU7 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU4 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU5 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU6 Tons", "as": "int0", "op": "eq", "value": 0},
+            {"col": "One Lane Traffic: Type SU7 Tons", "as": "int0", "op": "eq", "value": 0},
+        ]},
+
+        # Both comment fields empty (after astype(str))
+        "comments_blank": {"all": [
+            {"any": [{"col": "Comments", "as": "str", "op": "isna"},
+                     {"col": "Comments", "as": "strip", "op": "eq", "value": ""}]},
+            {"any": [{"col": "Comment Inv Rating", "as": "str", "op": "isna"},
+                     {"col": "Comment Inv Rating", "as": "strip", "op": "eq", "value": ""}]},
+        ]},
+    },
+
+    "actions": {
+        "action7": {
+            "keep": {"all": [
+                {"not": "state_district"},
+                {"not": "built_le_1994"},
+                {"any": [{"col": "NBI 063 Method Used Operating Rating", "as": "numeric", "op": "eq", "value": 2},
+                         {"col": "NBI 063 Method Used Operating Rating", "as": "numeric", "op": "isna"}]},
+                "lrm_ASR",
+                {"not": {"any": [
+                    {"col": "NBI 043 Main Structure Type", "as": "numeric", "op": "isin",
+                     "values": [701, 702, 300, 400, 301, 401]},
+                    {"col": "NBI 043 Main Structure Type", "as": "numeric", "op": "isna"},
+                    {"col": "B.SP.04: Span Material - Main", "op": "isin",
+                     "values": ["M01", "M02", "SX", "T01", "T02", "T03", "T04", "TX", "X"]},
+                ]}},
+                {"not": "closed_posted"},
+                {"not": {"col": "critical location", "op": "contains",
+                         "words": ["timber", "plank", "long", "trans", "pile", "piling", "standard", "std"]}},
+                {"not": {"col": "Comments", "op": "contains",
+                         "words": ["30 ksi", "flatcar", "testing", "salvage", "standard"]}},
+                {"not": {"col": "Comment Inv Rating", "op": "contains",
+                         "words": ["30 ksi", "flatcar", "testing", "salvage", "standard"]}},
+            ]},
+        },
+
+        "action9": {
+            "keep": {"all": [
+                {"not": "state_district"},
+                {"any": [{"col": "NBI 063 Method Used Operating Rating", "as": "numeric", "op": "eq", "value": 1},
+                         {"col": "NBI 063 Method Used Operating Rating", "as": "numeric", "op": "isna"}]},
+                "lrm_LFR",
+                {"col": "NBI 031 Design Load", "op": "eq", "value": "A",
+                 "fallback": {"col": "B.LR.01: Design Load", "op": "eq", "value": "HL93"}},
+                {"not": "closed_posted"},
+                {"not": "built_lt_2010"},
+            ]},
+            "standard": {"any": [
+                {"col": "Comments", "op": "contains", "words": ["standard", "std", "STANDARD"]},
+                {"col": "Comment Inv Rating", "op": "contains", "words": ["standard", "std", "STANDARD"]},
+            ]},
+        },
+
+        "action15": {
+            "before_1972": {"all": [{"not": "state_district"}, "lrm_AR", "type_19",
+                                    "built_le_1972", "recon_le_1972"]},
+            "before_1992": {"all": [{"not": "state_district"}, "lrm_AR", "type_not_19",
+                                    "built_le_1992", "recon_le_1992"]},
+        },
+
+        "action16": {
+            "after_1972": {"all": [{"not": "state_district"}, "lrm_AR", "type_19",
+                                   "built_gt_1972", "recon_gt_1972"]},
+            "after_1992": {"all": [{"not": "state_district"}, "lrm_AR", "type_not_19",
+                                   "built_gt_1992", "recon_gt_1992"]},
+            "comments": {"any": [
+                {"col": col, "op": "contains", "words": [
+                    "standard", "std", "design load per certified", "based on field measurements", "HL-93",
+                    "exterior wall reinforcing is inadequate", "bridge plan was HS20", "shop drawing not available",
+                    "exterior wall under reinforced", "shop drawings not available", "bridge plans was HS20",
+                    "Per field measurements", "assignment", "design load", "HS20 design", "HS-20 live",
+                    "HS 20 design", "high fill depth", "Unable to Provide"
+                ]} for col in ["Comments", "Comment Inv Rating"]
+            ]},
+        },
+
+        "action17": {
+            "before_1972": {"all": [{"not": "county_city"}, "lrm_AR", "type_19",
+                                    "built_le_1972", "recon_le_1972"]},
+            "before_1992": {"all": [{"not": "county_city"}, "lrm_AR", "type_not_19",
+                                    "built_le_1992", "recon_le_1992"]},
+        },
+
+        "action18": {
+            "after_1972": {"all": [{"not": "county_city"}, "lrm_AR", "type_19",
+                                   "built_gt_1972", "recon_gt_1972"]},
+            "after_1992": {"all": [{"not": "county_city"}, "lrm_AR", "type_not_19",
+                                   "built_gt_1992", "recon_gt_1992"]},
+            "comments": {"any": [
+                {"col": col, "op": "contains",
+                 "words": ["standard", "std", "parametric", "LFR", "NBI 64", "NBI 66"]}
+                for col in ["Comments", "Comment Inv Rating"]
+            ]},
+        },
+
+        "action19": {
+            "keep": {"all": [
+                {"not": "state_border"},
+                "lrm_EJ",
+                {"not": "closed"},
+                {"not": {"any": [
+                    {"col": "NBI 043 Main Structure Type", "as": "numeric", "op": "eq", "value": 319},
+                    {"col": "NBI 043 Main Structure Type", "as": "code", "op": "startswith",
+                     "values": ["1", "2", "5", "6"]},
+                    {"all": ["nbi043_na",
+                             {"col": "B.SP.06: Span Type - Main", "op": "isin", "values": ["P01", "P02"]}]},
+                    {"all": [{"col": "B.SP.06: Span Type - Main", "op": "isna"},
+                             {"col": "B.SP.04: Span Material - Main", "op": "isin",
+                              "values": ["C01", "C02", "C03", "C04", "C05", "CX"]}]},
+                    {"col": "critical location", "op": "contains", "words": ["timber", "plank", "pile"]},
+                    {"col": "critical location.1", "op": "contains", "words": ["timber", "plank", "pile"]},
+                ]}},
+            ]},
+            # Sub-categories, checked on Comment Inv Rating
+            "standard_bridge": {"col": "Comment Inv Rating", "op": "contains",
+                                "words": ["std", "standard"]},
+            "load_tested": {"col": "Comment Inv Rating", "op": "contains",
+                            "words": ["test"]},
+            "severe_deterioration": {"col": "Comment Inv Rating", "op": "contains",
+                                     "words": ["poor", "deteriorat", "post", "decay", "damage", "clos"]},
+        },
+
+        "action20": {
+            "keep": {"all": [
+                {"not": "state_border"},
+                "lrm_EJ",
+                {"not": "closed_posted"},
+                {"col": "NBI 043 Main Structure Type", "as": "numeric", "op": "isin",
+                 "values": [101, 102, 104, 105, 106, 119, 121, 122, 100,
+                            201, 202, 204, 205, 206, 219, 221, 222, 200],
+                 "fallback": {"col": "B.SP.04: Span Material - Main", "op": "isin",
+                              "values": ["C01", "C02", "C03", "C04", "C05"]}},
+                {"not": {"any": [
+                    {"col": "critical location", "op": "contains",
+                     "words": ["timber", "plank", "long", "trans", "pil"]},
+                    {"col": "critical location.1", "op": "contains",
+                     "words": ["timber", "plank", "long", "trans", "pil"]},
+                ]}},
+                {"any": [{"col": "Comments", "op": "isna"},
+                         {"col": "Comments", "op": "eq", "value": ""}]},
+                {"not": {"col": "Comment Inv Rating", "op": "contains", "words": [
+                    "based on a parametric", "based on the parametric", "no signs of distress", "sufficient",
+                    "available", "no plans", "unable to provide", "agreed with FHWA", "software",
+                    "deterioration", "MBE 6A.5.11", "standard", "std"
+                ]}},
+            ]},
+        },
+
+        "action21": {
+            "keep": {"all": [
+                {"not": "county_city"},
+                "lrm_EJ",
+                {"not": "closed_posted"},
+                {"col": "NBI 043 Main Structure Type", "as": "numeric", "op": "isin",
+                 "values": [101, 102, 104, 105, 106, 119, 121, 122, 100,
+                            211, 212, 214, 215, 216, 219, 221, 222, 210],
+                 "fallback": {"col": "B.SP.04: Span Material - Main", "op": "isin",
+                              "values": ["C01", "C02", "C03", "C04", "C05", "CX"]}},
+                {"not": {"any": [
+                    {"col": "critical location", "op": "contains",
+                     "words": ["timber", "plank", "long", "trans", "pil"]},
+                    {"col": "critical location.1", "op": "contains",
+                     "words": ["timber", "plank", "long", "trans", "pil"]},
+                ]}},
+                {"not": {"any": [
+                    {"col": col, "op": "contains", "words": [
+                        "parametric", "illegible", "missing", "no plans", "per section 6.1.4",
+                        "The following bridge has been inspected", "standard", "std"
+                    ]} for col in ["Comments", "Comment Inv Rating"]
+                ]}},
+            ]},
+        },
+
+        "action22": {
+            "keep": {"all": [{"not": "state_border"}, "lrm_EJ", {"not": "closed_posted"}]},
+            # NBI 043 = 319, or if missing, Span Type = P02
+            "culvert": {"col": "NBI 043 Main Structure Type", "as": "numeric", "op": "eq", "value": 319,
+                        "fallback": {"col": "B.SP.06: Span Type - Main", "op": "eq", "value": "P02"}},
+            "culvert_comments": {"any": [
+                {"col": col, "op": "contains", "words": ["CMP", "corrugated", "metal culvert"]}
+                for col in ["Comments", "Comment Inv Rating"]
+            ]},
+        },
+
+        "action2": {
+            "keep": {"all": [
+                {"not": "state_border"},
+                "su7_only",
+                {"not": {"col": "B.LR.04: Load Rating Method", "as": "upper", "op": "eq", "value": "EJ",
+                         "fallback": {"col": "NBI 063 Method Used Operating Rating", "as": "numeric",
+                                      "op": "eq", "value": 0}}},
+                {"not": {"col": "NBI 041 Open, Posted Or Closed", "as": "upper", "op": "isin",
+                         "values": ["P", "R", "K"],
+                         "fallback": {"col": "B.PS.01: Load Posting Status", "as": "upper", "op": "isin",
+                                      "values": ["C", "PP", "PR"]}}},
+                {"any": ["comments_blank", {"not": {"any": [
+                    {"col": col, "op": "contains", "escape": True, "regex": STAN_PAT, "words": [
+                        "SU4", "close bridge", "closed", "based on a parametric", "based on the parametric",
+                        "J7", "J24", "Standards"
+                    ]} for col in ["Comments", "Comment Inv Rating"]
+                ]}}]},
+            ]},
+        },
+
+        "action3": {
+            "keep": {"all": [
+                {"not": {"col": "Parent Asset", "op": "contains", "words": ["State Bridge", "Border Bridge"]}},
+                "no_tons",
+                {"not": {"col": "B.LR.04: Load Rating Method", "as": "upper", "op": "isin", "values": ["EJ", "AR"]}},
+                {"not": {"any": [
+                    {"col": "NBI 041 Open, Posted Or Closed", "as": "upper", "op": "isin", "values": ["K", "P", "D"]},
+                    {"all": [{"col": "NBI 041 Open, Posted Or Closed", "as": "upper", "op": "eq", "value": ""},
+                             {"col": "B.PS.01: Load Posting Status", "as": "upper", "op": "isin",
+                              "values": ["C", "PP", "PR", "TP", "TR"]}]},
+                ]}},
+                {"any": ["comments_blank", {"not": {"any": [
+                    {"col": col, "op": "contains", "escape": True, "regex": STAN_PAT, "words": [
+                        "SU4", "close bridge", "closed", "based on a parametric", "based on the parametric",
+                        "J7", "J24", "Standards"
+                    ]} for col in ["Comments", "Comment Inv Rating"]
+                ]}}]},
+                # Valid Year Built
+                {"col": "B.W.01: Year Built", "op": "notna"},
+                {"col": "B.W.01: Year Built", "as": "strip", "op": "ne", "value": ""},
+                # G1 methods with Operating Rating < 45
+                {"not": {"all": [
+                    {"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "isin",
+                     "values": ["1", "2", "3", "4", "5", "A", "C"]},
+                    {"col": "NBI 064 Operating Rating", "as": "numeric", "op": "lt", "value": 45},
+                ]}},
+                # G2 methods with Operating Rating (or Rating Factor) < 1.26
+                {"not": {"all": [
+                    {"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "isin",
+                     "values": ["6", "7", "8", "F", "D"]},
+                    {"col": "NBI 064 Operating Rating", "as": "numeric", "op": "lt", "value": 1.26,
+                     "fallback": {"col": "B.LR.06: Operating Load Rating Factor", "as": "numeric",
+                                  "op": "lt", "value": 1.26}},
+                ]}},
+            ]},
+        },
+
+        "action5": {
+            "keep": {"all": [
+                {"not": "county_city"},
+                "su7_only_int",
+                {"col": "NBI 063 Method Used Operating Rating", "as": "numeric", "op": "ne", "value": 0},
+                {"not": {"col": "NBI 041 Open, Posted Or Closed", "op": "isin", "values": ["P", "R", "K"],
+                         "fallback": {"col": "B.PS.01: Load Posting Status", "op": "isin",
+                                      "values": ["C", "PP", "PR"]}}},
+                {"not": {"any": [
+                    {"col": col, "op": "contains", "escape": True, "regex": STAN_PAT, "words": [
+                        "SU4", "close bridge", "closed", "based on a parametric", "based on the parametric",
+                        "Standards"
+                    ]} for col in ["Comments", "Comment Inv Rating"]
+                ]}},
+            ]},
+        },
+
+        "action6": {
+            "keep": {"all": [
+                {"not": "county_city"},
+                "no_tons_int",
+                {"not": {"col": "B.LR.04: Load Rating Method", "as": "upper", "op": "isin", "values": ["EJ", "AR"]}},
+                {"not": {"col": "NBI 041 Open, Posted Or Closed", "as": "upper", "op": "isin",
+                         "values": ["R", "P", "K"],
+                         "fallback": {"col": "B.PS.01: Load Posting Status", "as": "upper", "op": "isin",
+                                      "values": ["C", "PP", "PR"]}}},
+                {"any": ["comments_blank", {"not": {"any": [
+                    {"col": col, "op": "contains", "escape": True, "regex": STAN_PAT, "words": [
+                        "SU4", "close bridge", "closed", "based on a parametric", "based on the parametric",
+                        "Standards"
+                    ]} for col in ["Comments", "Comment Inv Rating"]
+                ]}}]},
+                # G1 methods with Operating Rating < 45
+                {"not": {"all": [
+                    {"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "isin",
+                     "values": ["1", "2", "3", "4", "5", "A", "C"]},
+                    {"col": "NBI 064 Operating Rating", "as": "numeric", "op": "lt", "value": 45},
+                ]}},
+                # Year Built = 0
+                {"not": {"col": "B.W.01: Year Built", "as": "str", "op": "eq", "value": "0"}},
+                # G2 methods with Operating Rating < 1.26, or no method and Rating Factor < 1.26
+                {"not": {"any": [
+                    {"all": [{"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "isin",
+                              "values": ["6", "7", "8", "F", "D", "f", "d"]},
+                             {"col": "NBI 064 Operating Rating", "as": "numeric", "op": "lt", "value": 1.26}]},
+                    {"all": [{"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "isna"},
+                             {"col": "B.LR.06: Operating Load Rating Factor", "as": "numeric",
+                              "op": "lt", "value": 1.26}]},
+                ]}},
+                # Blank or missing Method Used
+                {"not": {"any": [
+                    {"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "isna"},
+                    {"col": "NBI 063 Method Used Operating Rating", "as": "upper", "op": "eq", "value": ""},
+                ]}},
+            ]},
+        },
+    },
+}
 
-    # Keep only Operating Rating = 2 (or NaN)
-    ACT7["NBI 063 Method Used Operating Rating"] = pd.to_numeric(
-        ACT7["NBI 063 Method Used Operating Rating"], errors='coerce'
-    )
-    ACT7 = ACT7[(ACT7["NBI 063 Method Used Operating Rating"] == 2) |
-                (ACT7["NBI 063 Method Used Operating Rating"].isna())]
 
-    # Load Rating Method == ASR
-    ACT7 = ACT7[ACT7["B.LR.04: Load Rating Method"] == "ASR"]
+# -------------------------------
+# Query Planner
+# -------------------------------
+
+# Relative cost of a column test, used to order filters so the expensive
+# string scans only run on rows the cheap tests have not already removed.
+_OP_COST = {"contains": 20, "startswith": 5, "endswith": 5}
+_AS_COST = {"str": 5, "strip": 5, "upper": 5, "code": 10}
 
-    # Filter out certain Main Structure Types or Span Materials
-    ACT7["NBI 043 Main Structure Type"] = pd.to_numeric(
-        ACT7["NBI 043 Main Structure Type"], errors='coerce'
-    )
-    MAIN_STRUC = [701, 702, 300, 400, 301, 401]
-    SPAN_MAT = ["M01", "M02", "SX", "T01", "T02", "T03", "T04", "TX", "X"]
-    ACT7 = ACT7[~(ACT7["NBI 043 Main Structure Type"].isin(MAIN_STRUC) |
-                  ACT7["NBI 043 Main Structure Type"].isna() |
-#                  ACT7["NBI 043 Main Structure Type"] == "") |
-                  ACT7["B.SP.04: Span Material - Main"].isin(SPAN_MAT))]
 
-    # Filter out closed or posted bridges
-    ACT7 = ACT7[~((ACT7["NBI 041 Open, Posted Or Closed"] == "K") |
-                  (ACT7["NBI 041 Open, Posted Or Closed"].isna() &
-                   (ACT7["B.PS.01: Load Posting Status"] == "C")))]
+def load_rules(path):
+    """
+    Load a rule specification (same layout as RULES) from a JSON file.
+    """
+    import json
+
+    with open(path) as f:
+        rules = json.load(f)
+    if "version" not in rules:
+        raise ValueError(f"Rule file {path} has no version")
+    return rules
 
-    # Remove rows based on critical location keywords
-    CRI_LOC = ["timber", "plank", "long", "trans", "pile", "piling", "standard", "std"]
-    CRI_LOC_PAT = "|".join(CRI_LOC)
-    ACT7 = ACT7[~ACT7["critical location"].str.contains(CRI_LOC_PAT, case=False, na=False)]
 
-    # Remove rows based on comment keywords
-    COM = ["30 ksi", "flatcar", "testing", "salvage", "standard"]
-    COM_PAT = "|".join(COM)
-    ACT7["Comments"] = ACT7["Comments"].astype(str)
-    ACT7["Comment Inv Rating"] = ACT7["Comment Inv Rating"].astype(str)
-    ACT7 = ACT7[~ACT7["Comments"].str.contains(COM_PAT, case=False, na=False)]
-    ACT7 = ACT7[~ACT7["Comment Inv Rating"].str.contains(COM_PAT, case=False, na=False)]
+def compile_rules(rules=None):
+    """
+    Compile a rule specification into a query plan.
+    - Named predicates are inlined and "fallback" tests expanded
+    - Nested all/any groups are flattened and ordered by cost
+    - Every node is a hashable tuple, so a sub-expression shared by several
+      actions is evaluated once per frame
+    """
+    rules = RULES if rules is None else rules
+    predicates = rules.get("predicates", {})
+    named = {}
+
+    def node(expr, resolving=()):
+        if isinstance(expr, str):
+            if expr not in predicates:
+                raise KeyError(f"Unknown predicate: {expr}")
+            if expr in resolving:
+                raise ValueError(f"Predicate {expr} refers to itself")
+            if expr not in named:
+                named[expr] = node(predicates[expr], resolving + (expr,))
+            return named[expr]
+
+        for kind in ("all", "any"):
+            if kind in expr:
+                children = []
+                for child in (node(e, resolving) for e in expr[kind]):
+                    children.extend(child[1] if child[0] == kind else [child])
+                if len(children) == 1:
+                    return children[0]
+                return (kind, tuple(sorted(children, key=_cost)))
+
+        if "not" in expr:
+            child = node(expr["not"], resolving)
+            return child[1] if child[0] == "not" else ("not", child)
+
+        col, op, as_ = expr["col"], expr["op"], expr.get("as")
+        if op == "contains":
+            words = [re.escape(w) if expr.get("escape") else w for w in expr["words"]]
+            arg = _keyword_pattern(words + list(expr.get("regex", [])))
+        elif op in ("isin", "startswith", "endswith"):
+            arg = tuple(expr["values"])
+        elif op in ("isna", "notna"):
+            arg = None
+        else:
+            arg = expr["value"]
+        test = ("col", col, as_, op, arg)
 
-    return ACT7
+        if "fallback" in expr:
+            missing = ("col", col, as_, "isna", None)
+            fallback = node(expr["fallback"], resolving)
+            return ("any", (test, ("all", tuple(sorted([missing, fallback], key=_cost)))))
+        return test
 
+    plan = {"version": rules["version"], "actions": {}}
+    for action, parts in rules["actions"].items():
+        plan["actions"][action] = {name: node(expr) for name, expr in parts.items()}
+    return plan
 
-def action9(RAW):
+
+def _keyword_pattern(terms):
     """
-    Process Action 9:
-    - Remove certain districts
-    - Filter bridges based on Operating Rating, Load Rating Method, Design Load
-    - Filter Open/Posted status and Year Built
-    - Classify bridges as Standard or Non-Standard
+    Combine the keywords of a "contains" test into one pattern for matching
+    lower-cased text (so no case-insensitive flag is needed):
+    - plain words go into a prefix tree, so a shared prefix is tested once
+    - regular expressions are lower-cased outside their escapes
     """
-    ACT9 = RAW.copy()
+    words = []
+    patterns = []
+    for term in terms:
+        if re.fullmatch(r"(?:[^.^$*+?{}\[\]\\|()]|\\[^0-9A-Za-z])*", term):
+            words.append(re.sub(r"\\(.)", r"\1", term).lower())
+        else:
+            patterns.append(re.sub(r"\\.|[^\\]+", lambda m: m.group() if m.group()[0] == "\\" else m.group().lower(), term))
+
+    root = {}
+    for word in words:
+        node = root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def branch(node):
+        alts = []
+        for ch, child in sorted(node.items()):
+            if not ch:
+                continue
+            run = ch
+            while len(child) == 1 and "" not in child:
+                (next_ch, child), = child.items()
+                run += next_ch
+            alts.append(re.escape(run) + branch(child))
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + body + ")?" if "" in node else body
 
-    districts = [f"State Bridges > District {i}" for i in range(1, 7)]
-    ACT9 = ACT9[~ACT9["Parent Asset"].isin(districts)]
+    return "|".join(([branch(root)] if words else []) + patterns)
 
-    # Operating Rating == 1 or NaN
-    ACT9["NBI 063 Method Used Operating Rating"] = pd.to_numeric(
-        ACT9["NBI 063 Method Used Operating Rating"], errors='coerce'
-    )
-    ACT9 = ACT9[(ACT9["NBI 063 Method Used Operating Rating"] == 1) |
-                (ACT9["NBI 063 Method Used Operating Rating"].isna())]
 
-    # Load Rating Method == LFR
-    ACT9 = ACT9[ACT9["B.LR.04: Load Rating Method"] == "LFR"]
+def _cost(node):
+    if node[0] == "col":
+        return _OP_COST.get(node[3], 1) + _AS_COST.get(node[2], 0)
+    if node[0] == "not":
+        return _cost(node[1])
+    return sum(_cost(child) for child in node[1])
 
-    # Design Load
-    ACT9 = ACT9[(ACT9["NBI 031 Design Load"] == "A") |
-                (ACT9["NBI 031 Design Load"].isna() &
-                 (ACT9["B.LR.01: Design Load"] == "HL93"))]
 
-    # Filter Open/Posted status
-    ACT9 = ACT9[~((ACT9["NBI 041 Open, Posted Or Closed"] == "K") |
-                  (ACT9["NBI 041 Open, Posted Or Closed"].isna() &
-                   (ACT9["B.PS.01: Load Posting Status"] == "C")))]
+def build_action_context(RAW, rules=None, plan=None):
+    """
+    Build the evaluation context for one frame (RAW, RAW2 or RAW3).
+    Holds the compiled plan plus a memo of every evaluated node and coerced
+    column, so masks shared by several actions are computed once per run.
+    Actions sharing a context may run in threads (see run_pipeline).
+    """
+    return {
+        "raw": RAW,
+        "plan": plan if plan is not None else compile_rules(rules),
+        "memo": {},
+        "columns": {},
+        "distinct": {},
+        "text": {},
+        "digests": {},
+        "lock": threading.Lock(),
+    }
+
+
+def rule_mask(ctx, action, name, rows=None):
+    """
+    Boolean numpy array of the rows (within `rows`, default all) matching
+    rule `name` of `action`.
+    """
+    return evaluate(ctx, ctx["plan"]["actions"][action][name], rows)
 
-    # Filter Year Built
-    ACT9 = ACT9[~((ACT9["NBI 027 Year Built"] < 2010) |
-                  (ACT9["NBI 027 Year Built"].isna() &
-                   (ACT9["B.W.01: Year Built"] < 2010)))]
 
-    # Classify Standard vs Non-Standard
-    COM = ["standard", "std", "STANDARD"]
-    COM_PAT = "|".join(COM)
-    ACT9["Comments"] = ACT9["Comments"].astype(str).fillna("")
-    ACT9["Comment Inv Rating"] = ACT9["Comment Inv Rating"].astype(str).fillna("")
+def evaluate(ctx, node, rows=None):
+    """
+    Evaluate a compiled node on the rows selected by `rows`.
+    Results are memoized per row, so a node is never computed twice for the
+    same row and filters later in a chain only see the rows still alive.
+    """
+    n = len(ctx["raw"])
+    if rows is None:
+        rows = np.ones(n, dtype=bool)
+
+    entry = ctx["memo"].get(node)
+    if entry is None:
+        # [rows evaluated, values, count evaluated, count true]
+        entry = ctx["memo"].setdefault(node, [np.zeros(n, dtype=bool), np.zeros(n, dtype=bool), 0, 0])
+
+    todo = rows & ~entry[0]
+    if todo.any():
+        result = _compute(ctx, node, todo) & todo
+    # Merged under the lock: threads filling the same entry would
+    # otherwise overwrite each other's rows
+    with ctx["lock"]:
+        if todo.any():
+            entry[1] |= result
+            entry[0] |= todo
+            entry[2] += int(todo.sum())
+            entry[3] += int(result.sum())
+        return entry[1] & rows
+
+
+def _selectivity(ctx, node):
+    """Fraction of evaluated rows where node was true (0.5 if not yet seen)."""
+    entry = ctx["memo"].get(node)
+    if entry is None or entry[2] == 0:
+        return 0.5
+    return entry[3] / entry[2]
+
+
+def _ordered(ctx, children, kind):
+    """
+    Order children for lazy evaluation: cheapest per row removed first.
+    For "all" that is cost / fraction failing, for "any" cost / fraction passing.
+    """
+    n = len(ctx["raw"])
+
+    def rank(child):
+        entry = ctx["memo"].get(child)
+        cost = 0 if entry is not None and entry[2] == n else _cost(child)
+        sel = _selectivity(ctx, child)
+        decisive = (1 - sel) if kind == "all" else sel
+        return cost / max(decisive, 1e-6)
+
+    return sorted(children, key=rank)
+
+
+def _compute(ctx, node, rows):
+    kind = node[0]
+
+    if kind == "not":
+        return ~evaluate(ctx, node[1], rows)
+
+    if kind == "all":
+        alive = rows.copy()
+        for child in _ordered(ctx, node[1], "all"):
+            alive &= evaluate(ctx, child, alive)
+            if not alive.any():
+                break
+        return alive
+
+    if kind == "any":
+        hit = np.zeros(len(rows), dtype=bool)
+        pending = rows.copy()
+        for child in _ordered(ctx, node[1], "any"):
+            found = evaluate(ctx, child, pending)
+            hit |= found
+            pending &= ~found
+            if not pending.any():
+                break
+        return hit
+
+    return _column_test(ctx, node, rows)
+
+
+def _try_numeric(val):
+    try:
+        f = float(val)
+        return int(f) if f.is_integer() else f
+    except:
+        return val
+
+
+def _map_distinct(values, func):
+    """func of every value of a Series (object array), called once per distinct value."""
+    out = np.empty(len(values), dtype=object)
+    codes, uniques = pd.factorize(values)
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = [func(v) for v in uniques]
+    found = codes >= 0
+    out[found] = mapped[codes[found]]
+
+    missing = np.flatnonzero(~found)
+    if len(missing) and (not isinstance(values.dtype, np.dtype) or values.dtype.kind == "f"):
+        out[missing] = func(np.nan) # Categorical/Arrow missing values stand for NaN
+    elif len(missing):
+        # Missing values (NaN, None, NaT, ...) are not all alike, so map each one
+        out[missing] = [func(v) for v in values.to_numpy(dtype=object)[missing]]
+    return out
+
+
+def _try_numeric_values(values):
+    """_try_numeric of every value of a Series, as an object array."""
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf":
+        f = values.to_numpy(dtype=float)
+        out = f.astype(object)
+        whole = np.isfinite(f) & (np.floor(f) == f)
+        small = whole & (np.abs(f) < 2**63)
+        out[small] = f[small].astype(np.int64).astype(object)
+        out[whole & ~small] = [int(v) for v in f[whole & ~small]]
+        return out
+    return _map_distinct(values, _try_numeric)
+
+
+def _column(ctx, col, as_=None, rows=None):
+    """
+    Values of column `col` read as `as_` (see RULES), for the selected rows.
+    Every conversion is done once on the full column and cached, so the
+    context is the typed view of the frame that all actions read from.
+    """
+    RAW = ctx["raw"]
+    if as_ is None:
+        return RAW[col] if rows is None else RAW[col][rows]
+
+    key = (col, as_)
+    if key not in ctx["columns"]:
+        if as_ in ("numeric", "numeric0", "int0"):
+            if col in RAW.columns:
+                values = pd.to_numeric(RAW[col], errors="coerce")
+            else:
+                values = pd.Series(0, index=RAW.index) # Missing traffic columns count as 0
+            if as_ != "numeric":
+                values = values.fillna(0)
+            if as_ == "int0":
+                values = values.astype(int)
+        elif as_ == "number":
+            values = pd.Series(_try_numeric_values(RAW[col]), index=RAW.index, dtype=object)
+        elif as_ == "code":
+            values = pd.Series(
+                _map_distinct(RAW[col], lambda x: str(_try_numeric(x)).strip()), index=RAW.index, dtype=object
+            )
+        elif as_ == "str":
+            values = RAW[col]
+            if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf":
+                # Same text as astype(str), formatted by numpy instead of per cell
+                values = pd.Series(values.to_numpy().astype(str).astype(object), index=RAW.index)
+            elif isinstance(values.dtype, pd.StringDtype):
+                # Arrow strings stay Arrow; missing reads as "nan" like astype(str) of NaN
+                values = values.fillna("nan")
+            else:
+                values = values.astype(str)
+        elif as_ == "strip":
+            values = _column(ctx, col, "str").str.strip()
+        elif as_ == "upper":
+            values = _column(ctx, col, "strip").str.upper()
+        else:
+            raise ValueError(f"Unknown column reading: {as_}")
+        ctx["columns"][key] = values
 
-    ACT9_S = ACT9[(ACT9["Comments"].str.contains(COM_PAT, case=False, na=False)) |
-                  (ACT9["Comment Inv Rating"].str.contains(COM_PAT, case=False, na=False))].copy()
-    ACT9_S["Standard/Non-Standard"] = "Standard"
+    values = ctx["columns"][key]
+    return values if rows is None else values[rows]
 
-    ACT9_NS = ACT9[~((ACT9["Comments"].str.contains(COM_PAT, case=False, na=False)) |
-                     (ACT9["Comment Inv Rating"].str.contains(COM_PAT, case=False, na=False)))].copy()
-    ACT9_NS["Standard/Non-Standard"] = "Non-Standard"
 
-    ACT9_F = pd.concat([ACT9_S, ACT9_NS], ignore_index=True)
-    return ACT9_F
+def _distinct(ctx, col, as_):
+    """
+    (codes, distinct values) of a column reading, factorized once per frame
+    so string tests run on each distinct value only and are broadcast back
+    through the codes. Missing values have code -1.
+    """
+    key = (col, as_)
+    if key not in ctx["distinct"]:
+        values = _column(ctx, col, as_)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            uniques = pd.Series(values.cat.categories, dtype=object)
+        else:
+            if not pd.api.types.is_string_dtype(values.dtype):
+                values = values.astype(str) # e.g. an all-empty (float) comment column
+            codes, uniques = pd.factorize(values)
+            uniques = pd.Series(uniques)
+        ctx["distinct"][key] = (codes, uniques)
+    return ctx["distinct"][key]
 
 
-def action15(RAW):
+def _string_test(ctx, col, as_, op, arg, rows):
     """
-    Process Action 15:
-    - Remove certain districts
-    - Keep bridges with Load Rating Method == AR
-    - Split and filter bridges built before 1972 and before 1992 based on structure type and span type
-    - Filter based on Year Built and Year Reconstructed
+    contains (arg from _keyword_pattern), startswith or endswith on the
+    selected rows, evaluated on the distinct values those rows hold.
+    Missing values never match.
     """
-    ACT15 = RAW.copy()
+    codes, uniques = _distinct(ctx, col, as_)
+    needed = np.zeros(len(uniques), dtype=bool)
+    present = codes[rows]
+    needed[present[present >= 0]] = True
+
+    # One extra slot, so code -1 picks False
+    hit = np.zeros(len(uniques) + 1, dtype=bool)
+    if op == "contains":
+        key = (col, as_)
+        if key not in ctx["text"]:
+            ctx["text"][key] = _lowered(uniques)
+        hit[:-1] = _keyword_match(ctx["text"][key], arg, needed)
+    elif needed.any():
+        values = uniques[needed]
+        if op == "startswith":
+            result = values.str.startswith(arg, na=False)
+        else:
+            result = values.str.endswith(arg, na=False)
+        hit[:-1][needed] = result.to_numpy(dtype=bool, na_value=False)
+    return hit[codes] & rows
 
-    # Remove Parent Asset = State Bridges > District #
-    districts = [f"State Bridges > District {i}" for i in range(1, 7)]
-    ACT15 = ACT15[~ACT15["Parent Asset"].isin(districts)]
 
-    # Keep Load Rating Method == AR
-    ACT15 = ACT15[ACT15["B.LR.04: Load Rating Method"] == "AR"]
+def _lowered(values):
+    """
+    (values, lower-cased values, non-ASCII mask) of distinct text values for
+    _keyword_match. Each text column is lower-cased once per frame and
+    shared by every keyword test of every action. Arrow strings are
+    lower-cased by Arrow, then matched as Python strings (Arrow regexes
+    have no lookbehind, used by STAN_PAT).
+    """
+    lower = values.str.lower()
+    if not isinstance(values.dtype, np.dtype):
+        values = pd.Series(values.to_numpy(dtype=object, na_value=np.nan), index=values.index)
+        lower = pd.Series(lower.to_numpy(dtype=object, na_value=np.nan), index=values.index)
+    unicode = np.array([isinstance(v, str) and not v.isascii() for v in values.tolist()], dtype=bool)
+    return values, lower, unicode
 
-    # Before 1972 subset
-    SPAN_MAT = ["F01", "F02", "F03", "F04", "P01", "P02"]
-    ACT15_72 = ACT15[
-        ACT15["NBI 043 Main Structure Type"].astype(str).str.endswith("19") |
-        (ACT15["NBI 043 Main Structure Type"].isna() & ACT15["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
 
-    ACT15_72 = ACT15_72[
-        ((ACT15_72["NBI 027 Year Built"] <= 1972) |
-         (ACT15_72["NBI 027 Year Built"].isna() & (ACT15_72["B.W.01: Year Built"] < 1972))) &
-        ((ACT15_72["NBI 106 Year Reconst"].isna()) | (ACT15_72["NBI 106 Year Reconst"] <= 1972))
-    ]
+def _keyword_match(text, pattern, rows):
+    """
+    Match pattern on the selected rows of a _lowered column. Rows with
+    non-ASCII text, where Unicode case folding differs from lower(), are
+    matched case-insensitively as is.
+    """
+    values, lower, unicode = text
+    result = np.zeros(len(rows), dtype=bool)
+    plain = rows & ~unicode
+    result[plain] = lower[plain].str.contains(pattern, na=False, regex=True).to_numpy(dtype=bool)
+    other = rows & unicode
+    if other.any():
+        result[other] = values[other].str.contains(pattern, flags=re.IGNORECASE, na=False, regex=True).to_numpy(dtype=bool)
+    return result
+
+
+def _column_test(ctx, node, rows):
+    _, col, as_, op, arg = node
+
+    if op in ("contains", "startswith", "endswith"):
+        return _string_test(ctx, col, as_, op, arg, rows)
+
+    values = _column(ctx, col, as_, rows)
+
+    if op == "eq":
+        result = values == arg
+    elif op == "ne":
+        result = values != arg
+    elif op == "lt":
+        result = values < arg
+    elif op == "le":
+        result = values <= arg
+    elif op == "gt":
+        result = values > arg
+    elif op == "ge":
+        result = values >= arg
+    elif op == "isin":
+        result = values.isin(arg)
+    elif op == "isna":
+        result = values.isna()
+    elif op == "notna":
+        result = values.notna()
+    else:
+        raise ValueError(f"Unknown rule op: {op}")
+
+    out = np.zeros(len(rows), dtype=bool)
+    out[rows] = result.to_numpy(dtype=bool, na_value=False) # Arrow comparisons leave missing as NA
+    return out
+
+
+def _rows(*masks):
+    """
+    Positions of the rows of each mask in turn (like concatenating the
+    filtered subsets), one array per mask.
+    """
+    return [np.flatnonzero(mask) for mask in masks]
 
-    # Before 1992 subset
-    ACT15_92 = ACT15[
-        (~ACT15["NBI 043 Main Structure Type"].astype(str).str.endswith("19")) |
-        (ACT15["NBI 043 Main Structure Type"].isna() & ~ACT15["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
 
-    ACT15_92 = ACT15_92[
-        ((ACT15_92["NBI 027 Year Built"] <= 1992) |
-         (ACT15_92["NBI 027 Year Built"].isna() & (ACT15_92["B.W.01: Year Built"] < 1992))) &
-        ((ACT15_92["NBI 106 Year Reconst"].isna()) | (ACT15_92["NBI 106 Year Reconst"] <= 1992))
-    ]
+def _result(ctx, rows, readings=(), reset_index=True):
+    """
+    Result of an action on the context's frame (RAW, RAW2 or RAW3):
+    - rows: positions of the frame's rows, in output order (given as a list
+      of arrays when the output joins several subsets, see _rows)
+    - parts: number of rows of each subset, in order
+    - columns: the columns the action writes, as arrays aligned with rows
+      (readings gives them as (column, as) pairs, see RULES)
+    - readings: the (column, as) pairs the columns were read from
+    - reset_index: output numbered 0..n-1, else it keeps the frame's index
+    - drop: columns left out of the output
+    The DataFrame itself is only built by materialize().
+    """
+    parts = rows if isinstance(rows, list) else [rows]
+    rows = np.concatenate(parts)
+    return {
+        "rows": rows,
+        "parts": [len(part) for part in parts],
+        "columns": {col: _column(ctx, col, as_).to_numpy()[rows] for col, as_ in readings},
+        "readings": list(readings),
+        "reset_index": reset_index,
+        "drop": [],
+    }
 
-    # Combine subsets
-    ACT15_F = pd.concat([ACT15_72, ACT15_92], ignore_index=True)
 
-    return ACT15_F
+def _filled(ctx, col, rows):
+    """Values of `col` at `rows` with missing values as "" (fillna(""))."""
+    values = ctx["raw"][col].to_numpy(dtype=object, na_value=np.nan)[rows]
+    return pd.Series(values, dtype=object).fillna("").to_numpy()
 
 
-def action16(RAW):
+def materialize(RAW, result):
     """
-    Process Action 16:
+    DataFrame of an action result on the frame it was evaluated on.
+    """
+    df = RAW.iloc[result["rows"]]
+    if result["reset_index"]:
+        df = df.reset_index(drop=True)
+    for col, values in result["columns"].items():
+        df[col] = values
+    return df.drop(columns=result["drop"], errors="ignore")
+
+
+# -------------------------------
+# Action Item Functions (From Part 1)
+# -------------------------------
+#
+# Actions return results (see _result): the row positions they keep plus
+# the columns they write. materialize() builds the DataFrame.
+
+def action7(RAW, ctx=None):
+    """
+    Process Action 7:
     - Remove certain districts
-    - Keep bridges with Load Rating Method == AR
-    - Split and filter bridges built after 1972 and after 1992 based on structure type and span type
-    - Remove bridges with standard/design-related comments
+    - Filter by Year Built, Load Rating, Main Structure Type, Open/Posted status
+    - Exclude rows with specific critical locations and comment patterns
     """
-    ACT16 = RAW.copy()
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # Remove Parent Asset = State Bridges > District #
-    districts = [f"State Bridges > District {i}" for i in range(1, 7)]
-    ACT16 = ACT16[~ACT16["Parent Asset"].isin(districts)]
+    keep = rule_mask(ctx, "action7", "keep")
 
-    # Keep Load Rating Method == AR
-    ACT16 = ACT16[ACT16["B.LR.04: Load Rating Method"] == "AR"]
+    return _result(ctx, np.flatnonzero(keep), [
+        ("NBI 063 Method Used Operating Rating", "numeric"),
+        ("NBI 043 Main Structure Type", "numeric"),
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+    ], reset_index=False)
 
-    # After 1972 subset
-    SPAN_MAT = ["F01", "F02", "F03", "F04", "P01", "P02"]
-    ACT16_72 = ACT16[
-        ACT16["NBI 043 Main Structure Type"].astype(str).str.endswith("19") |
-        (ACT16["NBI 043 Main Structure Type"].isna() & ACT16["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
 
-    ACT16_72 = ACT16_72[
-        ((ACT16_72["NBI 027 Year Built"] > 1972) |
-         (ACT16_72["NBI 027 Year Built"].isna() & (ACT16_72["B.W.01: Year Built"] > 1972))) &
-        ((ACT16_72["NBI 106 Year Reconst"].isna()) |
-         (ACT16_72["NBI 106 Year Reconst"] == 0) |
-         (ACT16_72["NBI 106 Year Reconst"] > 1972))
-    ]
+def action9(RAW, ctx=None):
+    """
+    Process Action 9:
+    - Remove certain districts
+    - Filter bridges based on Operating Rating, Load Rating Method, Design Load
+    - Filter Open/Posted status and Year Built
+    - Classify bridges as Standard or Non-Standard
+    """
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # After 1992 subset
-    ACT16_92 = ACT16[
-        (~ACT16["NBI 043 Main Structure Type"].astype(str).str.endswith("19")) |
-        (ACT16["NBI 043 Main Structure Type"].isna() & ~ACT16["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
-
-    ACT16_92 = ACT16_92[
-        ((ACT16_92["NBI 027 Year Built"] > 1992) |
-         (ACT16_92["NBI 027 Year Built"].isna() & (ACT16_92["B.W.01: Year Built"] > 1992))) &
-        ((ACT16_92["NBI 106 Year Reconst"].isna()) |
-         (ACT16_92["NBI 106 Year Reconst"] == 0) |
-         (ACT16_92["NBI 106 Year Reconst"] > 1992))
-    ]
+    keep = rule_mask(ctx, "action9", "keep")
+
+    # Classify Standard vs Non-Standard
+    std = rule_mask(ctx, "action9", "standard", keep)
+    ACT9_S = keep & std
+    ACT9_NS = keep & ~std
+
+    ACT9_F = _result(ctx, _rows(ACT9_S, ACT9_NS), [
+        ("NBI 063 Method Used Operating Rating", "numeric"),
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+    ])
+    ACT9_F["columns"]["Standard/Non-Standard"] = np.repeat(
+        ["Standard", "Non-Standard"], [ACT9_S.sum(), ACT9_NS.sum()]
+    )
+    return ACT9_F
+
+
+def action15(RAW, ctx=None):
+    """
+    Process Action 15:
+    - Remove certain districts
+    - Keep bridges with Load Rating Method == AR
+    - Split and filter bridges built before 1972 and before 1992 based on structure type and span type
+    - Filter based on Year Built and Year Reconstructed
+    """
+    if ctx is None:
+        ctx = build_action_context(RAW)
+
+    ACT15_72 = rule_mask(ctx, "action15", "before_1972")
+    ACT15_92 = rule_mask(ctx, "action15", "before_1992")
 
     # Combine subsets
-    ACT16_F = pd.concat([ACT16_72, ACT16_92], ignore_index=True)
+    return _result(ctx, _rows(ACT15_72, ACT15_92))
 
-    # Remove bridges with standard/design-related comments
-    COM = [
-        "standard", "std", "design load per certified", "based on field measurements", "HL-93",
-        "exterior wall reinforcing is inadequate", "bridge plan was HS20", "shop drawing not available",
-        "exterior wall under reinforced", "shop drawings not available", "bridge plans was HS20",
-        "Per field measurements", "assignment", "design load", "HS20 design", "HS-20 live",
-        "HS 20 design", "high fill depth", "Unable to Provide"
-    ]
-    COM_PAT = "|".join(COM)
-    ACT16_F["Comments"] = ACT16_F["Comments"].astype(str)
-    ACT16_F["Comment Inv Rating"] = ACT16_F["Comment Inv Rating"].astype(str)
 
-    ACT16_F = ACT16_F[~(
-        ACT16_F["Comments"].str.contains(COM_PAT, case=False, na=False) |
-        ACT16_F["Comment Inv Rating"].str.contains(COM_PAT, case=False, na=False)
-    )]
+def action16(RAW, ctx=None):
+    """
+    Process Action 16:
+    - Remove certain districts
+    - Keep bridges with Load Rating Method == AR
+    - Split and filter bridges built after 1972 and after 1992 based on structure type and span type
+    - Remove bridges with standard/design-related comments
+    """
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    return ACT16_F
+    ACT16_72 = rule_mask(ctx, "action16", "after_1972")
+    ACT16_92 = rule_mask(ctx, "action16", "after_1992")
 
+    # Remove bridges with standard/design-related comments
+    drop = rule_mask(ctx, "action16", "comments", ACT16_72 | ACT16_92)
 
-def action17(RAW):
+    # Combine subsets
+    return _result(ctx, _rows(ACT16_72 & ~drop, ACT16_92 & ~drop), [
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+    ])
+
+
+def action17(RAW, ctx=None):
     """
     Process Action 17:
     - Remove County and City Bridges
     - Keep bridges with Load Rating Method == AR
     - Split and filter bridges built before 1972 and before 1992 based on structure type and span type
     """
-    ACT17 = RAW.copy()
-
-    # Remove County and City Bridges
-    bridge = ["County Bridges", "City Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT17 = ACT17[~ACT17["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
-
-    # Keep Load Rating Method == AR
-    ACT17 = ACT17[ACT17["B.LR.04: Load Rating Method"] == "AR"]
-
-    # Ensure numeric fields
-    ACT17["NBI 027 Year Built"] = pd.to_numeric(ACT17["NBI 027 Year Built"], errors='coerce')
-    ACT17["NBI 106 Year Reconst"] = pd.to_numeric(ACT17["NBI 106 Year Reconst"], errors='coerce')
-
-    # Before 1972 subset
-    SPAN_MAT = ["F01", "F02", "F03", "F04", "P01", "P02"]
-    ACT17_72 = ACT17[
-        ACT17["NBI 043 Main Structure Type"].astype(str).str.endswith("19") |
-        (ACT17["NBI 043 Main Structure Type"].isna() & ACT17["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
-
-    ACT17_72 = ACT17_72[
-        ((ACT17_72["NBI 027 Year Built"] <= 1972) |
-         (ACT17_72["NBI 027 Year Built"].isna() & (ACT17_72["B.W.01: Year Built"] < 1972))) &
-        (ACT17_72["NBI 106 Year Reconst"].isna() |
-         (ACT17_72["NBI 106 Year Reconst"] <= 1972) |
-         (ACT17_72["NBI 106 Year Reconst"] == 0))
-    ]
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # Before 1992 subset
-    ACT17_92 = ACT17[
-        (~ACT17["NBI 043 Main Structure Type"].astype(str).str.endswith("19")) |
-        (ACT17["NBI 043 Main Structure Type"].isna() & ~ACT17["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
-
-    ACT17_92 = ACT17_92[
-        ((ACT17_92["NBI 027 Year Built"] <= 1992) |
-         (ACT17_92["NBI 027 Year Built"].isna() & (ACT17_92["B.W.01: Year Built"] < 1992))) &
-        (ACT17_92["NBI 106 Year Reconst"].isna() |
-         (ACT17_92["NBI 106 Year Reconst"] <= 1992) |
-         (ACT17_92["NBI 106 Year Reconst"] == 0))
-    ]
-
-    # Combine subsets
-    ACT17_F = pd.concat([ACT17_72, ACT17_92], ignore_index=True)
+    ACT17_72 = rule_mask(ctx, "action17", "before_1972")
+    ACT17_92 = rule_mask(ctx, "action17", "before_1992")
 
-    return ACT17_F
+    # Combine subsets (numeric Year Built / Year Reconst in the output)
+    return _result(ctx, _rows(ACT17_72, ACT17_92), [
+        ("NBI 027 Year Built", "numeric"),
+        ("NBI 106 Year Reconst", "numeric"),
+    ])
 
 
-def action18(RAW):
+def action18(RAW, ctx=None):
     """
     Process Action 18:
     - Remove County and City Bridges
@@ -332,64 +1335,23 @@ def action18(RAW):
     - Split and filter bridges built after 1972 and after 1992 based on structure type and span type
     - Remove bridges with specific comments
     """
-    ACT18 = RAW.copy()
-
-    # Remove County and City Bridges
-    bridge = ["County Bridges", "City Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT18 = ACT18[~ACT18["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
-
-    # Keep Load Rating Method == AR
-    ACT18 = ACT18[ACT18["B.LR.04: Load Rating Method"] == "AR"]
-
-    # After 1972 subset
-    SPAN_MAT = ["F01", "F02", "F03", "F04", "P01", "P02"]
-    ACT18_72 = ACT18[
-        ACT18["NBI 043 Main Structure Type"].astype(str).str.endswith("19") |
-        (ACT18["NBI 043 Main Structure Type"].isna() & ACT18["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
-
-    ACT18_72 = ACT18_72[
-        ((ACT18_72["NBI 027 Year Built"] > 1972) |
-         (ACT18_72["NBI 027 Year Built"].isna() & (ACT18_72["B.W.01: Year Built"] > 1972))) &
-        (ACT18_72["NBI 106 Year Reconst"].isna() |
-         (ACT18_72["NBI 106 Year Reconst"] > 1972) |
-         (ACT18_72["NBI 106 Year Reconst"] == 0))
-    ]
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # After 1992 subset
-    ACT18_92 = ACT18[
-        (~ACT18["NBI 043 Main Structure Type"].astype(str).str.endswith("19")) |
-        (ACT18["NBI 043 Main Structure Type"].isna() &
-         ~ACT18["B.SP.06: Span Type - Main"].isin(SPAN_MAT))
-    ].copy()
-
-    ACT18_92 = ACT18_92[
-        ((ACT18_92["NBI 027 Year Built"] > 1992) |
-         (ACT18_92["NBI 027 Year Built"].isna() & (ACT18_92["B.W.01: Year Built"] > 1992))) &
-        (ACT18_92["NBI 106 Year Reconst"].isna() |
-         (ACT18_92["NBI 106 Year Reconst"] > 1992) |
-         (ACT18_92["NBI 106 Year Reconst"] == 0))
-    ]
-
-    # Combine subsets
-    ACT18_F = pd.concat([ACT18_72, ACT18_92], ignore_index=True)
+    ACT18_72 = rule_mask(ctx, "action18", "after_1972")
+    ACT18_92 = rule_mask(ctx, "action18", "after_1992")
 
     # Remove bridges with specific comments
-    COM = ["standard", "std", "parametric", "LFR", "NBI 64", "NBI 66"]
-    COM_PAT = "|".join(COM)
-    ACT18_F["Comments"] = ACT18_F["Comments"].astype(str).fillna("")
-    ACT18_F["Comment Inv Rating"] = ACT18_F["Comment Inv Rating"].astype(str).fillna("")
-
-    ACT18_F = ACT18_F[~(
-        ACT18_F["Comments"].str.contains(COM_PAT, case=False, na=False) |
-        ACT18_F["Comment Inv Rating"].str.contains(COM_PAT, case=False, na=False)
-    )]
+    drop = rule_mask(ctx, "action18", "comments", ACT18_72 | ACT18_92)
 
-    return ACT18_F
+    # Combine subsets
+    return _result(ctx, _rows(ACT18_72 & ~drop, ACT18_92 & ~drop), [
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+    ])
 
 
-def action19(RAW):
+def action19(RAW, ctx=None):
     """
     Process Action 19:
     - Remove State and Border Bridges
@@ -397,532 +1359,467 @@ def action19(RAW):
     - Remove bridges with specific structure types, span types, or critical locations
     - Categorize remaining bridges into sub-categories
     """
-    ACT19 = RAW.copy()
-
-    # Remove State and Border Bridges
-    bridge = ["State Bridges", "Border Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT19 = ACT19[~ACT19["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # Keep Load Rating Method == EJ
-    ACT19 = ACT19[ACT19["B.LR.04: Load Rating Method"] == "EJ"]
+    keep = rule_mask(ctx, "action19", "keep")
 
-    # Keep only open bridges
-    ACT19 = ACT19[ACT19["NBI 041 Open, Posted Or Closed"] != "K"]
+    # Sub-categories, by priority: Standard Bridge, load tested, Severe Deterioration, else Not Permitted
+    standard = rule_mask(ctx, "action19", "standard_bridge", keep)
+    tested = rule_mask(ctx, "action19", "load_tested", keep)
+    severe = rule_mask(ctx, "action19", "severe_deterioration", keep)
+    category = np.select([standard, tested, severe], [1, 2, 0], 3)[keep]
 
-    # Convert numeric columns
-    def try_numeric(val):
-        try:
-            f = float(val)
-            return int(f) if f.is_integer() else f
-        except:
-            return val
-
-    ACT19["NBI 043 Main Structure Type"] = ACT19["NBI 043 Main Structure Type"].apply(try_numeric)
-    ACT19["NBI 043 Main Structure Type Str"] = ACT19["NBI 043 Main Structure Type"].apply(lambda x: str(x).strip())
-
-    # Removal conditions
-    cond_319 = ACT19["NBI 043 Main Structure Type"] == 319
-    cond_startswith = ACT19["NBI 043 Main Structure Type Str"].str.startswith(("1", "2", "5", "6"))
-    cond_nan_nbi043_span_ty = ACT19["NBI 043 Main Structure Type"].isna() & ACT19["B.SP.06: Span Type - Main"].isin(["P01", "P02"])
-    cond_nan_span_ty_span_mat = ACT19["B.SP.06: Span Type - Main"].isna() & ACT19["B.SP.04: Span Material - Main"].isin(["C01","C02","C03","C04","C05","CX"])
-    cond_critloc = (ACT19["critical location"].str.contains("timber|plank|pile", case=False, na=False) |
-                    ACT19["critical location.1"].str.contains("timber|plank|pile", case=False, na=False))
-
-    # Apply removal mask
-    remove_mask = cond_319 | cond_startswith | cond_nan_nbi043_span_ty | cond_nan_span_ty_span_mat | cond_critloc
-    ACT19 = ACT19[~remove_mask].reset_index(drop=True)
-    ACT19 = ACT19.drop(columns=["NBI 043 Main Structure Type Str"])
-
-    # Sub-categories
-    ACT19_2 = ACT19[ACT19["Comment Inv Rating"].astype(str).str.contains("std|standard", case=False, na=False)].copy()
-    ACT19_2["Action 19 Sub-Category"] = "Standard Bridge"
-
-    ACT19_3 = ACT19.merge(ACT19_2, how="left", indicator=True)
-    ACT19_3 = ACT19_3[ACT19_3["_merge"] == "left_only"].drop(columns=["_merge"])
-    ACT19_3 = ACT19_3[ACT19_3["Comment Inv Rating"].astype(str).str.contains("test", case=False, na=False)]
-    ACT19_3["Action 19 Sub-Category"] = "Bridge was load tested."
-
-    ACT19_1 = ACT19.merge(pd.concat([ACT19_2, ACT19_3]).drop_duplicates(), how="left", indicator=True)
-    ACT19_1 = ACT19_1[ACT19_1["_merge"] == "left_only"].drop(columns=["_merge"])
-    ACT19_1 = ACT19_1[ACT19_1["Comment Inv Rating"].astype(str).str.contains("poor|deteriorat|post|decay|damage|clos", case=False, na=False)]
-    ACT19_1["Action 19 Sub-Category"] = "Severe Deterioration"
-
-    ACT19_4 = ACT19.merge(pd.concat([ACT19_1, ACT19_2, ACT19_3]).drop_duplicates(), how="left", indicator=True)
-    ACT19_4 = ACT19_4[ACT19_4["_merge"] == "left_only"].drop(columns=["_merge"])
-    ACT19_4["Action 19 Sub-Category"] = "Not Permitted"
-
-    # Final combined dataset
-    ACT19_F = pd.concat([ACT19_1, ACT19_2, ACT19_3, ACT19_4], ignore_index=True)
-    ACT19_F["Comments"] = ACT19_F["Comments"].fillna("")
-    ACT19_F["Comment Inv Rating"] = ACT19_F["Comment Inv Rating"].fillna("")
+    # Final combined dataset, listed by category in the order below
+    labels = np.array(
+        ["Severe Deterioration", "Standard Bridge", "Bridge was load tested.", "Not Permitted"],
+        dtype=object
+    )
+    kept = np.flatnonzero(keep)
+
+    ACT19_F = _result(ctx, [kept[category == c] for c in range(len(labels))])
+    order = ACT19_F["rows"]
+    # NBI 043 as numbers where possible, typed like Series.apply would (source dtype if empty)
+    nbi043 = _column(ctx, "NBI 043 Main Structure Type", "number").iloc[order]
+    if len(order) == 0:
+        nbi043 = RAW["NBI 043 Main Structure Type"].iloc[order]
+    ACT19_F["columns"]["NBI 043 Main Structure Type"] = nbi043.infer_objects().to_numpy()
+    ACT19_F["columns"]["Action 19 Sub-Category"] = labels[np.sort(category)]
+    for col in ["Comments", "Comment Inv Rating"]:
+        ACT19_F["columns"][col] = _filled(ctx, col, order)
 
     return ACT19_F
 
 
-def action20(RAW):
+def action20(RAW, ctx=None):
     """
     Process Action 20:
     - Remove State and Border Bridges
     - Keep Load Rating Method == EJ
     - Filter based on open/posted status, structure type, span material, critical location, and comments
     """
-    ACT20 = RAW.copy()
-
-    # Remove State and Border Bridges
-    bridge = ["State Bridges", "Border Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT20 = ACT20[~ACT20["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
-
-    # Keep Load Rating Method == EJ
-    ACT20 = ACT20[ACT20["B.LR.04: Load Rating Method"] == "EJ"]
-
-    # Remove closed or posted bridges
-    ACT20 = ACT20[~((ACT20["NBI 041 Open, Posted Or Closed"] == "K") |
-                    (ACT20["NBI 041 Open, Posted Or Closed"].isna() & (ACT20["B.PS.01: Load Posting Status"] == "C")))]
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # Keep concrete bridges
-    ACT20["NBI 043 Main Structure Type"] = pd.to_numeric(ACT20["NBI 043 Main Structure Type"], errors='coerce')
-    concrete = [101,102,104,105,106,119,121,122,100,201,202,204,205,206,219,221,222,200]
-    SPAN_MAT = ["C01","C02","C03","C04","C05"]
-    ACT20 = ACT20[(ACT20["NBI 043 Main Structure Type"].isin(concrete)) |
-                  (ACT20["NBI 043 Main Structure Type"].isna() & ACT20["B.SP.04: Span Material - Main"].isin(SPAN_MAT))]
+    keep = rule_mask(ctx, "action20", "keep")
 
-    # Remove bridges with critical locations
-    CRI_LOC = ["timber","plank","long","trans","pil"]
-    CRI_LOC_PAT = "|".join(CRI_LOC)
-    ACT20 = ACT20[~(ACT20["critical location"].str.contains(CRI_LOC_PAT, case=False, na=False) |
-                    ACT20["critical location.1"].str.contains(CRI_LOC_PAT, case=False, na=False))]
-
-    # Filter based on comments
-    COM = ["based on a parametric","based on the parametric","no signs of distress","sufficient",
-           "available","no plans","unable to provide","agreed with FHWA","software",
-           "deterioration","MBE 6A.5.11","standard","std"]
-    COM_PAT = "|".join(COM)
-    ACT20 = ACT20[(ACT20["Comments"].isna() | (ACT20["Comments"] == "")) &
-                  ~(ACT20["Comment Inv Rating"].str.contains(COM_PAT, case=False, na=False))]
-
-    return ACT20
+    return _result(ctx, np.flatnonzero(keep), [("NBI 043 Main Structure Type", "numeric")], reset_index=False)
 
 
 # Using the second, more detailed definition of Action 21
-def action21(RAW: pd.DataFrame) -> pd.DataFrame:
+def action21(RAW: pd.DataFrame, ctx=None) -> dict:
     """
     Process Action 21:
     - Remove County and City Bridges
     - Keep Load Rating Method == EJ
     - Filter based on open/posted status, structure type, span material, critical location, and comments
     """
-    ACT21 = RAW.copy()
-
-    # Remove County and City Bridges
-    bridges = ["County Bridges", "City Bridges"]
-    bridge_pat = "|".join(bridges)
-    ACT21 = ACT21[~ACT21["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
-
-    # Keep Load Rating Method == EJ
-    ACT21 = ACT21[ACT21["B.LR.04: Load Rating Method"] == "EJ"]
-
-    # Remove closed or posted bridges
-    ACT21 = ACT21[~((ACT21["NBI 041 Open, Posted Or Closed"] == "K") |
-                    (ACT21["NBI 041 Open, Posted Or Closed"].isna() &
-                     (ACT21["B.PS.01: Load Posting Status"] == "C")))]
-
-    # Keep concrete bridges
-    ACT21["NBI 043 Main Structure Type"] = pd.to_numeric(ACT21["NBI 043 Main Structure Type"], errors='coerce')
-    concrete_types = [101, 102, 104, 105, 106, 119, 121, 122, 100,
-                      211, 212, 214, 215, 216, 219, 221, 222, 210]
-    span_materials = ["C01", "C02", "C03", "C04", "C05", "CX"]
-    ACT21 = ACT21[(ACT21["NBI 043 Main Structure Type"].isin(concrete_types)) |
-                  (ACT21["NBI 043 Main Structure Type"].isna() &
-                   ACT21["B.SP.04: Span Material - Main"].isin(span_materials))]
-
-    # Remove bridges with critical locations
-    critical_locs = ["timber", "plank", "long", "trans", "pil"]
-    critical_pat = "|".join(critical_locs)
-    ACT21 = ACT21[~(ACT21["critical location"].str.contains(critical_pat, case=False, na=False) |
-                    ACT21["critical location.1"].str.contains(critical_pat, case=False, na=False))]
-
-    # Filter based on comments
-    comments = ["parametric", "illegible", "missing", "no plans", "per section 6.1.4",
-                "The following bridge has been inspected", "standard", "std"]
-    comment_pat = "|".join(comments)
-    ACT21["Comments"] = ACT21["Comments"].fillna("")
-    ACT21["Comment Inv Rating"] = ACT21["Comment Inv Rating"].fillna("")
-    ACT21 = ACT21[~(ACT21["Comments"].str.contains(comment_pat, case=False, na=False) |
-                    ACT21["Comment Inv Rating"].str.contains(comment_pat, case=False, na=False))]
+    if ctx is None:
+        ctx = build_action_context(RAW)
+
+    keep = rule_mask(ctx, "action21", "keep")
+
+    rows = np.flatnonzero(keep)
+    ACT21 = _result(ctx, rows, [("NBI 043 Main Structure Type", "numeric")], reset_index=False)
+    for col in ["Comments", "Comment Inv Rating"]:
+        ACT21["columns"][col] = _filled(ctx, col, rows)
 
     return ACT21
 
 
-def action22(RAW: pd.DataFrame) -> pd.DataFrame:
+def action22(RAW: pd.DataFrame, ctx=None) -> dict:
     """
     Process Action 22:
     - Remove State and Border Bridges
     - Keep Load Rating Method == EJ
     - Filter by open/posted status, structure type, span type, and comments
     """
-    ACT22 = RAW.copy()
+    if ctx is None:
+        ctx = build_action_context(RAW)
 
-    # Remove State and Border Bridges
-    bridges = ["State Bridges", "Border Bridges"]
-    bridge_pat = "|".join(bridges)
-    ACT22 = ACT22[~ACT22["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
-
-    # Keep Load Rating Method == EJ
-    ACT22 = ACT22[ACT22["B.LR.04: Load Rating Method"] == "EJ"]
-
-    # Remove closed or posted bridges
-    ACT22 = ACT22[~((ACT22["NBI 041 Open, Posted Or Closed"] == "K") |
-                    (ACT22["NBI 041 Open, Posted Or Closed"].isna() &
-                     (ACT22["B.PS.01: Load Posting Status"] == "C")))]
-
-    # Convert NBI 043 Main Structure Type to numeric
-    ACT22["NBI 043 Main Structure Type"] = pd.to_numeric(ACT22["NBI 043 Main Structure Type"], errors='coerce')
+    keep = rule_mask(ctx, "action22", "keep")
 
     # Keep NBI 043 = 319 or if NaN, Span Type = P02
-    ACT22_1 = ACT22[(ACT22["NBI 043 Main Structure Type"] == 319) |
-                    (ACT22["NBI 043 Main Structure Type"].isna() &
-                     (ACT22["B.SP.06: Span Type - Main"] == "P02"))].copy()
+    culvert = rule_mask(ctx, "action22", "culvert", keep)
 
     # Remaining bridges with culvert-related comments
-    ACT22_1c = ACT22_1.reset_index(drop=True)
-    ACT22_2 = ACT22.merge(ACT22_1c, how="left", indicator=True)
-    ACT22_2 = ACT22_2[ACT22_2["_merge"] == "left_only"].drop(columns=["_merge"])
-
-    culvert_comments = ["CMP", "corrugated", "metal culvert"]
-    culvert_pat = "|".join(culvert_comments)
-    ACT22_2["Comments"] = ACT22_2["Comments"].fillna("")
-    ACT22_2["Comment Inv Rating"] = ACT22_2["Comment Inv Rating"].fillna("")
-    ACT22_2 = ACT22_2[(ACT22_2["Comments"].str.contains(culvert_pat, case=False, na=False) |
-                       ACT22_2["Comment Inv Rating"].str.contains(culvert_pat, case=False, na=False))]
+    comments = rule_mask(ctx, "action22", "culvert_comments", keep & ~culvert)
 
-    # Combine the two filtered sets
-    ACT22_F = pd.concat([ACT22_1, ACT22_2], ignore_index=True)
+    # Combine the two filtered sets (comments filled with "" in the second)
+    ACT22_F = _result(ctx, _rows(culvert, comments), [("NBI 043 Main Structure Type", "numeric")])
+    for col in ["Comments", "Comment Inv Rating"]:
+        ACT22_F["columns"][col] = np.concatenate([
+            RAW[col].to_numpy(dtype=object, na_value=np.nan)[culvert],
+            _filled(ctx, col, np.flatnonzero(comments)),
+        ])
 
     return ACT22_F
 
+
 # -------------------------------
 # RAW2, RAW3, and Action Functions (From Part 2)
 # -------------------------------
 
-def make_RAW2(
-    RAW,
-    ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F, ACT19_F,
-    ACT20, ACT21, ACT22_F
-):
+# Strings float() is sure to accept; parsed in bulk.
+_NUMBER_PAT = r"(?i)[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?|nan|inf|infinity)"
+# ASCII strings float() might still accept (e.g. "1_000"); checked one by one.
+_MAYBE_NUMBER_PAT = r"[0-9_+\-.eE]+"
+
+
+def _raw2_text(val):
+    """RAW2 key form of one value (make_RAW2's original normalize_mixed)."""
+    if pd.isna(val):
+        return ""
+    try:
+        f = float(val)
+        text = str(int(f)) if f.is_integer() else str(f)
+    except:
+        text = str(val).strip().lower()
+    return "" if text == "nan" else text.strip()
+
+
+def _raw3_text(val):
+    """RAW3 key form of one value (run_action8m_and_raw3's original normalize_mixed)."""
+    if pd.isna(val) or str(val).strip().lower() in ["", "nan", "none"]:
+        return "0"
+    try:
+        f = float(val)
+        if f == 0:
+            return "0"
+        elif f.is_integer():
+            return str(int(f))
+        else:
+            return str(f)
+    except:
+        return str(val).strip()
+
+
+def _number_text(f):
+    """Key text of float values: (RAW2 form, RAW3 form)."""
+    text = np.empty(len(f), dtype=object)
+    whole = np.isfinite(f) & (np.floor(f) == f)
+    small = whole & (np.abs(f) < 2**63)
+    text[small] = f[small].astype(np.int64).astype(str)
+    big = whole & ~small
+    text[big] = [str(int(v)) for v in f[big]]
+    text[~whole] = f[~whole].astype(str) # Same as str(float), incl. "nan"/"inf"
+
+    raw2 = np.where(text == "nan", "", text)
+    raw3 = np.where(f == 0, "0", text)
+    return raw2, raw3
+
+
+def _value_text(values):
     """
-    Build RAW2 from RAW and Action 7–22 datasets.
-    Includes:
-        - Concatenation of all action outputs
-        - Deduplication
-        - Normalization of first 42 columns
-        - Manual overrides
-        - Anti-join RAW - ACT7_22
+    Key text of distinct non-missing values (object array): (RAW2 form, RAW3 form).
+    - Numbers are converted together, numeric strings parsed together
+    - Other strings are plain text (lower-cased for RAW2)
+    - Anything unusual goes through the per-value functions
     """
+    n = len(values)
+    raw2 = np.empty(n, dtype=object)
+    raw3 = np.empty(n, dtype=object)
+
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        is_str = np.ones(n, dtype=bool)
+        is_num = np.zeros(n, dtype=bool)
+    else:
+        is_str = np.array([isinstance(v, str) for v in values], dtype=bool)
+        is_num = np.array([isinstance(v, (int, float, np.integer, np.floating)) for v in values], dtype=bool)
+    slow = ~(is_str | is_num)
+
+    if is_num.any():
+        try:
+            raw2[is_num], raw3[is_num] = _number_text(values[is_num].astype(float))
+        except (OverflowError, ValueError, TypeError):
+            slow |= is_num
+
+    if is_str.any():
+        text = pd.Series(values[is_str], dtype=object)
+        stripped = text.str.strip()
+        lowered = stripped.str.lower()
+
+        number = stripped.str.fullmatch(_NUMBER_PAT).to_numpy(dtype=bool)
+        odd = (
+            (~number & stripped.str.fullmatch(_MAYBE_NUMBER_PAT).to_numpy(dtype=bool))
+            | text.str.contains(r"[^\x00-\x7f]").to_numpy(dtype=bool)
+        )
+        plain = ~(number | odd)
 
-    #Concatenate all action results.
-    ACTS = [
-        ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F,
-        ACT19_F, ACT20, ACT21, ACT22_F
-    ]
+        s2 = np.empty(len(text), dtype=object)
+        s3 = np.empty(len(text), dtype=object)
+        s2[number], s3[number] = _number_text(stripped[number].to_numpy().astype(float))
+        s2[plain] = lowered[plain].to_numpy()
+        s3[plain] = stripped[plain].to_numpy()
+        s3[lowered.isin(["", "nan", "none"]).to_numpy()] = "0"
 
-    ACT7_22 = pd.concat(ACTS, ignore_index=True)
+        pos = np.flatnonzero(is_str)
+        raw2[pos], raw3[pos] = s2, s3
+        slow[pos[odd]] = True
 
-    #Drop duplicates on first 42 columns
-    first42 = RAW.columns[:42].tolist()
-    ACT7_22 = ACT7_22.drop_duplicates(subset=first42).reset_index(drop=True)
+    for i in np.flatnonzero(slow):
+        raw2[i] = _raw2_text(values[i])
+        raw3[i] = _raw3_text(values[i])
 
-    #Manual override
-    if "Bridge ID" in ACT7_22.columns:
-        ACT7_22.loc[
-            ACT7_22["Bridge ID"] == "180TH ST.",
-            "NBI 063 Method Used Operating Rating"
-        ] = "F"
+    return raw2, raw3
 
-    #Drop duplicates in RAW.
-    RAW = RAW.drop_duplicates(subset=first42)
 
-    #Normalization function.
-    def normalize_mixed(val):
-        if pd.isna(val):
-            return ""
-        try:
-            f = float(val)
-            return str(int(f)) if f.is_integer() else str(f)
-        except:
-            return str(val).strip().lower()
-
-    #Apply normalization to RAW and ACT7_22.
-    for col in first42:
-        if col in RAW.columns:
-            RAW[col] = RAW[col].apply(normalize_mixed)
-        if col in ACT7_22.columns:
-            ACT7_22[col] = ACT7_22[col].apply(normalize_mixed)
-
-        #Replace "nan" and fill blanks.
-        if col in RAW.columns:
-            RAW[col] = RAW[col].replace("nan", "").fillna("")
-            RAW[col] = RAW[col].astype(str).str.strip()
-        if col in ACT7_22.columns:
-            ACT7_22[col] = ACT7_22[col].replace("nan", "").fillna("")
-            ACT7_22[col] = ACT7_22[col].astype(str).str.strip()
-
-    #Drop duplicates again after normalization.
-    RAW = RAW.drop_duplicates(subset=first42)
-    ACT7_22 = ACT7_22.drop_duplicates(subset=first42)
-
-    #Anti-join RAW - ACT7_22 → RAW2.
-    RAW2 = RAW.merge(
-        ACT7_22[first42], on=first42, how="left", indicator=True
-    )
-    RAW2 = RAW2[RAW2["_merge"] == "left_only"] \
-           .drop(columns=["_merge"]) \
-           .reset_index(drop=True)
+def normalize_keys(df, cols):
+    """
+    Normalize the key columns (first 42) used to match rows between frames.
+    Both canonical forms are produced in one pass over each column:
+    - RAW2 form (make_RAW2): missing as "", whole numbers as integer text,
+      text stripped and lower-cased
+    - RAW3 form (run_action8m_and_raw3): missing/"nan"/"none" and zero as "0",
+      whole numbers as integer text, text stripped
+    Returns (raw2_keys, raw3_keys) as DataFrames on df's index.
+    """
+    raw2 = {}
+    raw3 = {}
+    for col in cols:
+        values = df[col]
+        n = len(values)
+        raw2[col] = np.full(n, "", dtype=object)
+        raw3[col] = np.full(n, "0", dtype=object)
+
+        # Each distinct value is normalized once (and its text shared by its rows)
+        if values.dtype.kind in "biuf":
+            codes, uniques = pd.factorize(values.to_numpy(dtype=float, na_value=np.nan))
+            u2, u3 = _number_text(uniques)
+        else:
+            codes, uniques = pd.factorize(values)
+            u2, u3 = _value_text(np.asarray(uniques, dtype=object))
+        found = codes >= 0
+        raw2[col][found] = u2[codes[found]]
+        raw3[col][found] = u3[codes[found]]
 
-    #Final
-    RAW2 = RAW2.drop_duplicates(subset=first42)
+    return (pd.DataFrame(raw2, index=df.index, copy=False),
+            pd.DataFrame(raw3, index=df.index, copy=False))
 
-    return RAW2, ACT7_22 # Return ACT7_22 for counts
 
 
-def action2(RAW2):
+def key_fingerprints(keys):
     """
-    Action 2:
-    - Remove State and Border Bridges
-    - Keep bridges with only SU7 traffic (multi-lane or one-lane)
-    - Remove based on Load Rating Method rules
-    - Remove based on Open/Posted/Closed status
-    - Remove rows with comments indicating standards or parametrics
-    - Drop unneeded columns
+    64-bit fingerprint of each row of a normalized key frame (see normalize_keys).
+    Equal keys always give equal fingerprints; matches are verified against the
+    key values, so a hash collision can never merge two different rows.
     """
-    ACT2 = RAW2.copy()
-
-    #Remove State & Border Bridges
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
 
-    bridge = ["State Bridges", "Border Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT2 = ACT2[~ACT2["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
 
-    #Traffic Tons Columns
+def _duplicated_keys(keys, fp):
+    """Same as keys.duplicated() (first occurrence kept), found through fingerprints."""
+    _, first, inverse = np.unique(fp, return_index=True, return_inverse=True)
+    first = first[inverse.ravel()]
+    dup = first != np.arange(len(fp))
 
-    tons = [
-        "Multi Lane Traffic: Type SU4 Tons", "Multi Lane Traffic: Type SU5 Tons", 
-        "Multi Lane Traffic: Type SU6 Tons", "Multi Lane Traffic: Type SU7 Tons",    
-        "One Lane Traffic: Type SU4 Tons", "One Lane Traffic: Type SU5 Tons", 
-        "One Lane Traffic: Type SU6 Tons", "One Lane Traffic: Type SU7 Tons"
-    ]
+    values = keys.to_numpy()
+    if not (values[dup] == values[first[dup]]).all():
+        return keys.duplicated().to_numpy() # Hash collision, compare the keys themselves
+    return dup
 
-    #Convert to numeric, fill NaN with 0.
-    for col in tons:
-        if col in ACT2.columns:
-            ACT2[col] = pd.to_numeric(ACT2[col], errors="coerce").fillna(0)
-        else:
-            ACT2[col] = 0 # Add column if missing
-
-    #Keep only where SU7 > 0 and all others = 0.
-    ACT2 = ACT2[
-        ((ACT2["Multi Lane Traffic: Type SU4 Tons"] == 0) &
-         (ACT2["Multi Lane Traffic: Type SU5 Tons"] == 0) &
-         (ACT2["Multi Lane Traffic: Type SU6 Tons"] == 0) &
-         (ACT2["Multi Lane Traffic: Type SU7 Tons"] > 0)) |
-        ((ACT2["One Lane Traffic: Type SU4 Tons"] == 0) &
-         (ACT2["One Lane Traffic: Type SU5 Tons"] == 0) &
-         (ACT2["One Lane Traffic: Type SU6 Tons"] == 0) &
-         (ACT2["One Lane Traffic: Type SU7 Tons"] > 0))
-    ]
 
-    #Load Rating Method Rules
-    ACT2["NBI 063 Method Used Operating Rating"] = pd.to_numeric(
-        ACT2["NBI 063 Method Used Operating Rating"], errors="coerce"
-    )
+def _matched_keys(keys, fp, other, other_fp):
+    """
+    Mask of the rows of `keys` whose key also appears in `other`
+    (the rows a left merge with indicator=True marks "both").
+    """
+    matched = np.zeros(len(fp), dtype=bool)
+    if len(other_fp) == 0:
+        return matched
 
-    ACT2["B.LR.04: Load Rating Method"] = (
-        ACT2["B.LR.04: Load Rating Method"].astype(str).str.strip().str.upper()
-    )
+    order = np.argsort(other_fp, kind="stable")
+    pos = np.minimum(np.searchsorted(other_fp[order], fp), len(order) - 1)
+    candidates = np.flatnonzero(other_fp[order][pos] == fp)
 
-    ACT2 = ACT2[~(
-        (ACT2["B.LR.04: Load Rating Method"] == "EJ") |
-        (ACT2["B.LR.04: Load Rating Method"].isna() &
-         (ACT2["NBI 063 Method Used Operating Rating"] == 0))
-    )]
+    values = keys.to_numpy()
+    other_values = other.to_numpy()
+    same = (values[candidates] == other_values[order[pos[candidates]]]).all(axis=1)
+    matched[candidates[same]] = True
 
-    #Open/Posted/Closed rules
-    OPC = ["P", "R", "K"]
-    LPS = ["C", "PP", "PR"]
+    # Hash collision: look through every row of `other` with that fingerprint
+    for i in candidates[~same]:
+        rows = other_values[other_fp == fp[i]]
+        matched[i] = bool((rows == values[i]).all(axis=1).any())
 
-    ACT2["NBI 041 Open, Posted Or Closed"] = (
-        ACT2["NBI 041 Open, Posted Or Closed"].astype(str).str.strip().str.upper()
-    )
-    ACT2["B.PS.01: Load Posting Status"] = (
-        ACT2["B.PS.01: Load Posting Status"].astype(str).str.strip().str.upper()
-    )
+    return matched
 
-    ACT2 = ACT2[~(
-        ACT2["NBI 041 Open, Posted Or Closed"].isin(OPC) |
-        (ACT2["NBI 041 Open, Posted Or Closed"].isna() &
-         ACT2["B.PS.01: Load Posting Status"].isin(LPS))
-    )]
-
-    #Remove based on comments
-    COM = [
-        "SU4", "close bridge", "closed",
-        "based on a parametric", "based on the parametric",
-        "J7", "J24", "Standards"
-    ]
 
-    COM_PAT = "|".join([re.escape(w) for w in COM])
-    STAN_PAT = r"(?<!non[-\s])standard|(?<!non[-\s])std"
-    FINAL_PAT = f"{COM_PAT}|{STAN_PAT}"
+def _keyed_rows(frame, keep, keys):
+    """
+    Rows of `frame` at mask `keep` (index reset) with its leading key
+    columns replaced by their normalized form (`keys`, on frame's index).
+    Only the other columns are gathered from frame.
+    """
+    head = pd.DataFrame({col: keys[col].to_numpy()[keep] for col in keys.columns}, copy=False)
+    rest = frame.iloc[:, len(keys.columns):][keep].reset_index(drop=True)
+    return pd.concat([head, rest], axis=1)
 
-    ACT2["Comments"] = ACT2["Comments"].astype(str)
-    ACT2["Comment Inv Rating"] = ACT2["Comment Inv Rating"].astype(str)
 
-    ACT2 = ACT2[
-        ((ACT2["Comments"].isna() | (ACT2["Comments"].str.strip() == "")) &
-         (ACT2["Comment Inv Rating"].isna() | (ACT2["Comment Inv Rating"].str.strip() == ""))) |
-        (~(
-            ACT2["Comments"].str.contains(FINAL_PAT, case=False, na=False, regex=True) |
-            ACT2["Comment Inv Rating"].str.contains(FINAL_PAT, case=False, na=False, regex=True)
-        ))
-    ]
+def _manual_override(bridge_ids, nbi063):
+    """NBI 063 values (object array) with "F" for Bridge ID 180TH ST."""
+    values = np.array(nbi063, dtype=object)
+    values[np.asarray(bridge_ids == "180TH ST.", dtype=bool)] = "F"
+    return values
 
-    #Drop unnecessary columns.
-    ACT2 = ACT2.drop(
-        columns=["Standard/Non-Standard", "Action 19 Sub-Category"],
-        errors='ignore'
-    )
 
-    return ACT2
+def _claimed_keys(RAW, raw_keys, raw_fp, result, fingerprints=key_fingerprints):
+    """
+    (keys, fingerprints) of the rows an action result claims, for make_RAW2.
+    A row counts with the values the action writes to it, so key columns it
+    rewrites (e.g. NBI 063 as numeric, comments as text) and the manual
+    override are normalized from those values; other rows reuse RAW's keys
+    (and raw_fp, their `fingerprints`).
+    """
+    rows = result["rows"]
+    written = {col: values for col, values in result["columns"].items() if col in raw_keys.columns}
 
+    #Manual override
+    nbi063 = "NBI 063 Method Used Operating Rating"
+    if "Bridge ID" in RAW.columns and nbi063 in raw_keys.columns:
+        bridge_ids = written.get("Bridge ID", RAW["Bridge ID"].to_numpy(dtype=object)[rows])
+        if (bridge_ids == "180TH ST.").any():
+            written[nbi063] = _manual_override(
+                bridge_ids, written.get(nbi063, RAW[nbi063].to_numpy(dtype=object)[rows])
+            )
 
-def action3(RAW2):
+    if not written:
+        return raw_keys.iloc[rows], raw_fp[rows]
 
-    ACT3 = RAW2.copy()
+    keys = raw_keys.iloc[rows].reset_index(drop=True)
+    written_keys = normalize_keys(pd.DataFrame(written), list(written))[0]
+    for col in written:
+        keys[col] = written_keys[col].to_numpy()
+    return keys, fingerprints(keys)
 
-    #Exclude State and Border Bridges
-    bridge = ["State Bridge", "Border Bridge"]
-    bridge_pat = "|".join(bridge)
-    ACT3 = ACT3[~(ACT3["Parent Asset"].str.contains(bridge_pat, case=False, na=False))]
 
-    #Convert traffic columns to numeric.
-    tons = [
-        "Multi Lane Traffic: Type SU4 Tons", "Multi Lane Traffic: Type SU5 Tons",
-        "Multi Lane Traffic: Type SU6 Tons", "Multi Lane Traffic: Type SU7 Tons",
-        "One Lane Traffic: Type SU4 Tons", "One Lane Traffic: Type SU5 Tons",
-        "One Lane Traffic: Type SU6 Tons", "One Lane Traffic: Type SU7 Tons"
-    ]
-    for col in tons:
-        if col in ACT3.columns:
-            ACT3[col] = pd.to_numeric(ACT3[col], errors="coerce").fillna(0)
+def _act8_keys(ACT8, first42):
+    """
+    RAW2-form keys of the uploaded Action 8 rows, with the manual override
+    (missing key columns count as empty).
+    """
+    act8 = ACT8[[col for col in first42 if col in ACT8.columns]]
+    nbi063 = "NBI 063 Method Used Operating Rating"
+    if "Bridge ID" in ACT8.columns and nbi063 in first42:
+        if nbi063 in ACT8.columns:
+            values = ACT8[nbi063].to_numpy(dtype=object)
         else:
-            ACT3[col] = 0
-
-    #Keep rows where ALL traffic = 0
-    ACT3 = ACT3[
-        (ACT3["Multi Lane Traffic: Type SU4 Tons"] == 0) &
-        (ACT3["Multi Lane Traffic: Type SU5 Tons"] == 0) &
-        (ACT3["Multi Lane Traffic: Type SU6 Tons"] == 0) &
-        (ACT3["Multi Lane Traffic: Type SU7 Tons"] == 0) &
-        (ACT3["One Lane Traffic: Type SU4 Tons"] == 0) &
-        (ACT3["One Lane Traffic: Type SU5 Tons"] == 0) &
-        (ACT3["One Lane Traffic: Type SU6 Tons"] == 0) &
-        (ACT3["One Lane Traffic: Type SU7 Tons"] == 0)
-    ]
+            values = np.full(len(ACT8), np.nan, dtype=object)
+        act8 = act8.assign(**{nbi063: _manual_override(ACT8["Bridge ID"].to_numpy(dtype=object), values)})
+    act8_keys = normalize_keys(act8, act8.columns)[0]
+    return act8_keys.reset_index(drop=True).reindex(columns=first42, fill_value="")
 
-    #Exclude Load Rating Methods EJ / AR
-    LRM = ["EJ", "AR"]
-    ACT3["B.LR.04: Load Rating Method"] = (
-        ACT3["B.LR.04: Load Rating Method"].astype(str).str.strip().str.upper()
-    )
-    ACT3 = ACT3[~ACT3["B.LR.04: Load Rating Method"].isin(LRM)]
 
-    #Remove posted / restricted / closed bridges
-    OPC = ["K", "P", "D"]
-    LPS = ["C", "PP", "PR", "TP", "TR"]
+def make_RAW2(
+    RAW,
+    ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F, ACT19_F,
+    ACT20, ACT21, ACT22_F, keys=None
+):
+    """
+    Build RAW2 from RAW, the Action 7-22 results on RAW and the uploaded
+    Action 8 DataFrame.
+    Includes:
+        - Normalization of first 42 columns
+        - Manual overrides
+        - Deduplication on the normalized keys
+        - Anti-join RAW - rows claimed by Actions 7-22
+    Claimed rows are matched by their normalized keys (see _claimed_keys),
+    since Action 8 rows come from another file and rewritten key columns
+    can change a row's key.
+    Returns (RAW2, mask of the RAW rows claimed).
+    """
 
-    ACT3["NBI 041 Open, Posted Or Closed"] = (
-        ACT3["NBI 041 Open, Posted Or Closed"].astype(str).str.strip().str.upper()
-    )
-    ACT3["B.PS.01: Load Posting Status"] = (
-        ACT3["B.PS.01: Load Posting Status"].astype(str).str.strip().str.upper()
-    )
+    #Normalize first 42 columns of RAW (keys = normalize_keys(RAW) if already computed,
+    #optionally followed by the key fingerprints of each form, see incremental_keys).
+    first42 = RAW.columns[:42].tolist()
+    raw_keys = (normalize_keys(RAW, first42) if keys is None else keys)[0][first42]
+    raw_fp = key_fingerprints(raw_keys) if keys is None or len(keys) < 4 else keys[2]
 
-    ACT3 = ACT3[~(
-        ACT3["NBI 041 Open, Posted Or Closed"].isin(OPC) |
-        ((ACT3["NBI 041 Open, Posted Or Closed"] == "") &
-         ACT3["B.PS.01: Load Posting Status"].isin(LPS))
-    )]
-
-    #Remove parametric / standard comments.
-    COM = ["SU4", "close bridge", "closed",
-           "based on a parametric", "based on the parametric",
-           "J7", "J24", "Standards"]
-
-    COM_PAT = "|".join([re.escape(word) for word in COM])
-    STAN_PAT = r"(?<!non[-\s])standard|(?<!non[-\s])std"
-    FINAL_PAT = f"{COM_PAT}|{STAN_PAT}"
-
-    ACT3["Comments"] = ACT3["Comments"].astype(str)
-    ACT3["Comment Inv Rating"] = ACT3["Comment Inv Rating"].astype(str)
-
-    ACT3 = ACT3[
-        ((ACT3["Comments"].isna()) | (ACT3["Comments"].str.strip() == "")) &
-        ((ACT3["Comment Inv Rating"].isna()) | (ACT3["Comment Inv Rating"].str.strip() == "")) |
-        (~(
-            ACT3["Comments"].str.contains(FINAL_PAT, case=False, na=False, regex=True) |
-            ACT3["Comment Inv Rating"].str.contains(FINAL_PAT, case=False, na=False, regex=True)
-        ))
+    #Keys claimed by each action result.
+    claimed = [
+        _claimed_keys(RAW, raw_keys, raw_fp, result)
+        for result in [ACT7, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F, ACT19_F, ACT20, ACT21, ACT22_F]
     ]
 
-    #Convert relevant columns to numeric.
-    ACT3["NBI 063 Method Used Operating Rating"] = (
-        ACT3["NBI 063 Method Used Operating Rating"].astype(str).str.upper().str.strip()
-    )
-    ACT3["NBI 064 Operating Rating"] = pd.to_numeric(
-        ACT3["NBI 064 Operating Rating"], errors='coerce'
-    )
-    ACT3["B.LR.06: Operating Load Rating Factor"] = pd.to_numeric(
-        ACT3["B.LR.06: Operating Load Rating Factor"], errors='coerce'
-    )
+    #Keys of the uploaded Action 8 rows.
+    act8_keys = _act8_keys(ACT8, first42)
+    claimed.append((act8_keys, key_fingerprints(act8_keys)))
 
-    #Keep rows with valid Year Built
-    ACT3 = ACT3[
-        ACT3["B.W.01: Year Built"].notna() &
-        (ACT3["B.W.01: Year Built"].astype(str).str.strip() != "")
-    ]
+    #Anti-join RAW - claimed keys → RAW2 (dropping duplicate keys in RAW, first kept).
+    act_keys = pd.concat([k for k, _ in claimed], ignore_index=True)
+    act_fp = np.concatenate([fp for _, fp in claimed])
+    matched = _matched_keys(raw_keys, raw_fp, act_keys, act_fp)
+    keep = ~_duplicated_keys(raw_keys, raw_fp) & ~matched
 
-    #Remove G1 low OR bridges.
-    G1 = ["1", "2", "3", "4", "5", "A", "C"]
-    ACT3 = ACT3[~(
-        (ACT3["NBI 063 Method Used Operating Rating"].isin(G1)) &
-        (ACT3["NBI 064 Operating Rating"] < 45)
-    )]
-
-    #Remove G2 low OR bridges.
-    G2 = ["6", "7", "8", "F", "D"]
-    ACT3 = ACT3[~(
-        (ACT3["NBI 063 Method Used Operating Rating"].isin(G2)) &
-        ((ACT3["NBI 064 Operating Rating"] < 1.26) |
-         (ACT3["NBI 064 Operating Rating"].isna() &
-          (ACT3["B.LR.06: Operating Load Rating Factor"] < 1.26)))
-    )]
+    RAW2 = _keyed_rows(RAW, keep, raw_keys)
 
-    #Drop unneeded columns.
-    ACT3 = ACT3.drop(["Standard/Non-Standard", "Action 19 Sub-Category"],
-                     axis=1, errors='ignore')
+    return RAW2, matched
 
-    return ACT3
 
+def action2(RAW2, ctx=None):
+    """
+    Action 2:
+    - Remove State and Border Bridges
+    - Keep bridges with only SU7 traffic (multi-lane or one-lane)
+    - Remove based on Load Rating Method rules
+    - Remove based on Open/Posted/Closed status
+    - Remove rows with comments indicating standards or parametrics
+    - Drop unneeded columns
+    """
+    if ctx is None:
+        ctx = build_action_context(RAW2)
+
+    keep = rule_mask(ctx, "action2", "keep")
+
+    ACT2 = _result(ctx, np.flatnonzero(keep), [
+        #Traffic tons as numeric, NaN as 0 (added if missing).
+        *[(col, "numeric0") for col in TONS],
+        ("NBI 063 Method Used Operating Rating", "numeric"),
+        ("B.LR.04: Load Rating Method", "upper"),
+        ("NBI 041 Open, Posted Or Closed", "upper"),
+        ("B.PS.01: Load Posting Status", "upper"),
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+    ], reset_index=False)
+
+    #Drop unnecessary columns.
+    ACT2["drop"] = ["Standard/Non-Standard", "Action 19 Sub-Category"]
+
+    return ACT2
+
+
+def action3(RAW2, ctx=None):
+
+    if ctx is None:
+        ctx = build_action_context(RAW2)
+
+    keep = rule_mask(ctx, "action3", "keep")
+
+    ACT3 = _result(ctx, np.flatnonzero(keep), [
+        #Traffic tons as numeric, NaN as 0 (added if missing).
+        *[(col, "numeric0") for col in TONS],
+        ("B.LR.04: Load Rating Method", "upper"),
+        ("NBI 041 Open, Posted Or Closed", "upper"),
+        ("B.PS.01: Load Posting Status", "upper"),
+        ("NBI 063 Method Used Operating Rating", "upper"),
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+        ("NBI 064 Operating Rating", "numeric"),
+        ("B.LR.06: Operating Load Rating Factor", "numeric"),
+    ], reset_index=False)
 
-def run_action8m_and_raw3(RAW_in, ACT8_in):
+    #Drop unneeded columns.
+    ACT3["drop"] = ["Standard/Non-Standard", "Action 19 Sub-Category"]
 
-    RAW = RAW_in.copy()
-    ACT8M = ACT8_in.copy()
+    return ACT3
 
-    first42_cols = RAW.columns[:42].tolist()
 
-    ACT8M = ACT8M.drop_duplicates(subset=first42_cols).reset_index(drop=True)
+def _action8m(ACT8_in, first42_cols):
+    """
+    ACT8M (the Action 8 upload deduplicated on the key columns, with the
+    manual override and its keys in RAW3 form) and those keys.
+    """
+    ACT8M = ACT8_in.drop_duplicates(subset=first42_cols).reset_index(drop=True)
 
     #Fix specific override for Bridge ID
     if "Bridge ID" in ACT8M.columns:
@@ -935,389 +1832,1779 @@ def run_action8m_and_raw3(RAW_in, ACT8_in):
             "NBI 063 Method Used Operating Rating"
         ] = "F"
 
-    def normalize_mixed(val):
-        if pd.isna(val) or str(val).strip().lower() in ["", "nan", "none"]:
-            return "0"
-        try:
-            f = float(val)
-            if f == 0:
-                return "0"
-            elif f.is_integer():
-                return str(int(f))
-            else:
-                return str(f)
-        except:
-            return str(val).strip()
-
-    #Normalize RAW and ACT8M for first 42 columns
-    for col in first42_cols:
-        if col in RAW.columns:
-            RAW[col] = RAW[col].apply(normalize_mixed)
-        if col in ACT8M.columns:
-            ACT8M[col] = ACT8M[col].apply(normalize_mixed)
-
-    #Merge and keep rows in RAW that are NOT in ACT8M (RAW3)
-    RAW3 = RAW.merge(
-        ACT8M[first42_cols],
-        on=first42_cols,
-        how="left",
-        indicator=True
-    )
+    act_keys = normalize_keys(ACT8M, [col for col in first42_cols if col in ACT8M.columns])[1]
+    for col in act_keys.columns:
+        ACT8M[col] = act_keys[col].to_numpy()
 
-    RAW3 = (
-        RAW3[RAW3["_merge"] == "left_only"]
-        .drop(columns=["_merge"])
-        .reset_index(drop=True)
-    )
+    return ACT8M, act_keys
 
-    return ACT8M, RAW3
 
+def run_action8m_and_raw3(RAW_in, ACT8_in, keys=None):
 
-def action5(RAW3):
-    ACT5 = RAW3.copy()
+    first42_cols = RAW_in.columns[:42].tolist()
 
-    #Remove County and City Bridges
-    bridge = ["County Bridges", "City Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT5 = ACT5[~(ACT5["Parent Asset"].str.contains(bridge_pat, case=False, na=False))]
+    ACT8M, act_keys = _action8m(ACT8_in, first42_cols)
 
-    #Traffic tonnage columns
-    tons = [
-        "Multi Lane Traffic: Type SU4 Tons", "Multi Lane Traffic: Type SU5 Tons",
-        "Multi Lane Traffic: Type SU6 Tons", "Multi Lane Traffic: Type SU7 Tons",
-        "One Lane Traffic: Type SU4 Tons", "One Lane Traffic: Type SU5 Tons",
-        "One Lane Traffic: Type SU6 Tons", "One Lane Traffic: Type SU7 Tons"
-    ]
+    #Normalize RAW for first 42 columns (keys = normalize_keys(RAW_in) if already computed,
+    #optionally followed by the key fingerprints of each form, see incremental_keys)
+    raw_keys = (normalize_keys(RAW_in, first42_cols) if keys is None else keys)[1][first42_cols]
+    raw_fp = key_fingerprints(raw_keys) if keys is None or len(keys) < 4 else keys[3]
 
-    #Convert tons columns to numeric and fill NaN with 0
-    for col in tons: 
-        if col in ACT5.columns:
-            ACT5[col] = pd.to_numeric(ACT5[col], errors="coerce") 
-            ACT5[col] = ACT5[col].fillna(0).astype(int) #V2 Addition
-        else:
-            ACT5[col] = 0
-
-    # Keep only rows where only SU7 has traffic
-    ACT5 = ACT5[
-        ((ACT5["Multi Lane Traffic: Type SU4 Tons"] == 0) &
-         (ACT5["Multi Lane Traffic: Type SU5 Tons"] == 0) &
-         (ACT5["Multi Lane Traffic: Type SU6 Tons"] == 0) &
-         (ACT5["Multi Lane Traffic: Type SU7 Tons"] > 0))
-        |
-        ((ACT5["One Lane Traffic: Type SU4 Tons"] == 0) &
-         (ACT5["One Lane Traffic: Type SU5 Tons"] == 0) &
-         (ACT5["One Lane Traffic: Type SU6 Tons"] == 0) &
-         (ACT5["One Lane Traffic: Type SU7 Tons"] > 0))
-    ]
-
-    # Filter NBI 063 != 0
-    ACT5["NBI 063 Method Used Operating Rating"] = pd.to_numeric(
-        ACT5["NBI 063 Method Used Operating Rating"], errors="coerce"
+    #Keep rows in RAW that are NOT in ACT8M (RAW3), with their normalized keys
+    matched = _matched_keys(
+        raw_keys, raw_fp,
+        act_keys[first42_cols], key_fingerprints(act_keys)
     )
-    ACT5 = ACT5[ACT5["NBI 063 Method Used Operating Rating"] != 0]
-
-    # Remove NBI 041 = K/P/R or if NA and Posting Status is C/PP/PR
-    OPC = ["P", "R", "K"]
-    LPS = ["C", "PP", "PR"]
-
-    ACT5 = ACT5[
-        ~(
-            (ACT5["NBI 041 Open, Posted Or Closed"].isin(OPC))
-            |
-            (ACT5["NBI 041 Open, Posted Or Closed"].isna()
-             & ACT5["B.PS.01: Load Posting Status"].isin(LPS))
-        )
-    ]
+    RAW3 = _keyed_rows(RAW_in, ~matched, raw_keys)
 
-    #Remove based on comments
-    COM = ["SU4", "close bridge", "closed", "based on a parametric",
-           "based on the parametric", "Standards"]
+    return ACT8M, RAW3
 
-    COM_PAT = "|".join([re.escape(word) for word in COM])
-    STAN_PAT = r"(?<!non[-\s])standard|(?<!non[-\s])std"
-    FINAL_PAT = f"{COM_PAT}|{STAN_PAT}"
 
-    ACT5["Comments"] = ACT5["Comments"].astype(str)
-    ACT5["Comment Inv Rating"] = ACT5["Comment Inv Rating"].astype(str)
+def action5(RAW3, ctx=None):
+    if ctx is None:
+        ctx = build_action_context(RAW3)
 
-    ACT5 = ACT5[
-        ~(
-            ACT5["Comments"].str.contains(FINAL_PAT, case=False, na=False, regex=True)
-            |
-            ACT5["Comment Inv Rating"].str.contains(FINAL_PAT, case=False, na=False, regex=True)
-        )
-    ]
+    keep = rule_mask(ctx, "action5", "keep")
 
-    return ACT5
+    return _result(ctx, np.flatnonzero(keep), [
+        #Traffic tons as int, NaN as 0 (added if missing).
+        *[(col, "int0") for col in TONS],
+        ("NBI 063 Method Used Operating Rating", "numeric"),
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+    ], reset_index=False)
 
 
-def action6(RAW3):
-    ACT6 = RAW3.copy()
+def action6(RAW3, ctx=None):
+    if ctx is None:
+        ctx = build_action_context(RAW3)
 
-    # -----------------------------
-    # Remove City and County Bridges
-    # -----------------------------
-    bridge = ["City Bridges", "County Bridges"]
-    bridge_pat = "|".join(bridge)
-    ACT6 = ACT6[~ACT6["Parent Asset"].str.contains(bridge_pat, case=False, na=False)]
+    keep = rule_mask(ctx, "action6", "keep")
 
-    # -----------------------------
-    # Traffic tonnage columns
-    # -----------------------------
-    tons = [
-        "Multi Lane Traffic: Type SU4 Tons", "Multi Lane Traffic: Type SU5 Tons",
-        "Multi Lane Traffic: Type SU6 Tons", "Multi Lane Traffic: Type SU7 Tons",
-        "One Lane Traffic: Type SU4 Tons", "One Lane Traffic: Type SU5 Tons",
-        "One Lane Traffic: Type SU6 Tons", "One Lane Traffic: Type SU7 Tons"
-    ]
+    return _result(ctx, np.flatnonzero(keep), [
+        # Traffic tons as int, NaN as 0 (added if missing)
+        *[(col, "int0") for col in TONS],
+        ("B.LR.04: Load Rating Method", "upper"),
+        ("NBI 041 Open, Posted Or Closed", "upper"),
+        ("B.PS.01: Load Posting Status", "upper"),
+        ("NBI 063 Method Used Operating Rating", "upper"),
+        ("Comments", "str"),
+        ("Comment Inv Rating", "str"),
+        ("NBI 064 Operating Rating", "numeric"),
+        ("B.LR.06: Operating Load Rating Factor", "numeric"),
+    ], reset_index=False)
 
-    # Convert tons columns to numeric and fill NaN with 0
-    for col in tons:
-        if col in ACT6.columns:
-            ACT6[col] = pd.to_numeric(ACT6[col], errors="coerce")
-            ACT6[col] = ACT6[col].fillna(0).astype(int)
-        else:
-            ACT6[col] = 0
-
-    # Keep only rows where ALL traffic columns are zero
-    ACT6 = ACT6[
-        ((ACT6["Multi Lane Traffic: Type SU4 Tons"] == 0) &
-         (ACT6["Multi Lane Traffic: Type SU5 Tons"] == 0) &
-         (ACT6["Multi Lane Traffic: Type SU6 Tons"] == 0) &
-         (ACT6["Multi Lane Traffic: Type SU7 Tons"] == 0)) &
-        ((ACT6["One Lane Traffic: Type SU4 Tons"] == 0) &
-         (ACT6["One Lane Traffic: Type SU5 Tons"] == 0) &
-         (ACT6["One Lane Traffic: Type SU6 Tons"] == 0) &
-         (ACT6["One Lane Traffic: Type SU7 Tons"] == 0))
-    ]
 
-    # -----------------------------
-    # Load Rating Method filters
-    # -----------------------------
-    LRM = ["EJ", "AR"]
-    ACT6["B.LR.04: Load Rating Method"] = ACT6["B.LR.04: Load Rating Method"].astype(str).str.strip().str.upper()
-    ACT6 = ACT6[~ACT6["B.LR.04: Load Rating Method"].isin(LRM)]
-
-    # -----------------------------
-    # Remove based on NBI 041 / Load Posting Status
-    # -----------------------------
-    OPC = ["R", "P", "K"]
-    LPS = ["C", "PP", "PR"]
-    ACT6["NBI 041 Open, Posted Or Closed"] = ACT6["NBI 041 Open, Posted Or Closed"].astype(str).str.strip().str.upper()
-    ACT6["B.PS.01: Load Posting Status"] = ACT6["B.PS.01: Load Posting Status"].astype(str).str.strip().str.upper()
-    ACT6 = ACT6[
-        ~(
-            ACT6["NBI 041 Open, Posted Or Closed"].isin(OPC) |
-            (ACT6["NBI 041 Open, Posted Or Closed"].isna() & ACT6["B.PS.01: Load Posting Status"].isin(LPS))
-        )
-    ]
+# -------------------------------
+# Action Result Memo
+# -------------------------------
 
-    # -----------------------------
-    # Remove based on Comments
-    # -----------------------------
-    COM = ["SU4", "close bridge", "closed", "based on a parametric", "based on the parametric", "Standards"]
-    COM_PAT = "|".join([re.escape(word) for word in COM])
-    STAN_PAT = r"(?<!non[-\s])standard|(?<!non[-\s])std"
-    FINAL_PAT = f"{COM_PAT}|{STAN_PAT}"
-
-    ACT6["Comments"] = ACT6["Comments"].astype(str)
-    ACT6["Comment Inv Rating"] = ACT6["Comment Inv Rating"].astype(str)
-
-    ACT6 = ACT6[
-        ((ACT6["Comments"].isna() | (ACT6["Comments"].str.strip() == "")) &
-         (ACT6["Comment Inv Rating"].isna() | (ACT6["Comment Inv Rating"].str.strip() == ""))) |
-        ~(ACT6["Comments"].str.contains(FINAL_PAT, case=False, na=False, regex=True) |
-          ACT6["Comment Inv Rating"].str.contains(FINAL_PAT, case=False, na=False, regex=True))
+# Every action, by name
+ACTIONS = {
+    func.__name__: func for func in [
+        action2, action3, action5, action6, action7, action9, action15, action16,
+        action17, action18, action19, action20, action21, action22,
     ]
+}
+
+_NBI063 = "NBI 063 Method Used Operating Rating"
+_NBI043 = "NBI 043 Main Structure Type"
+_COMMENTS = ["Comments", "Comment Inv Rating"]
+_STATUS = ["B.LR.04: Load Rating Method", "NBI 041 Open, Posted Or Closed", "B.PS.01: Load Posting Status"]
+_RATINGS = ["NBI 064 Operating Rating", "B.LR.06: Operating Load Rating Factor"]
+
+# Columns each action reads besides the ones its rules test (the columns
+# it writes into its result). Keep in step with the action functions.
+ACTION_READS = {
+    "action2": TONS + [_NBI063] + _STATUS + _COMMENTS,
+    "action3": TONS + _STATUS + [_NBI063] + _COMMENTS + _RATINGS,
+    "action5": TONS + [_NBI063] + _COMMENTS,
+    "action6": TONS + _STATUS + [_NBI063] + _COMMENTS + _RATINGS,
+    "action7": [_NBI063, _NBI043] + _COMMENTS,
+    "action9": [_NBI063] + _COMMENTS,
+    "action15": [],
+    "action16": _COMMENTS,
+    "action17": ["NBI 027 Year Built", "NBI 106 Year Reconst"],
+    "action18": _COMMENTS,
+    "action19": [_NBI043] + _COMMENTS,
+    "action20": [_NBI043],
+    "action21": [_NBI043] + _COMMENTS,
+    "action22": [_NBI043] + _COMMENTS,
+}
+
+# Results kept by run_action, least recently used dropped first (0 turns it off)
+ACTION_MEMO_ENTRIES = int(os.environ.get("BRIDGE_ACTION_MEMO", 64))
+_ACTION_MEMO = {}
+_ACTION_MEMO_LOCK = threading.Lock()
+
+
+def _node_columns(node):
+    if node[0] == "col":
+        return {node[1]}
+    if node[0] == "not":
+        return _node_columns(node[1])
+    return set().union(*[_node_columns(child) for child in node[1]])
+
+
+def action_columns(action, plan=None):
+    """Every column `action` reads: the ones its rules test plus ACTION_READS."""
+    plan = compile_rules() if plan is None else plan
+    columns = set(ACTION_READS[action])
+    for node in plan["actions"][action].values():
+        columns |= _node_columns(node)
+    return sorted(columns)
+
+
+def column_digest(ctx, col):
+    """
+    Digest of a column's name, dtype and values (or of its absence), once
+    per context. Object values are taken with their type, so 1, 1.0 and
+    "1" differ.
+    """
+    if col not in ctx["digests"]:
+        RAW = ctx["raw"]
+        h = hashlib.sha256(repr(col).encode())
+        if col not in RAW.columns:
+            h.update(b"absent")
+        else:
+            values = RAW[col]
+            h.update(str(values.dtype).encode())
+            if isinstance(values.dtype, np.dtype) and values.dtype != object:
+                h.update(np.ascontiguousarray(values.to_numpy()).tobytes())
+            elif isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+                h.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+            else:
+                text = "\x1f".join([f"{type(v).__name__}:{v!r}" for v in values.to_numpy()])
+                h.update(text.encode("utf-8", "surrogatepass"))
+        ctx["digests"][col] = h.hexdigest()
+    return ctx["digests"][col]
 
-    # -----------------------------
-    # Convert for numeric filtering
-    # -----------------------------
-    ACT6["NBI 063 Method Used Operating Rating"] = ACT6["NBI 063 Method Used Operating Rating"].astype(str).str.strip().str.upper()
-    ACT6["NBI 064 Operating Rating"] = pd.to_numeric(ACT6["NBI 064 Operating Rating"], errors="coerce")
-    ACT6["B.LR.06: Operating Load Rating Factor"] = pd.to_numeric(ACT6["B.LR.06: Operating Load Rating Factor"], errors="coerce")
-
-    # -----------------------------
-    # Remove G1 low rating bridges
-    # -----------------------------
-    G1 = ["1", "2", "3", "4", "5", "A", "C"]
-    ACT6 = ACT6[~((ACT6["NBI 063 Method Used Operating Rating"].isin(G1)) &
-                  (ACT6["NBI 064 Operating Rating"] < 45))]
-
-    # -----------------------------
-    # Remove Year Built = 0
-    # -----------------------------
-    ACT6 = ACT6[~(ACT6["B.W.01: Year Built"].astype(str) == "0")]
-
-    # -----------------------------
-    # Remove G2 / low rating bridges
-    # -----------------------------
-    G2 = ["6", "7", "8", "F", "D", "f", "d"]
-    ACT6 = ACT6[~(
-        (ACT6["NBI 063 Method Used Operating Rating"].isin(G2) & (ACT6["NBI 064 Operating Rating"] < 1.26)) |
-        (ACT6["NBI 063 Method Used Operating Rating"].isna() & (ACT6["B.LR.06: Operating Load Rating Factor"] < 1.26))
-    )]
-
-    # -----------------------------
-    # Remove blank or NA Method Used
-    # -----------------------------
-    ACT6 = ACT6[~(ACT6["NBI 063 Method Used Operating Rating"].isna() |
-                  (ACT6["NBI 063 Method Used Operating Rating"] == ""))]
-
-    return ACT6
+
+def _compute_action(action, frame, ctx):
+    if "previous" in ctx:
+        result = patch_action(action, frame, ctx)
+        if result is not None:
+            _note_cache("patched")
+            return result
+    return ACTIONS[action](frame, ctx)
+
+
+def run_action(action, frame, ctx, compute=None):
+    """
+    Result of ACTIONS[action] on frame (RAW, RAW2 or RAW3), memoized on
+    the digests of only the columns it reads (action_columns). A frame
+    that differs in other columns, e.g. corrected traffic tons for
+    Actions 7-22, reuses the earlier result.
+    - compute: compute(action, frame, ctx) gives the result on a miss
+      (default: the action function)
+    """
+    compute = _compute_action if compute is None else compute
+    if not ACTION_MEMO_ENTRIES:
+        return compute(action, frame, ctx)
+
+    plan = ctx["plan"]
+    key = repr((
+        action, plan["actions"][action], len(frame),
+        [column_digest(ctx, col) for col in action_columns(action, plan)],
+    ))
+    with _ACTION_MEMO_LOCK:
+        result = _ACTION_MEMO.pop(key, None)
+        if result is not None:
+            _ACTION_MEMO[key] = result # Most recently used
+
+    _note_cache("miss" if result is None else "hit")
+    if result is None:
+        result = compute(action, frame, ctx)
+        with _ACTION_MEMO_LOCK:
+            _ACTION_MEMO[key] = result
+            while len(_ACTION_MEMO) > ACTION_MEMO_ENTRIES:
+                del _ACTION_MEMO[next(iter(_ACTION_MEMO))]
+
+    # The memo keeps its own dicts; callers may add columns to theirs
+    return {**result, "columns": dict(result["columns"]), "drop": list(result["drop"])}
 
 
 # -------------------------------
 # Excel Generation Function
 # -------------------------------
 
+# Cell formats DataFrame.to_excel uses for the column header row and dates
+EXCEL_HEADER_FORMAT = {
+    "bold": True, "top": 1, "right": 1, "bottom": 1, "left": 1,
+    "align": "center", "valign": "top",
+}
+EXCEL_DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+EXCEL_DATE_FORMAT = "YYYY-MM-DD"
+
+# Rows converted and written per block, bounding the writer's memory
+EXCEL_CHUNK_ROWS = 10000
+
+
+def _excel_value(val, float_format):
+    """
+    (value, number format) of one cell, as DataFrame.to_excel writes it:
+    missing as "", floats through float_format, numpy scalars as Python
+    values, dates with a date format, anything else as str.
+    """
+    if pd.api.types.is_scalar(val) and pd.isna(val):
+        return "", None
+    if pd.api.types.is_float(val):
+        if np.isposinf(val):
+            return "inf", None
+        if np.isneginf(val):
+            return "-inf", None
+        return float(float_format % val), None
+    if getattr(val, "tzinfo", None) is not None:
+        raise ValueError("Excel does not support datetimes with timezones.")
+    if pd.api.types.is_integer(val):
+        return int(val), None
+    if pd.api.types.is_bool(val):
+        return bool(val), None
+    if isinstance(val, dt.datetime):
+        return val, EXCEL_DATETIME_FORMAT
+    if isinstance(val, dt.date):
+        return val, EXCEL_DATE_FORMAT
+    if isinstance(val, dt.timedelta):
+        return val.total_seconds() / 86400, "0"
+    return str(val), None
+
+
+def _excel_column(values, float_format):
+    """
+    Cell values of one column (a Series), converted for the whole column
+    where its dtype allows: (list of values, list of number formats or None).
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        f = values.to_numpy()
+        out = np.char.mod(float_format, f).astype(float).astype(object)
+        out[np.isnan(f)] = ""
+        out[np.isposinf(f)] = "inf"
+        out[np.isneginf(f)] = "-inf"
+        return out.tolist(), None
+    if isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return values.tolist(), None
+    if (not isinstance(dtype, np.dtype) or dtype == object) and \
+            pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+        return values.to_numpy(dtype=object, na_value="").tolist(), None
+
+    cells = [_excel_value(val, float_format) for val in values.to_numpy(dtype=object)]
+    formats = [fmt for _, fmt in cells]
+    return [val for val, _ in cells], (formats if any(formats) else None)
+
+
+def _write_frame(workbook, sheet, df, startrow, header, float_format="%.3f"):
+    """
+    Write df like df.to_excel(startrow=startrow, index=False): the column
+    header row, then the data rows top to bottom in blocks of
+    EXCEL_CHUNK_ROWS, so a constant_memory workbook can stream them.
+    """
+    sheet.write_row(startrow, 0, [_excel_value(col, float_format)[0] for col in df.columns], header)
+
+    number_formats = {}
+    row = startrow + 1
+    for start in range(0, len(df), EXCEL_CHUNK_ROWS):
+        block = df.iloc[start:start + EXCEL_CHUNK_ROWS]
+        columns = [_excel_column(block.iloc[:, j], float_format) for j in range(block.shape[1])]
+        dated = [(j, formats) for j, (_, formats) in enumerate(columns) if formats is not None]
+
+        for i, values in enumerate(zip(*[values for values, _ in columns])):
+            sheet.write_row(row, 0, values)
+            for j, formats in dated:
+                if formats[i] is not None:
+                    if formats[i] not in number_formats:
+                        number_formats[formats[i]] = workbook.add_format({"num_format": formats[i]})
+                    sheet.write(row, j, values[j], number_formats[formats[i]])
+            row += 1
+
+
 def generate_bridge_excel(
     RAW, RAW2, RAW3,
     ACT2, ACT3, ACT5, ACT6,
     ACT7, ACT8, ACT9_F, ACT9_CT_S, ACT9_CT_NS,
     ACT15_F, ACT16_F, ACT17_F, ACT18_F,
     ACT19_F, ACT19_CT_SB, ACT19_CT_SD, ACT19_CT_NP, ACT19_CT_BLT,
-    ACT20, ACT21, ACT22_F
+    ACT20, ACT21, ACT22_F, constant_memory=True
 ):
     """
     Generates a fully formatted Excel workbook in-memory for the bridge metrics.
     Returns a BytesIO object suitable for Streamlit download_button.
+    - constant_memory: rows are streamed to disk as they are written, so the
+      writer holds one row at a time instead of every sheet
     """
+    import xlsxwriter
+
     output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": constant_memory})
+
+        # --- Define formats ---
+    Aleft = workbook.add_format({"bold": True, "align": "left"})
+    bold = workbook.add_format({"bold": True})
+    header = workbook.add_format(EXCEL_HEADER_FORMAT)
+
+        # --- Sheets in workbook order: (name, data, data start row, headers and counts) ---
+    sheets = [
+        ("RAW", RAW, 4, [
+            ("A1", "Raw Data From Original Query", Aleft),
+        ]),
+        ("RAW2", RAW2, 4, [
+            ("A1", "Raw Data Minus Bridges in Action 7, Action 8, Action 9, Action 15, Action 16, Action 17, Action 18, Action 19, Action 20, Action 21 and Action 22", Aleft),
+            ("A2", "Used to Calculate Action 2 and Action 3", Aleft),
+        ]),
+        ("RAW3", RAW3, 4, [
+            ("A1", "Raw Data Minus Bridges in Action 8", Aleft),
+            ("A2", "Used to Calculate Action 5 and Action 6", Aleft),
+        ]),
+        ("ACTION7", ACT7, 4, [
+            ("A1", "Action Item 7 (formerly Action Item 3 in Metric 13): LPA bridges built after 1994 with ASR load ratings. These bridges must be updated to LFR.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT7), bold),
+        ]),
+        ("ACTION8", ACT8, 4, [
+            ("A1", "Action Item 8: LPA bridges reconstructed after 1994 with ASR load ratings. These bridges must be updated to LFR. ", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT8), bold),
+        ]),
+        ("ACTION9", ACT9_F, 5, [
+            ("A1", "Action Item 9 (formerly Action Item 5 in Metric 13):  LPA bridges designed LRFD after October 1st, 2010 but are rated LFR. These bridges must be updated to LRFR.", Aleft),
+            ("A2", "Total Bridges:", None),
+            ("B2", len(ACT9_F), bold),
+            ("A3", "Standard:", None),
+            ("B3", ACT9_CT_S, bold),
+            ("A4", "Non-Standard:", None),
+            ("B4", ACT9_CT_NS, bold),
+        ]),
+        ("ACTION15", ACT15_F, 4, [
+            ("A1", "Action Item 15 (formerly Action Item 11 in Metric 13): LPA bridges with Assigned load ratings where ratings are not appropriate. Load Rating calculations are needed.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT15_F), bold),
+        ]),
+        ("ACTION16", ACT16_F, 4, [
+            ("A1", "Action Item 16 (formerly Action Item 5 in Metric 15): LPA bridges have Assigned load ratings. Documentation is needed to state the criteria for how the Assigned ratings are appropriate.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT16_F), bold),
+        ]),
+        ("ACTION17", ACT17_F, 4, [
+            ("A1", "Action Item 17 (formerly Action Item 12 in Metric 13): DOT owned bridges have Assigned load ratings where ratings are not appropriate. Load Rating calculations are needed.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT17_F), bold),
+        ]),
+        ("ACTION18", ACT18_F, 4, [
+            ("A1", "Action Item 18 (formerly Action Item 6 in Metric 15): DOT bridges have Assigned load ratings. Documentation is needed to state the criteria for how the Assigned ratings are appropriate.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT18_F), bold),
+        ]),
+        ("ACTION19", ACT19_F, 7, [
+            ("A1", "Action Item 19 (formerly Action Item 13 in Metric 13): LPA bridges rated with engineering judgement needing load rating calculations or documentation explaining why EJ was used.", Aleft),
+            ("A2", "Total Bridges:", None),
+            ("B2", len(ACT19_F), bold),
+            ("A3", "Standard Bridge:", None),
+            ("B3", ACT19_CT_SB, bold),
+            ("A4", "Severe Deterioration:", None),
+            ("B4", ACT19_CT_SD, bold),
+            ("A5", "Not Permitted:", None),
+            ("B5", ACT19_CT_NP, bold),
+            ("A6", "Bridge was Load Tested:", None),
+            ("B6", ACT19_CT_BLT, bold),
+        ]),
+        ("ACTION20", ACT20, 4, [
+            ("A1", "Action Item 20 (formerly Action Item 7 in Metric 15): LPA bridges rated with engineering judgement valid documentation.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT20), bold),
+        ]),
+        ("ACTION21", ACT21, 4, [
+            ("A1", "Action Item 21 (formerly Action Item 8 in Metric 15): DOT bridges rated with engineering judgement valid documentation.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT21), bold),
+        ]),
+        ("ACTION22", ACT22_F, 4, [
+            ("A1", "Action Item 22 Query excludes bridges built in 2022 and after.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT22_F), bold),
+        ]),
+        ("ACTION2", ACT2, 4, [
+            ("A1", "Action Item 2 (formerly Action Item 1 in Metric 15): LPA bridges that only have the controlling Specialized Hauling Vehicle rating entered. They must have all Specialized Hauling Vehicles ratings included in the Load Rating tables.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT2), bold),
+        ]),
+        ("ACTION3", ACT3, 4, [
+            ("A1", "Action Item 3 (formerly Action Item 2 in Metric 15):  LPA bridges where the DOT parametric study was used to determine the load ratings for SHV’s but a note needs to be included in the comment field of the Load Rating Report.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT3), bold),
+        ]),
+        ("ACTION5", ACT5, 4, [
+            ("A1", "Action Item 5 (formerly Action Item 3 in Metric 15): DOT bridges that have only entered the controlling Specialized Hauling Vehicle rating.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT5), bold),
+        ]),
+        ("ACTION6", ACT6, 4, [
+            ("A1", "Action Item 6 (formerly Action Item 4 in Metric 15): DOT bridges where the DOT parametric study was used to determine the load ratings for SHV’s but a note needs to be included in the comment field of the Load Rating Report.", Aleft),
+            ("A3", "Total Bridges:", None),
+            ("B3", len(ACT6), bold),
+        ]),
+    ]
+
+    for name, df, startrow, cells in sheets:
+        sheet = workbook.add_worksheet(name)
+        # Headers and counts first: a constant_memory sheet is written top to bottom
+        for cell, value, fmt in cells:
+            sheet.write(cell, value, fmt)
+        _write_frame(workbook, sheet, df, startrow, header)
 
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer: 
-
-        RAW.to_excel(writer, sheet_name="RAW", float_format="%.3f", startrow=4, startcol=0, index=False)
-        RAW2.to_excel(writer, sheet_name="RAW2", float_format="%.3f", startrow=4, startcol=0, index=False)
-        RAW3.to_excel(writer, sheet_name="RAW3", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT7.to_excel(writer, sheet_name="ACTION7", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT8.to_excel(writer, sheet_name="ACTION8", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT9_F.to_excel(writer, sheet_name="ACTION9", float_format="%.3f", startrow=5, startcol=0, index=False)
-        ACT15_F.to_excel(writer, sheet_name="ACTION15", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT16_F.to_excel(writer, sheet_name="ACTION16", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT17_F.to_excel(writer, sheet_name="ACTION17", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT18_F.to_excel(writer, sheet_name="ACTION18", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT19_F.to_excel(writer, sheet_name="ACTION19", float_format="%.3f", startrow=7, startcol=0, index=False)
-        ACT20.to_excel(writer, sheet_name="ACTION20", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT21.to_excel(writer, sheet_name="ACTION21", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT22_F.to_excel(writer, sheet_name="ACTION22", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT2.to_excel(writer, sheet_name="ACTION2", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT3.to_excel(writer, sheet_name="ACTION3", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT5.to_excel(writer, sheet_name="ACTION5", float_format="%.3f", startrow=4, startcol=0, index=False)
-        ACT6.to_excel(writer, sheet_name="ACTION6", float_format="%.3f", startrow=4, startcol=0, index=False)
-
-        # --- Access workbook and sheets for formatting ---
-        workbook = writer.book
-        sheet1 = writer.sheets["ACTION7"]
-        sheet2 = writer.sheets["ACTION8"]
-        sheet3 = writer.sheets["ACTION9"]
-        sheet4 = writer.sheets["ACTION15"]
-        sheet5 = writer.sheets["ACTION16"]
-        sheet6 = writer.sheets["ACTION17"]
-        sheet7 = writer.sheets["ACTION18"]
-        sheet8 = writer.sheets["ACTION19"]
-        sheet9 = writer.sheets["ACTION20"]
-        sheet10 = writer.sheets["ACTION21"]
-        sheet11 = writer.sheets["ACTION22"]
-        sheet12 = writer.sheets["ACTION2"]
-        sheet13 = writer.sheets["ACTION3"]
-        sheet14 = writer.sheets["ACTION5"]
-        sheet15 = writer.sheets["ACTION6"]
-        sheet16 = writer.sheets["RAW"]
-        sheet17 = writer.sheets["RAW2"]
-        sheet18 = writer.sheets["RAW3"]
-
-            # --- Define formats ---
-        Aleft = workbook.add_format({"bold": True, "align": "left"})
-        bold = workbook.add_format({"bold": True})
-
-            # --- Write Headers and Counts ---
-        sheet1.write("A1", "Action Item 7 (formerly Action Item 3 in Metric 13): LPA bridges built after 1994 with ASR load ratings. These bridges must be updated to LFR.", Aleft)
-        sheet1.write("A3", "Total Bridges:")
-        sheet1.write("B3", len(ACT7), bold)
-
-        sheet2.write("A1", "Action Item 8: LPA bridges reconstructed after 1994 with ASR load ratings. These bridges must be updated to LFR. ", Aleft)
-        sheet2.write("A3", "Total Bridges:")
-        sheet2.write("B3", len(ACT8), bold)
-
-        sheet3.write("A1", "Action Item 9 (formerly Action Item 5 in Metric 13):  LPA bridges designed LRFD after October 1st, 2010 but are rated LFR. These bridges must be updated to LRFR.", Aleft)
-        sheet3.write("A2", "Total Bridges:")
-        sheet3.write("B2", len(ACT9_F), bold)
-        sheet3.write("A3","Standard:")
-        sheet3.write("B3", ACT9_CT_S, bold)
-        sheet3.write("A4","Non-Standard:")
-        sheet3.write("B4", ACT9_CT_NS, bold)
-
-        sheet4.write("A1", "Action Item 15 (formerly Action Item 11 in Metric 13): LPA bridges with Assigned load ratings where ratings are not appropriate. Load Rating calculations are needed.", Aleft)
-        sheet4.write("A3", "Total Bridges:")
-        sheet4.write("B3", len(ACT15_F), bold)
-
-        sheet5.write("A1", "Action Item 16 (formerly Action Item 5 in Metric 15): LPA bridges have Assigned load ratings. Documentation is needed to state the criteria for how the Assigned ratings are appropriate.", Aleft)
-        sheet5.write("A3", "Total Bridges:")
-        sheet5.write("B3", len(ACT16_F), bold)
-
-        sheet6.write("A1", "Action Item 17 (formerly Action Item 12 in Metric 13): DOT owned bridges have Assigned load ratings where ratings are not appropriate. Load Rating calculations are needed.", Aleft)
-        sheet6.write("A3", "Total Bridges:")
-        sheet6.write("B3", len(ACT17_F), bold)
-
-        sheet7.write("A1", "Action Item 18 (formerly Action Item 6 in Metric 15): DOT bridges have Assigned load ratings. Documentation is needed to state the criteria for how the Assigned ratings are appropriate.", Aleft)
-        sheet7.write("A3", "Total Bridges:")
-        sheet7.write("B3", len(ACT18_F), bold)
-
-        sheet8.write("A1", "Action Item 19 (formerly Action Item 13 in Metric 13): LPA bridges rated with engineering judgement needing load rating calculations or documentation explaining why EJ was used.", Aleft)
-        sheet8.write("A2", "Total Bridges:")
-        sheet8.write("B2", len(ACT19_F), bold) 
-        sheet8.write("A3","Standard Bridge:")
-        sheet8.write("B3", ACT19_CT_SB, bold)
-        sheet8.write("A4","Severe Deterioration:")
-        sheet8.write("B4", ACT19_CT_SD, bold)
-        sheet8.write("A5","Not Permitted:")
-        sheet8.write("B5", ACT19_CT_NP, bold)
-        sheet8.write("A6","Bridge was Load Tested:")
-        sheet8.write("B6", ACT19_CT_BLT, bold)
-
-        sheet9.write("A1", "Action Item 20 (formerly Action Item 7 in Metric 15): LPA bridges rated with engineering judgement valid documentation.", Aleft)
-        sheet9.write("A3", "Total Bridges:")
-        sheet9.write("B3", len(ACT20), bold) 
-
-        sheet10.write("A1", "Action Item 21 (formerly Action Item 8 in Metric 15): DOT bridges rated with engineering judgement valid documentation.", Aleft)
-        sheet10.write("A3", "Total Bridges:")
-        sheet10.write("B3", len(ACT21), bold) 
-
-        sheet11.write("A1", "Action Item 22 Query excludes bridges built in 2022 and after.", Aleft)
-        sheet11.write("A3", "Total Bridges:")
-        sheet11.write("B3", len(ACT22_F), bold) 
-
-        sheet12.write("A1", "Action Item 2 (formerly Action Item 1 in Metric 15): LPA bridges that only have the controlling Specialized Hauling Vehicle rating entered. They must have all Specialized Hauling Vehicles ratings included in the Load Rating tables.", Aleft)
-        sheet12.write("A3", "Total Bridges:")
-        sheet12.write("B3", len(ACT2), bold) 
-
-        sheet13.write("A1", "Action Item 3 (formerly Action Item 2 in Metric 15):  LPA bridges where the DOT parametric study was used to determine the load ratings for SHV’s but a note needs to be included in the comment field of the Load Rating Report.", Aleft)
-        sheet13.write("A3", "Total Bridges:")
-        sheet13.write("B3", len(ACT3), bold)
-
-        sheet14.write("A1", "Action Item 5 (formerly Action Item 3 in Metric 15): DOT bridges that have only entered the controlling Specialized Hauling Vehicle rating.", Aleft)
-        sheet14.write("A3", "Total Bridges:")
-        sheet14.write("B3", len(ACT5), bold) 
-
-        sheet15.write("A1", "Action Item 6 (formerly Action Item 4 in Metric 15): DOT bridges where the DOT parametric study was used to determine the load ratings for SHV’s but a note needs to be included in the comment field of the Load Rating Report.", Aleft)
-        sheet15.write("A3", "Total Bridges:")
-        sheet15.write("B3", len(ACT6), bold) 
-
-        sheet16.write("A1", "Raw Data From Original Query", Aleft)
-        sheet17.write("A1", "Raw Data Minus Bridges in Action 7, Action 8, Action 9, Action 15, Action 16, Action 17, Action 18, Action 19, Action 20, Action 21 and Action 22", Aleft)
-        sheet17.write("A2", "Used to Calculate Action 2 and Action 3", Aleft)
-        sheet18.write("A1", "Raw Data Minus Bridges in Action 8", Aleft)
-        sheet18.write("A2", "Used to Calculate Action 5 and Action 6", Aleft)
-
-    # writer.save() # This is not needed, 'with' statement handles saving/closing
+    workbook.close()
     output.seek(0)
 
     return output
 
 
-# In[ ]:
+# -------------------------------
+# Parquet and CSV Exports
+# -------------------------------
+
+# Inferred kinds of object columns Arrow cannot store as one type
+_PARQUET_TEXT_KINDS = ("mixed", "mixed-integer")
+
+
+def _parquet_table(df):
+    """
+    df as an Arrow table for Parquet:
+    - Headers as strings
+    - Object columns mixing text and numbers stored as text (missing kept null)
+    """
+    import pyarrow as pa
+
+    df = df.copy(deep=False)
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i]
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in _PARQUET_TEXT_KINDS:
+            df.isetitem(i, values.map(str).where(values.notna(), None))
+    df.columns = [str(col) for col in df.columns]
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def generate_bridge_parquet(frames):
+    """
+    Zip archive with one Parquet file per sheet (e.g. ACTION7.parquet).
+    - frames: sheet name -> DataFrame, as in the Excel workbook
+    Returns a BytesIO object suitable for Streamlit download_button.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    output = io.BytesIO()
+    # Parquet pages are already compressed, so the archive just stores them
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        for name, df in frames.items():
+            with archive.open(name + ".parquet", "w") as member:
+                pq.write_table(_parquet_table(df), member)
+    output.seek(0)
+
+    #Arrow's allocator keeps freed table memory for reuse; hand it back.
+    pa.default_memory_pool().release_unused()
+
+    return output
+
+
+def generate_bridge_csv(frames, counts):
+    """
+    Zip archive with one CSV per sheet plus manifest.json.
+    - frames: sheet name -> DataFrame, as in the Excel workbook
+    - counts: the summary counts shown in the app, copied into the manifest
+      along with each file's sheet, row count and columns
+    Returns a BytesIO object suitable for Streamlit download_button.
+    """
+    manifest = {"counts": counts, "files": []}
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, df in frames.items():
+            with archive.open(name + ".csv", "w") as member:
+                with io.TextIOWrapper(member, encoding="utf-8", newline="") as text:
+                    df.to_csv(text, index=False)
+            manifest["files"].append({
+                "file": name + ".csv",
+                "sheet": name,
+                "rows": len(df),
+                "columns": [str(col) for col in df.columns],
+            })
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2, default=int))
+    output.seek(0)
+
+    return output
+
+
+# -------------------------------
+# Actions in Worker Processes
+# -------------------------------
+
+# Frames (and their contexts) a worker process has read, by path
+_WORKER_FRAMES = {}
+_WORKER_FRAMES_MAX = 3 # RAW, RAW2 and RAW3 of the latest run
+
+# Process pools by size, started on first use and kept for later runs
+_PROCESS_POOLS = {}
+
+
+def _mp_context():
+    """
+    Start method for worker processes: a fresh interpreter (forkserver,
+    else spawn) rather than a fork of this threaded process.
+    """
+    import multiprocessing
+
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _process_pool(processes):
+    if processes not in _PROCESS_POOLS:
+        _PROCESS_POOLS[processes] = concurrent.futures.ProcessPoolExecutor(processes, mp_context=_mp_context())
+    return _PROCESS_POOLS[processes]
+
+
+def _share_frame(path, frame):
+    """
+    Publish frame for worker processes: written once as an Arrow file
+    (see _cache_store) that workers memory-map, plus its index.
+    """
+    _cache_store(path, frame.reset_index(drop=True))
+    with open(path + ".index", "wb") as f:
+        pickle.dump(frame.index, f)
+
+
+def _worker_frame(path, plan):
+    """(frame, context) of a shared frame, read once per worker process."""
+    if path not in _WORKER_FRAMES:
+        frame = _cache_load(path)
+        if frame is None:
+            raise FileNotFoundError(f"Shared frame {path} is missing or unreadable")
+        with open(path + ".index", "rb") as f:
+            frame.index = pickle.load(f)
+        while len(_WORKER_FRAMES) >= _WORKER_FRAMES_MAX:
+            del _WORKER_FRAMES[next(iter(_WORKER_FRAMES))]
+        _WORKER_FRAMES[path] = (frame, build_action_context(frame, plan=plan))
+    return _WORKER_FRAMES[path]
+
+
+def _run_action(path, action, plan):
+    """
+    Worker process side: the result of `action` on the shared frame at
+    path. Results hold row positions and the columns the action writes,
+    so only those travel back, never the frame.
+    """
+    frame, ctx = _worker_frame(path, plan)
+    return ACTIONS[action](frame, ctx)
+
+
+def _process_stages(stages, pool, folder):
+    """
+    stages with every action stage (run_action) computed in a worker
+    process of pool on a memo miss.
+    Each frame an action reads is shared once, under folder; actions on
+    the same frame in one worker reuse its context (and memo).
+    """
+    shared = {}
+    lock = threading.Lock()
 
+    def share(frame):
+        with lock:
+            if id(frame) not in shared:
+                path = os.path.join(folder, str(len(shared)))
+                _share_frame(path, frame)
+                shared[id(frame)] = (path, frame) # frame held so its id is not reused
+            return shared[id(frame)][0]
 
+    def remote(action, frame, ctx):
+        return pool.submit(_run_action, share(frame), action, ctx["plan"]).result()
+
+    return {
+        name: (functools.partial(run_action, func.args[0], compute=remote), deps)
+        if isinstance(func, functools.partial) and func.func is run_action else (func, deps)
+        for name, (func, deps) in stages.items()
+    }
+
+
+# -------------------------------
+# Incremental Runs
+# -------------------------------
+#
+# From one period to the next only a few bridges change. A run can hand
+# its state (run_state) to the next run on a new RAW / Action 8 pair
+# (run_pipeline's `previous` input). Rows are matched to the previous
+# run's by a fingerprint of the columns they are read on:
+# - normalized keys are reused for rows with the same 42 key columns
+# - each action runs only on the rows that are new or changed; the rows of
+#   the others keep their previous membership and written values
+# RAW2 and RAW3 are then rebuilt from the reused keys and key fingerprints.
+# Wherever reuse could give a different result (a column's dtype changed,
+# a written column's dtype depends on its rows) the step runs in full, so
+# the output is always the same as a full run's.
+
+# Two 64-bit hashes of a row, with different keys (16 characters)
+_FINGERPRINT = np.dtype([("a", "<u8"), ("b", "<u8")])
+_SECOND_HASH_KEY = "bridge-metrics-2"
+
+
+def _fingerprints(frame):
+    """128-bit fingerprint of each row of frame (equal rows, equal fingerprints)."""
+    fp = np.empty(len(frame), dtype=_FINGERPRINT)
+    fp["a"] = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    fp["b"] = pd.util.hash_pandas_object(frame, index=False, hash_key=_SECOND_HASH_KEY).to_numpy()
+    return fp
+
+
+def _found(known, fp):
+    """Mask of the fingerprints in fp that are in `known` (sorted)."""
+    if len(known) == 0:
+        return np.zeros(len(fp), dtype=bool)
+    i = np.searchsorted(known, fp)
+    return known[np.minimum(i, len(known) - 1)] == fp
+
+
+def _typed_hashes(values):
+    """
+    64-bit hash of each value of a column. Object values are hashed with
+    their type, so 1, 1.0, True and "1" (or None and NaN) differ.
+    """
+    h = pd.util.hash_pandas_object(values, index=False).to_numpy().copy()
+    if values.dtype == object:
+        cells = values.to_numpy()
+        if pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+            picked = np.flatnonzero(pd.isna(cells)) # Only missing values differ in type
+        else:
+            picked = np.arange(len(cells))
+        if len(picked):
+            codes, types = pd.factorize(np.frompyfunc(type, 1, 1)(cells[picked]))
+            names = pd.Series([t.__name__ for t in types], dtype=object)
+            h[picked] ^= pd.util.hash_pandas_object(names, index=False).to_numpy()[codes]
+    return h
+
+
+def row_fingerprints(ctx, columns):
+    """
+    128-bit fingerprint of each row of the context's frame over `columns`
+    (absent ones left out). Column hashes are kept in the context.
+    """
+    frame = ctx["raw"]
+    hashes = ctx.setdefault("hashes", {})
+    for col in columns:
+        if col in frame.columns and col not in hashes:
+            hashes[col] = _typed_hashes(frame[col])
+    picked = {i: hashes[col] for i, col in enumerate(columns) if col in frame.columns}
+    return _fingerprints(pd.DataFrame(picked or {0: np.zeros(len(frame), dtype=np.uint64)}, copy=False))
+
+
+def _dtype_names(frame, columns):
+    """Column -> dtype name; categorical and Arrow text read like object (see set_column_dtypes)."""
+    return {
+        col: "object" if isinstance(frame[col].dtype, (pd.CategoricalDtype, pd.StringDtype)) else str(frame[col].dtype)
+        for col in columns if col in frame.columns
+    }
+
+
+def _read_columns(plan):
+    """Every column an action reads (see action_columns)."""
+    return sorted(set().union(*[action_columns(action, plan) for action in ACTIONS]))
+
+
+def _rows_state(ctx, columns):
+    """The context frame's rows by their fingerprint over columns (sorted), for _previous_rows."""
+    fp = row_fingerprints(ctx, columns)
+    order = np.argsort(fp, kind="stable")
+    return {"columns": list(columns), "dtypes": _dtype_names(ctx["raw"], columns), "fp": fp[order], "order": order}
+
+
+def _previous_rows(ctx, state):
+    """Row of the previous frame with the same values as each row of the context's frame (-1 if none)."""
+    fp = row_fingerprints(ctx, state["columns"])
+    known = state["fp"]
+    if len(known) == 0:
+        return np.full(len(fp), -1)
+    i = np.minimum(np.searchsorted(known, fp), len(known) - 1)
+    return np.where(known[i] == fp, state["order"][i], -1)
+
+
+def incremental_keys(RAW, ctx, previous=None):
+    """
+    normalize_keys(RAW, first 42 columns) followed by the key_fingerprints
+    of each form. Keys of a previous run (run_state) are reused for the
+    rows whose key columns are unchanged.
+    """
+    first42 = RAW.columns[:42].tolist()
+    state = None if previous is None else previous["keys"]
+    if state is None or state["columns"] != first42 or state["dtypes"] != _dtype_names(RAW, first42):
+        keys = normalize_keys(RAW, first42)
+        return keys + tuple(key_fingerprints(k) for k in keys)
+
+    old = _previous_rows(ctx, state)
+    same = old >= 0
+    changed = normalize_keys(RAW[~same], first42)
+    keys = []
+    for previous_keys, changed_keys in zip(state["keys"], changed):
+        columns = {}
+        for col in first42:
+            values = np.empty(len(RAW), dtype=object)
+            values[same] = previous_keys[col].to_numpy()[old[same]]
+            values[~same] = changed_keys[col].to_numpy()
+            columns[col] = values
+        keys.append(pd.DataFrame(columns, index=RAW.index, copy=False))
+    fingerprints = []
+    for previous_fp, changed_keys in zip(state["fingerprints"], changed):
+        fp = np.empty(len(RAW), dtype=np.uint64)
+        fp[same] = previous_fp[old[same]]
+        fp[~same] = key_fingerprints(changed_keys)
+        fingerprints.append(fp)
+    return tuple(keys) + tuple(fingerprints)
+
+
+def _context_stage(name, frame, previous, ctx=None):
+    """
+    Evaluation context of frame (RAW, RAW2 or RAW3). Given a previous run,
+    it also holds the rows changed since (a frame of their own, with its
+    context) and where the others were, for patch_action.
+    """
+    new = build_action_context(frame, plan=None if ctx is None else ctx["plan"])
+    if previous is not None and previous["version"] == new["plan"]["version"]:
+        state = previous["frames"][name]
+        old = _previous_rows(new, state)
+        changed = np.flatnonzero(old < 0)
+        sub = frame.iloc[changed]
+        new["previous"] = {
+            "state": state, "old": old, "changed": changed,
+            "frame": sub, "ctx": build_action_context(sub, plan=new["plan"]),
+        }
+    return new
+
+
+def _patchable(values):
+    """Written values whose dtype does not depend on which rows they are (text, objects)."""
+    return values.dtype == object or values.dtype.kind == "U"
+
+
+def patch_action(action, frame, ctx):
+    """
+    Result of ACTIONS[action] on frame, from the previous run's result (see
+    _context_stage) and the action run on the changed rows only. Returns
+    None where that could differ from a full run.
+    """
+    previous = ctx["previous"]
+    kept = previous["state"]["actions"].get(action)
+    if kept is None or _dtype_names(frame, action_columns(action, ctx["plan"])) != kept["dtypes"]:
+        return None
+
+    sub = ACTIONS[action](previous["frame"], previous["ctx"])
+    if len(sub["parts"]) != len(kept["parts"]) or sub["readings"] != kept["readings"]:
+        return None
+
+    # Written values are patched when their dtype cannot change: text, or
+    # a column read (e.g. as numeric) whose changed rows read as the same
+    # dtype. Other columns read are read again; other values, run in full.
+    old, changed, size = previous["old"], previous["changed"], len(previous["state"]["order"])
+    readings = dict(sub["readings"])
+    patched = []
+    for col, values in sub["columns"].items():
+        if values.dtype == kept["columns"][col][0].dtype and (_patchable(values) or col in readings and len(changed)):
+            patched.append(col)
+        elif col not in readings:
+            return None
+
+    same = np.flatnonzero(old >= 0)
+    ends = np.cumsum(sub["parts"])
+    parts, values = [], {col: [] for col in patched}
+    for p, members in enumerate(kept["parts"]):
+        was = np.unpackbits(members, count=size).astype(bool)
+        member = np.zeros(len(frame), dtype=bool)
+        member[same] = was[old[same]]
+        found = changed[sub["rows"][ends[p] - sub["parts"][p]:ends[p]]]
+        member[found] = True
+        rows = np.flatnonzero(member)
+        parts.append(rows)
+
+        # The previous values for unchanged rows, else the new
+        for col in patched:
+            previous_values = np.empty(size, dtype=kept["columns"][col][p].dtype)
+            previous_values[was] = kept["columns"][col][p]
+            written = np.empty(len(frame), dtype=previous_values.dtype)
+            written[same] = previous_values[old[same]]
+            written[found] = sub["columns"][col][ends[p] - sub["parts"][p]:ends[p]]
+            values[col].append(written[rows])
+
+    rows = np.concatenate(parts)
+    return {
+        "rows": rows,
+        "parts": [len(part) for part in parts],
+        "columns": {
+            col: np.concatenate(values[col]) if col in values else _column(ctx, col, readings[col]).to_numpy()[rows]
+            for col in sub["columns"]
+        },
+        "readings": list(sub["readings"]),
+        "reset_index": sub["reset_index"],
+        "drop": list(sub["drop"]),
+    }
+
+
+def _action_state(frame, result, plan, action):
+    """What run_state keeps of an action result: its members and written values, per part."""
+    ends = np.cumsum(result["parts"])
+    starts = ends - np.asarray(result["parts"], dtype=int)
+    parts = []
+    for start, end in zip(starts, ends):
+        member = np.zeros(len(frame), dtype=bool)
+        member[result["rows"][start:end]] = True
+        parts.append(np.packbits(member))
+    return {
+        "dtypes": _dtype_names(frame, action_columns(action, plan)),
+        "readings": result["readings"],
+        "parts": parts,
+        "columns": {
+            col: [values[start:end] for start, end in zip(starts, ends)]
+            for col, values in result["columns"].items()
+        },
+    }
+
+
+def run_state(
+    keys, ctx, ctx2, ctx3,
+    ACT2, ACT3, ACT5, ACT6,
+    ACT7, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F,
+    ACT19_F, ACT20, ACT21, ACT22_F
+):
+    """
+    State of a finished run, for the next run's `previous` input (see
+    run_pipeline); save_state keeps it on disk:
+    - version: of the rules it ran
+    - keys: RAW's normalized keys and key fingerprints (see
+      incremental_keys), by the fingerprint of each row's key columns
+    - frames: for RAW, RAW2 and RAW3, the fingerprint of each row over the
+      columns actions read, and each action's members and written values
+    """
+    plan = ctx["plan"]
+    first42 = ctx["raw"].columns[:42].tolist()
+    columns = _read_columns(plan)
+    results = {
+        "RAW": (ctx, {"action7": ACT7, "action9": ACT9_F, "action15": ACT15_F, "action16": ACT16_F,
+                      "action17": ACT17_F, "action18": ACT18_F, "action19": ACT19_F,
+                      "action20": ACT20, "action21": ACT21, "action22": ACT22_F}),
+        "RAW2": (ctx2, {"action2": ACT2, "action3": ACT3}),
+        "RAW3": (ctx3, {"action5": ACT5, "action6": ACT6}),
+    }
+    return {
+        "version": plan["version"],
+        "keys": {**_rows_state(ctx, first42), "keys": keys[:2], "fingerprints": keys[2:]},
+        "frames": {
+            name: {**_rows_state(c, columns), "actions": {
+                action: _action_state(c["raw"], result, plan, action) for action, result in actions.items()
+            }}
+            for name, (c, actions) in results.items()
+        },
+    }
+
+
+def save_state(state, path):
+    """Write a run_state to path (replaced atomically)."""
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def load_state(path):
+    """A run_state saved by save_state, or None if path does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+# -------------------------------
+# Pipeline
+# -------------------------------
+
+# Threads used by run_pipeline (1 runs the stages one at a time)
+PIPELINE_WORKERS = int(os.environ.get("BRIDGE_WORKERS", 0)) or min(32, (os.cpu_count() or 1) + 4)
+
+# Worker processes used by run_pipeline for the actions (0: actions run in threads)
+PIPELINE_PROCESSES = int(os.environ.get("BRIDGE_PROCESSES", 0))
+
+
+def export_frames(
+    RAW, RAW2, RAW3,
+    ACT2, ACT3, ACT5, ACT6,
+    ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F,
+    ACT19_F, ACT20, ACT21, ACT22_F
+):
+    """
+    Sheet name -> DataFrame of every exported sheet, in workbook order.
+    Action results (dicts) are materialized on the frame they were
+    evaluated on (RAW for Actions 7-22, RAW2 for 2/3, RAW3 for 5/6).
+    """
+    return {
+        "RAW2": RAW2, "RAW3": RAW3,
+        "ACTION7": materialize(RAW, ACT7), "ACTION8": ACT8,
+        "ACTION9": materialize(RAW, ACT9_F),
+        "ACTION15": materialize(RAW, ACT15_F), "ACTION16": materialize(RAW, ACT16_F),
+        "ACTION17": materialize(RAW, ACT17_F), "ACTION18": materialize(RAW, ACT18_F),
+        "ACTION19": materialize(RAW, ACT19_F), "ACTION20": materialize(RAW, ACT20),
+        "ACTION21": materialize(RAW, ACT21), "ACTION22": materialize(RAW, ACT22_F),
+        "ACTION2": materialize(RAW2, ACT2), "ACTION3": materialize(RAW2, ACT3),
+        "ACTION5": materialize(RAW3, ACT5), "ACTION6": materialize(RAW3, ACT6),
+    }
+
+
+def summary_counts(
+    RAW, RAW2, RAW3,
+    ACT2, ACT3, ACT5, ACT6,
+    ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F,
+    ACT19_F, ACT20, ACT21, ACT22_F
+):
+    """Number of bridges per action and frame, as shown in the app."""
+    return {
+        "Action 2": len(ACT2["rows"]),
+        "Action 3": len(ACT3["rows"]),
+        "Action 5": len(ACT5["rows"]),
+        "Action 6": len(ACT6["rows"]),
+        "Action 7": len(ACT7["rows"]),
+        "Action 8 (Uploaded)": len(ACT8),
+        "Action 9": len(ACT9_F["rows"]),
+        "Action 15": len(ACT15_F["rows"]),
+        "Action 16": len(ACT16_F["rows"]),
+        "Action 17": len(ACT17_F["rows"]),
+        "Action 18": len(ACT18_F["rows"]),
+        "Action 19": len(ACT19_F["rows"]),
+        "Action 20": len(ACT20["rows"]),
+        "Action 21": len(ACT21["rows"]),
+        "Action 22": len(ACT22_F["rows"]),
+        "RAW (Original)": len(RAW),
+        "RAW2 (RAW - Actions 7-22)": len(RAW2),
+        "RAW3 (RAW - Action 8)": len(RAW3)
+    }
+
+
+def _sub_count(result, col, value):
+    return int((result["columns"][col] == value).sum())
+
+
+def _excel_stage(RAW, frames, ACT9_F, ACT19_F):
+    return generate_bridge_excel(
+        RAW, frames["RAW2"], frames["RAW3"],
+        frames["ACTION2"], frames["ACTION3"], frames["ACTION5"], frames["ACTION6"],
+        frames["ACTION7"], frames["ACTION8"], frames["ACTION9"],
+        _sub_count(ACT9_F, "Standard/Non-Standard", "Standard"),
+        _sub_count(ACT9_F, "Standard/Non-Standard", "Non-Standard"),
+        frames["ACTION15"], frames["ACTION16"], frames["ACTION17"], frames["ACTION18"],
+        frames["ACTION19"],
+        _sub_count(ACT19_F, "Action 19 Sub-Category", "Standard Bridge"),
+        _sub_count(ACT19_F, "Action 19 Sub-Category", "Severe Deterioration"),
+        _sub_count(ACT19_F, "Action 19 Sub-Category", "Not Permitted"),
+        _sub_count(ACT19_F, "Action 19 Sub-Category", "Bridge was load tested."),
+        frames["ACTION20"], frames["ACTION21"], frames["ACTION22"]
+    )
+
+
+def _raw2_stage(RAW, ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F,
+                ACT19_F, ACT20, ACT21, ACT22_F, keys):
+    return make_RAW2(RAW, ACT7, ACT8, ACT9_F, ACT15_F, ACT16_F, ACT17_F, ACT18_F,
+                     ACT19_F, ACT20, ACT21, ACT22_F, keys=keys)[0]
+
+
+def _raw3_stage(RAW, ACT8, keys):
+    return run_action8m_and_raw3(RAW, ACT8, keys=keys)[1]
+
+
+def _no_previous_run():
+    return None
+
+
+# Stages of Actions 7-22, which read RAW only (not the Action 8 upload)
+ACTIONS_7_22 = ["ACT7", "ACT9_F", "ACT15_F", "ACT16_F", "ACT17_F", "ACT18_F",
+                "ACT19_F", "ACT20", "ACT21", "ACT22_F"]
+_RESULTS = ["ACT2", "ACT3", "ACT5", "ACT6", "ACT7", "ACT8", "ACT9_F", "ACT15_F",
+            "ACT16_F", "ACT17_F", "ACT18_F", "ACT19_F", "ACT20", "ACT21", "ACT22_F"]
+
+# Stage name -> (function, names of its inputs); the inputs are passed in order.
+# RAW_loaded and ACT8_loaded (the parsed uploads) are given to run_pipeline,
+# and `previous` (the state of an earlier run, see run_state) if there is one.
+# Actions go through run_action, which memoizes them on the columns they read.
+PIPELINE = {
+    "RAW": (raw_file, ["RAW_loaded"]),
+    "ACT8": (act8_fil, ["ACT8_loaded"]),
+    "previous": (_no_previous_run, []),
+    "ctx": (functools.partial(_context_stage, "RAW"), ["RAW", "previous"]),
+    "ACT7": (functools.partial(run_action, "action7"), ["RAW", "ctx"]),
+    "ACT9_F": (functools.partial(run_action, "action9"), ["RAW", "ctx"]),
+    "ACT15_F": (functools.partial(run_action, "action15"), ["RAW", "ctx"]),
+    "ACT16_F": (functools.partial(run_action, "action16"), ["RAW", "ctx"]),
+    "ACT17_F": (functools.partial(run_action, "action17"), ["RAW", "ctx"]),
+    "ACT18_F": (functools.partial(run_action, "action18"), ["RAW", "ctx"]),
+    "ACT19_F": (functools.partial(run_action, "action19"), ["RAW", "ctx"]),
+    "ACT20": (functools.partial(run_action, "action20"), ["RAW", "ctx"]),
+    "ACT21": (functools.partial(run_action, "action21"), ["RAW", "ctx"]),
+    "ACT22_F": (functools.partial(run_action, "action22"), ["RAW", "ctx"]),
+    "keys": (incremental_keys, ["RAW", "ctx", "previous"]),
+    # RAW2 branch: needs every Action 7-22 result
+    "RAW2": (_raw2_stage, ["RAW", "ACT7", "ACT8", "ACT9_F", "ACT15_F", "ACT16_F", "ACT17_F",
+                           "ACT18_F", "ACT19_F", "ACT20", "ACT21", "ACT22_F", "keys"]),
+    "ctx2": (functools.partial(_context_stage, "RAW2"), ["RAW2", "previous", "ctx"]),
+    "ACT2": (functools.partial(run_action, "action2"), ["RAW2", "ctx2"]),
+    "ACT3": (functools.partial(run_action, "action3"), ["RAW2", "ctx2"]),
+    # RAW3 branch: needs only RAW and ACT8, so it runs alongside the actions
+    "RAW3": (_raw3_stage, ["RAW", "ACT8", "keys"]),
+    "ctx3": (functools.partial(_context_stage, "RAW3"), ["RAW3", "previous", "ctx"]),
+    "ACT5": (functools.partial(run_action, "action5"), ["RAW3", "ctx3"]),
+    "ACT6": (functools.partial(run_action, "action6"), ["RAW3", "ctx3"]),
+    # Outputs
+    "counts": (summary_counts, ["RAW", "RAW2", "RAW3"] + _RESULTS),
+    "frames": (export_frames, ["RAW", "RAW2", "RAW3"] + _RESULTS),
+    "excel": (_excel_stage, ["RAW", "frames", "ACT9_F", "ACT19_F"]),
+    "parquet": (generate_bridge_parquet, ["frames"]),
+    "csv": (generate_bridge_csv, ["frames", "counts"]),
+    # For the next run (incremental)
+    "state": (run_state, ["keys", "ctx", "ctx2", "ctx3"] + [name for name in _RESULTS if name != "ACT8"]),
+}
+
+
+def run_pipeline(inputs, targets=None, stages=None, max_workers=None, processes=None, timings=None,
+                 profile=None):
+    """
+    Run pipeline stages on a thread pool, each one as soon as its inputs
+    are ready, so independent stages (Actions 7-22, the RAW2 and RAW3
+    branches, the exports) run at the same time.
+    - inputs: values of the names no stage produces (RAW_loaded, ACT8_loaded),
+      plus `previous` to run incrementally from an earlier run (see run_state)
+    - targets: stage names wanted (default all); only the stages they need run
+    - stages: the stage table (default PIPELINE)
+    - max_workers: threads (default PIPELINE_WORKERS)
+    - processes: worker processes for the actions (default
+      PIPELINE_PROCESSES, 0 for none). The frames are shared with the
+      workers through memory-mapped Arrow files (needs pyarrow), so the
+      regex-heavy actions are not held to one core by the GIL.
+    - timings: dict to fill with each stage's run time in seconds
+    - profile: dict to fill with each stage's record (wall and CPU time,
+      memory growth, rows in and out, cache hit / miss; see run_report)
+    Returns name -> value of the inputs and the targets. Other stage values
+    (RAW keys, evaluation contexts, ...) are let go as soon as the last
+    stage reading them has started, so they are not held for the whole run.
+    The first stage to fail stops the run and its exception is raised.
+    """
+    stages = PIPELINE if stages is None else stages
+    targets = list(stages) if targets is None else targets
+    max_workers = PIPELINE_WORKERS if max_workers is None else max_workers
+    processes = PIPELINE_PROCESSES if processes is None else processes
+
+    if not processes:
+        return _run_stages(inputs, targets, stages, max_workers, timings, profile)
+
+    folder = tempfile.mkdtemp(prefix="bridge-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    try:
+        stages = _process_stages(stages, _process_pool(processes), folder)
+        return _run_stages(inputs, targets, stages, max_workers, timings, profile)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _timed(func, name, timings):
+    def run(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[name] = time.perf_counter() - start
+    return run
+
+
+# Stage profiles (run_pipeline(profile=...), profile_call) record for each stage:
+# - function: the bridge function it runs (e.g. action7, make_RAW2)
+# - start: when it started (time.perf_counter; run_report makes it relative)
+# - wall / cpu: seconds, and CPU seconds of the thread it ran on (the work
+#   of actions run in worker processes is not counted)
+# - memory: how far the process's resident set grew above where it was at
+#   the start, at its highest while the stage ran, in bytes (Linux only,
+#   else None). Process-wide: stages running at the same time each see the
+#   others' growth too; max_workers=1 gives every stage its own figure.
+# - rows_in / rows_out: rows of its first input that has rows, and of its result
+# - cache: "hit" / "miss" for the memoized stages (parsed workbooks, actions),
+#   "patched" for actions patched from an earlier run (see patch_action)
+
+# Seconds between two readings of the resident set while stages run
+PROFILE_INTERVAL = 0.005
+
+# The record of the stage running on this thread, for _note_cache
+_STAGE = threading.local()
+
+# Stage function -> the bridge function it wraps
+_STAGE_FUNCTIONS = {
+    _raw2_stage: "make_RAW2",
+    _raw3_stage: "run_action8m_and_raw3",
+    _excel_stage: "generate_bridge_excel",
+}
+
+
+def _note_cache(state):
+    """Record a cache hit / miss on the stage running on this thread, if it is profiled."""
+    record = getattr(_STAGE, "record", None)
+    if record is not None:
+        record["cache"] = state
+
+
+def _rss():
+    """Resident set of this process in bytes, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _row_count(value):
+    """Rows of a stage value: a frame, an action result, an evaluation context or frames by sheet."""
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, tuple) and value:
+        return _row_count(value[0])
+    if isinstance(value, dict):
+        if "rows" in value:
+            return len(value["rows"])
+        if "raw" in value:
+            return len(value["raw"])
+        if value and all(isinstance(v, pd.DataFrame) for v in value.values()):
+            return sum(len(v) for v in value.values())
+    return None
+
+
+def _stage_function(func):
+    if isinstance(func, functools.partial):
+        if func.func is run_action:
+            return func.args[0]
+        func = func.func
+    return _STAGE_FUNCTIONS.get(func, func.__name__)
+
+
+def _start_sampler():
+    """Read the resident set every PROFILE_INTERVAL seconds into the peaks of the active records."""
+    sampler = {"active": {}, "lock": threading.Lock(), "stop": threading.Event(), "thread": None}
+    if _rss() is None:
+        return sampler
+
+    def sample():
+        while not sampler["stop"].wait(PROFILE_INTERVAL):
+            _sample(sampler)
+
+    sampler["thread"] = threading.Thread(target=sample, name="bridge-profile", daemon=True)
+    sampler["thread"].start()
+    return sampler
+
+
+def _sample(sampler):
+    rss = _rss()
+    if rss is None:
+        return
+    with sampler["lock"]:
+        for peak in sampler["active"].values():
+            peak[0] = max(peak[0], rss)
+
+
+def _stop_sampler(sampler):
+    sampler["stop"].set()
+    if sampler["thread"] is not None:
+        sampler["thread"].join()
+
+
+def _profiled(func, name, profile, sampler):
+    label = _stage_function(func)
+
+    def run(*args):
+        rows = [_row_count(arg) for arg in args]
+        record = {
+            "stage": name, "function": label, "start": time.perf_counter(),
+            "wall": None, "cpu": None, "memory": None,
+            "rows_in": next((n for n in rows if n is not None), None), "rows_out": None,
+            "cache": None,
+        }
+        before = _rss()
+        peak = [before or 0]
+        with sampler["lock"]:
+            sampler["active"][id(record)] = peak
+        _STAGE.record = record
+        cpu = time.thread_time()
+        try:
+            result = func(*args)
+            record["rows_out"] = _row_count(result)
+            return result
+        finally:
+            record["cpu"] = time.thread_time() - cpu
+            record["wall"] = time.perf_counter() - record["start"]
+            _STAGE.record = None
+            _sample(sampler)
+            with sampler["lock"]:
+                del sampler["active"][id(record)]
+            if before is not None:
+                record["memory"] = max(peak[0] - before, 0)
+            profile[name] = record
+    return run
+
+
+def profile_call(profile, name, func, *args):
+    """
+    func(*args), recorded in `profile` as stage `name` like the stages of
+    run_pipeline(profile=...) (e.g. reading the uploads). Without a profile
+    (None) it is simply called.
+    """
+    if profile is None:
+        return func(*args)
+    sampler = _start_sampler()
+    try:
+        return _profiled(func, name, profile, sampler)(*args)
+    finally:
+        _stop_sampler(sampler)
+
+
+def run_report(profile, **fields):
+    """
+    JSON-ready report of a run: `fields` (e.g. the counts), the total
+    wall and CPU seconds, and every stage's record in `profile` in the order
+    they started, `start` in seconds from the first one.
+    """
+    stages = sorted(profile.values(), key=lambda record: record["start"])
+    origin = stages[0]["start"] if stages else 0.0
+    stages = [{**record, "start": record["start"] - origin} for record in stages]
+    return {
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        **fields,
+        "wall": max((record["start"] + (record["wall"] or 0) for record in stages), default=0.0),
+        "cpu": sum(record["cpu"] or 0 for record in stages),
+        "stages": stages,
+    }
+
+
+def _run_stages(inputs, targets, stages, max_workers, timings=None, profile=None):
+    if profile is None:
+        return _run_needed(inputs, targets, stages, max_workers, timings)
+    sampler = _start_sampler()
+    try:
+        return _run_needed(inputs, targets, stages, max_workers, timings, profile, sampler)
+    finally:
+        _stop_sampler(sampler)
+
+
+def _run_needed(inputs, targets, stages, max_workers, timings=None, profile=None, sampler=None):
+
+    #Stages needed for the targets.
+    needed = set()
+    todo = [name for name in targets if name not in inputs]
+    while todo:
+        name = todo.pop()
+        if name in needed:
+            continue
+        if name not in stages:
+            raise KeyError(f"No pipeline stage or input named {name!r}")
+        needed.add(name)
+        todo.extend(dep for dep in stages[name][1] if dep not in inputs)
+
+    #Stages still to start that read each value; the values of other stages
+    #are dropped once the last of them has started.
+    readers = {}
+    for name in needed:
+        for dep in stages[name][1]:
+            readers[dep] = readers.get(dep, 0) + 1
+    keep = set(inputs) | set(targets)
+
+    values = dict(inputs)
+    waiting = {name for name in stages if name in needed}
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            for name in sorted(waiting, key=list(stages).index):
+                func, deps = stages[name]
+                if all(dep in values for dep in deps):
+                    waiting.discard(name)
+                    if profile is not None:
+                        func = _profiled(func, name, profile, sampler)
+                    if timings is not None:
+                        func = _timed(func, name, timings)
+                    running[pool.submit(func, *[values[dep] for dep in deps])] = name
+                    for dep in deps:
+                        readers[dep] -= 1
+                        if not readers[dep] and dep not in keep:
+                            del values[dep]
+            if not running:
+                raise ValueError(f"Pipeline stages depend on each other: {sorted(waiting)}")
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    for other in running:
+                        other.cancel()
+                    raise future.exception()
+                values[name] = future.result()
+
+    return values
+
+
+# -------------------------------
+# Streaming Large RAW Files
+# -------------------------------
+#
+# For RAW files too big to load at once (e.g. a multi-year, multi-state
+# history), stream_files reads RAW from Parquet or CSV one chunk at a time.
+# Every action decides on each row by itself, so it runs on each chunk and
+# the rows it keeps are appended to its sheet. Results that join several
+# subsets (Action 9's Standard / Non-Standard, Action 19's sub-categories,
+# ...) are appended per subset and joined in order at the end.
+# What spans chunks is kept as 128-bit fingerprints only: the rows and
+# keys already seen (the duplicates dropped) and the keys claimed by the
+# actions and the Action 8 upload (the RAW2 and RAW3 anti-joins). Unlike
+# make_RAW2, fingerprint matches are not checked against the key values
+# (two different keys collide with a chance of about 2**-128).
+
+# RAW rows read per chunk
+STREAM_CHUNK_ROWS = int(os.environ.get("BRIDGE_STREAM_ROWS", 100000))
+
+# Pass 1 (RAW, then RAW3) and pass 2 (RAW2): action -> sheet
+_STREAM_RAW = {"action7": "ACTION7", "action9": "ACTION9", "action15": "ACTION15",
+               "action16": "ACTION16", "action17": "ACTION17", "action18": "ACTION18",
+               "action19": "ACTION19", "action20": "ACTION20", "action21": "ACTION21",
+               "action22": "ACTION22"}
+_STREAM_RAW3 = {"action5": "ACTION5", "action6": "ACTION6"}
+_STREAM_RAW2 = {"action2": "ACTION2", "action3": "ACTION3"}
+
+
+def _csv_dtypes(path, chunk_rows):
+    """
+    Type of each column of a CSV file as reading the whole file would give
+    it, found chunk by chunk: numbers only as int64/float64, booleans only
+    as bool, anything else as object (text).
+    """
+    kinds = {}
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        for col, dtype in chunk.dtypes.items():
+            kinds.setdefault(col, set()).add(dtype.kind)
+
+    dtypes = {}
+    for col, found in kinds.items():
+        if found == {"i"}:
+            dtypes[col] = "int64"
+        elif found <= {"i", "f"}:
+            dtypes[col] = "float64"
+        elif found == {"b"}:
+            dtypes[col] = "bool"
+        else:
+            dtypes[col] = object
+    return dtypes
+
+
+def read_chunks(path, chunk_rows=None, dtype=None):
+    """
+    RAW from a Parquet or CSV file as DataFrames of at most chunk_rows rows
+    (default STREAM_CHUNK_ROWS), indexed by their row number in the file.
+    Columns are typed as reading the whole file would type them:
+    - Parquet: integer columns with missing values as float64
+    - CSV: dtype, column -> type (default found by a first pass, see _csv_dtypes)
+    """
+    chunk_rows = chunk_rows or STREAM_CHUNK_ROWS
+    name = path.lower()
+    if name.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        source = pq.ParquetFile(path)
+        meta = source.metadata
+        schema = source.schema_arrow
+        floats = [
+            i for i, field in enumerate(schema)
+            if pa.types.is_integer(field.type) and any(
+                meta.row_group(g).column(i).statistics is None
+                or meta.row_group(g).column(i).statistics.null_count
+                for g in range(meta.num_row_groups)
+            )
+        ]
+        for i in floats:
+            schema = schema.set(i, schema.field(i).with_type(pa.float64()))
+        chunks = (
+            pa.Table.from_batches([batch]).cast(schema).to_pandas()
+            for batch in source.iter_batches(batch_size=chunk_rows)
+        )
+    elif name.endswith(".csv"):
+        if dtype is None:
+            dtype = _csv_dtypes(path, chunk_rows)
+        chunks = pd.read_csv(path, chunksize=chunk_rows, dtype=dtype)
+    else:
+        raise ValueError(f"{path}: only Parquet and CSV files can be streamed")
+
+    start = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        start += len(chunk)
+        yield chunk
+
+
+def _first_seen(seen, fp):
+    """
+    Mask of the fingerprints in fp seen for the first time (neither in
+    `seen` nor earlier in fp), which are then added to seen.
+    seen is a list of sorted runs, each under half the size of the one
+    before it, so a lookup searches O(log n) runs and a fingerprint is
+    re-sorted O(log n) times as the runs are merged.
+    """
+    new = np.zeros(len(fp), dtype=bool)
+    new[np.unique(fp, return_index=True)[1]] = True
+    for run in seen:
+        new[new] = ~_found(run, fp[new])
+
+    run = np.sort(fp[new])
+    while seen and len(seen[-1]) <= 2 * len(run):
+        run = np.sort(np.concatenate([seen.pop(), run]))
+    seen.append(run)
+    return new
+
+
+def _unique_chunk(chunk, seen):
+    """raw_file() of one chunk: rows already seen in earlier chunks dropped too."""
+    return set_column_dtypes(chunk[_first_seen(seen, _fingerprints(chunk))])
+
+
+def _append(folder, sheet, chunk_no, df, parts=None):
+    """
+    Write a chunk's rows of a sheet (split into the result's parts) as
+    FOLDER/SHEET/PART-CHUNK.parquet; empty pieces only for the first chunk,
+    which keeps the columns of a sheet no chunk adds rows to.
+    """
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.join(folder, sheet), exist_ok=True)
+    start = 0
+    for part, n in enumerate(parts or [len(df)]):
+        if n or chunk_no == 0:
+            path = os.path.join(folder, sheet, f"{part}-{chunk_no:06d}.parquet")
+            pq.write_table(_parquet_table(df.iloc[start:start + n]), path)
+        start += n
+    return len(df)
+
+
+def _joined_type(types):
+    """One Arrow type for a column the pieces of a sheet store as `types`."""
+    import pyarrow as pa
+
+    types = {t.value_type if pa.types.is_dictionary(t) else t for t in types} - {pa.null()}
+    if len(types) <= 1:
+        return types.pop() if types else pa.null()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types):
+        return pa.float64() # Whole numbers in some chunks, decimals or missing in others
+    return pa.string()
+
+
+def _join_pieces(folder, sheet, path):
+    """Write the pieces of a sheet, parts in order and chunks in order, as one Parquet file."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pieces = sorted(glob.glob(os.path.join(folder, sheet, "*.parquet")))
+    schemas = [pq.read_schema(piece) for piece in pieces]
+    schema = pa.schema([
+        (name, _joined_type({s.field(i).type for s in schemas}))
+        for i, name in enumerate(schemas[0].names)
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for piece in pieces:
+            writer.write_table(pq.read_table(piece).cast(schema))
+
+
+def stream_files(raw_path, act8_path, output_dir, chunk_rows=None, plan=None):
+    """
+    Run the metrics on a RAW file too big to load at once (Parquet or CSV,
+    read chunk_rows rows at a time, see read_chunks) and an Action 8
+    workbook, writing one Parquet file per sheet (e.g. ACTION7.parquet)
+    into output_dir. Memory is bounded by the chunk size, plus 16 bytes per
+    RAW row and per claimed key for the fingerprints. RAW is read twice:
+    - pass 1: Actions 7-22 on RAW, and RAW3 with Actions 5/6 (RAW3 needs
+      only the Action 8 keys)
+    - pass 2: RAW2 with Actions 2/3 (RAW2 needs the keys every Action 7-22
+      row claims, so all of pass 1)
+    Returns a dict like run_files: counts, timings, seconds, written.
+    """
+    plan = compile_rules() if plan is None else plan
+    dtype = _csv_dtypes(raw_path, chunk_rows or STREAM_CHUNK_ROWS) if raw_path.lower().endswith(".csv") else None
+    timings = {}
+    start = time.perf_counter()
+    ACT8 = act8_fil(load_workbook(act8_path))
+    timings["load ACT8"] = time.perf_counter() - start
+
+    os.makedirs(output_dir, exist_ok=True)
+    folder = tempfile.mkdtemp(prefix="bridge-stream-", dir=output_dir)
+    rows = dict.fromkeys(["RAW2", "RAW3"] + list(_STREAM_RAW.values())
+                         + list(_STREAM_RAW2.values()) + list(_STREAM_RAW3.values()), 0)
+    try:
+        #Pass 1: Actions 7-22 and RAW3 (Actions 5/6), keys claimed for RAW2.
+        seen, claimed, raw_rows = [], [], 0
+        for chunk_no, chunk in enumerate(read_chunks(raw_path, chunk_rows, dtype)):
+            RAW = _unique_chunk(chunk, seen)
+            raw_rows += len(RAW)
+            if chunk_no == 0:
+                first42 = RAW.columns[:42].tolist()
+                act8_fp = np.sort(_fingerprints(_action8m(ACT8, first42)[1][first42]))
+                claimed.append(_fingerprints(_act8_keys(ACT8, first42)))
+            raw2_keys, raw3_keys = normalize_keys(RAW, first42)
+            raw2_fp = _fingerprints(raw2_keys)
+
+            ctx = build_action_context(RAW, plan=plan)
+            for action, sheet in _STREAM_RAW.items():
+                result = ACTIONS[action](RAW, ctx)
+                rows[sheet] += _append(folder, sheet, chunk_no, materialize(RAW, result), result["parts"])
+                claimed.append(_claimed_keys(RAW, raw2_keys, raw2_fp, result, _fingerprints)[1])
+
+            RAW3 = _keyed_rows(RAW, ~_found(act8_fp, _fingerprints(raw3_keys)), raw3_keys)
+            rows["RAW3"] += _append(folder, "RAW3", chunk_no, RAW3)
+            ctx3 = build_action_context(RAW3, plan=plan)
+            for action, sheet in _STREAM_RAW3.items():
+                result = ACTIONS[action](RAW3, ctx3)
+                rows[sheet] += _append(folder, sheet, chunk_no, materialize(RAW3, result), result["parts"])
+        if not claimed:
+            raise ValueError(f"No rows in {raw_path}")
+        claimed = np.unique(np.concatenate(claimed))
+        timings["pass 1"] = time.perf_counter() - start - timings["load ACT8"]
+
+        #Pass 2: RAW2 (first row of each key, not claimed) and Actions 2/3.
+        seen, keys_seen = [], []
+        for chunk_no, chunk in enumerate(read_chunks(raw_path, chunk_rows, dtype)):
+            RAW = _unique_chunk(chunk, seen)
+            raw2_keys = normalize_keys(RAW, first42)[0]
+            raw2_fp = _fingerprints(raw2_keys)
+            keep = _first_seen(keys_seen, raw2_fp) & ~_found(claimed, raw2_fp)
+
+            RAW2 = _keyed_rows(RAW, keep, raw2_keys)
+            rows["RAW2"] += _append(folder, "RAW2", chunk_no, RAW2)
+            ctx2 = build_action_context(RAW2, plan=plan)
+            for action, sheet in _STREAM_RAW2.items():
+                result = ACTIONS[action](RAW2, ctx2)
+                rows[sheet] += _append(folder, sheet, chunk_no, materialize(RAW2, result), result["parts"])
+        timings["pass 2"] = time.perf_counter() - start - timings["load ACT8"] - timings["pass 1"]
+
+        #One file per sheet, in workbook order.
+        _append(folder, "ACTION8", 0, ACT8)
+        rows["ACTION8"] = len(ACT8)
+        written = []
+        for sheet in ["RAW2", "RAW3", "ACTION7", "ACTION8", "ACTION9", "ACTION15", "ACTION16",
+                      "ACTION17", "ACTION18", "ACTION19", "ACTION20", "ACTION21", "ACTION22",
+                      "ACTION2", "ACTION3", "ACTION5", "ACTION6"]:
+            path = os.path.join(output_dir, sheet + ".parquet")
+            _join_pieces(folder, sheet, path)
+            written.append(path)
+        timings["write sheets"] = time.perf_counter() - start - sum(timings.values())
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    counts = {
+        "Action 8 (Uploaded)" if n == 8 else f"Action {n}": rows[f"ACTION{n}"]
+        for n in [2, 3, 5, 6, 7, 8, 9, 15, 16, 17, 18, 19, 20, 21, 22]
+    }
+    counts["RAW (Original)"] = raw_rows
+    counts["RAW2 (RAW - Actions 7-22)"] = rows["RAW2"]
+    counts["RAW3 (RAW - Action 8)"] = rows["RAW3"]
+
+    return {
+        "counts": counts,
+        "timings": timings,
+        "seconds": time.perf_counter() - start,
+        "written": written,
+    }
+
+
+# -------------------------------
+# Command Line
+# -------------------------------
+
+# Output format -> (pipeline stage, file name)
+CLI_OUTPUTS = {
+    "xlsx": ("excel", "Bridge_Metrics_Output.xlsx"),
+    "parquet": ("parquet", "Bridge_Metrics_Output_parquet.zip"),
+    "csv": ("csv", "Bridge_Metrics_Output_csv.zip"),
+}
+
+
+def _expand(patterns):
+    paths = []
+    for pattern in patterns:
+        found = sorted(glob.glob(pattern))
+        if not found:
+            raise FileNotFoundError(f"No files match {pattern!r}")
+        paths.extend(found)
+    return paths
+
+
+def input_pairs(raw_patterns, act8_patterns):
+    """
+    (RAW path, Action 8 path) pairs from file names or glob patterns,
+    paired in sorted order (e.g. 2024Q1/RAW.xlsx with 2024Q1/ACT8.xlsx).
+    """
+    raws = _expand(raw_patterns)
+    act8s = _expand(act8_patterns)
+    if len(raws) != len(act8s):
+        raise ValueError(f"{len(raws)} RAW files but {len(act8s)} Action 8 files")
+    return list(zip(raws, act8s))
+
+
+def _output_names(paths):
+    """Output folder name per RAW path: its path below their common folder."""
+    if len(paths) == 1:
+        return [os.path.splitext(os.path.basename(paths[0]))[0]]
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    return [
+        os.path.splitext(os.path.relpath(os.path.abspath(p), root))[0].replace(os.sep, "_")
+        for p in paths
+    ]
+
+
+def run_files(raw_path, act8_path, output_dir, formats=("xlsx",), processes=None, state=None,
+              report=False):
+    """
+    Run the pipeline on one RAW / Action 8 file pair and write the chosen
+    output formats (see CLI_OUTPUTS) into output_dir.
+    With `state` (a file path), the run starts from the state saved there
+    by an earlier run, if any (see run_state), and saves its own there.
+    With `report`, every stage is profiled and the run report (see
+    run_report) is written to output_dir as run_report.json.
+    Returns a dict:
+    - counts: the summary counts
+    - timings: seconds per stage, including loading each workbook
+    - seconds: wall time of the whole pair
+    - written: paths of the files written
+    """
+    timings = {}
+    profile = {} if report else None
+    start = time.perf_counter()
+    RAW_loaded = profile_call(profile, "load RAW", load_workbook, raw_path)
+    timings["load RAW"] = time.perf_counter() - start
+    ACT8_loaded = profile_call(profile, "load ACT8", load_workbook, act8_path)
+    timings["load ACT8"] = time.perf_counter() - start - timings["load RAW"]
+
+    inputs = {"RAW_loaded": RAW_loaded, "ACT8_loaded": ACT8_loaded}
+    targets = ["counts"] + [CLI_OUTPUTS[fmt][0] for fmt in formats]
+    if state:
+        previous = load_state(state)
+        if previous is not None:
+            inputs["previous"] = previous
+        targets.append("state")
+    results = run_pipeline(inputs, targets=targets, processes=processes, timings=timings, profile=profile)
+    if state:
+        save_state(results["state"], state)
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    for fmt in formats:
+        stage, name = CLI_OUTPUTS[fmt]
+        path = os.path.join(output_dir, name)
+        with open(path, "wb") as f:
+            f.write(results[stage].getvalue())
+        written.append(path)
+    if report:
+        path = os.path.join(output_dir, "run_report.json")
+        with open(path, "w") as f:
+            json.dump(run_report(profile, raw=raw_path, act8=act8_path, counts=results["counts"]), f, indent=2)
+        written.append(path)
+
+    return {
+        "counts": results["counts"],
+        "timings": timings,
+        "seconds": time.perf_counter() - start,
+        "written": written,
+    }
+
+
+def _report(raw_path, act8_path, run):
+    """Counts and per-stage timings (slowest first) of one file pair."""
+    counts, timings = run["counts"], run["timings"]
+    stages = sorted(timings, key=lambda name: -timings[name])
+    width = max(len(name) for name in list(counts) + stages)
+    lines = [f"{raw_path} + {act8_path} ({run['seconds']:.1f}s)"]
+    lines += [f"  {name:<{width}}  {count:>7}" for name, count in counts.items()]
+    lines += ["  Stage timings:"]
+    lines += [f"  {name:<{width}}  {timings[name]:>7.2f}s" for name in stages]
+    lines += [f"  wrote {path}" for path in run["written"]]
+    return "\n".join(lines)
+
+
+def _run_all(pairs, folders, jobs, run):
+    """(pair, run(RAW path, Action 8 path, folder) result, exception) of every pair, as each finishes."""
+    if jobs == 1:
+        for pair, folder in zip(pairs, folders):
+            try:
+                yield pair, run(*pair, folder), None
+            except Exception as e:
+                yield pair, None, e
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(jobs, mp_context=_mp_context()) as pool:
+        futures = {
+            pool.submit(run, *pair, folder): pair
+            for pair, folder in zip(pairs, folders)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m bridge",
+        description="Compute the bridge metrics for RAW / Action 8 workbook pairs without the Streamlit app."
+    )
+    parser.add_argument("--raw", nargs="+", required=True, metavar="PATH",
+                        help="RAW workbooks (file names or glob patterns)")
+    parser.add_argument("--act8", nargs="+", required=True, metavar="PATH",
+                        help="Action 8 workbooks, paired with the RAW files in sorted order")
+    parser.add_argument("-o", "--output", default="bridge_output", metavar="DIR",
+                        help="output folder, one sub-folder per pair (default: %(default)s)")
+    parser.add_argument("-f", "--formats", nargs="+", choices=list(CLI_OUTPUTS), default=["xlsx"],
+                        help="outputs to write (default: xlsx)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="pairs processed at once, in worker processes (default: CPU count)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes for the actions of each pair (default: BRIDGE_PROCESSES or 0)")
+    parser.add_argument("--chunk-rows", type=int, default=None, metavar="N",
+                        help="stream RAW files too big to load (Parquet or CSV) N rows at a time and "
+                             "write one Parquet file per sheet instead of --formats")
+    parser.add_argument("--state", default=None, metavar="PATH",
+                        help="state file of incremental runs: each pair starts from the state of the run "
+                             "before it (pairs then run one at a time) and saves its own")
+    parser.add_argument("--report", action="store_true",
+                        help="profile every stage (wall and CPU time, memory, rows, cache hits) and "
+                             "write run_report.json into each pair's folder")
+    args = parser.parse_args(argv)
+    if args.state and args.chunk_rows:
+        parser.error("--state cannot be used with --chunk-rows")
+    if args.report and args.chunk_rows:
+        parser.error("--report cannot be used with --chunk-rows")
+
+    try:
+        pairs = input_pairs(args.raw, args.act8)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+    folders = [os.path.join(args.output, name) for name in _output_names([raw for raw, _ in pairs])]
+    jobs = 1 if args.state else max(1, min(len(pairs), args.jobs or os.cpu_count() or 1))
+    if args.chunk_rows:
+        run = functools.partial(stream_files, chunk_rows=args.chunk_rows)
+    else:
+        run = functools.partial(run_files, formats=args.formats, processes=args.processes, state=args.state,
+                                report=args.report)
+
+    failed = 0
+    start = time.perf_counter()
+    for (raw_path, act8_path), run, error in _run_all(pairs, folders, jobs, run):
+        if error is not None:
+            failed += 1
+            print(f"{raw_path} + {act8_path}: failed: {type(error).__name__}: {error}", file=sys.stderr)
+        else:
+            print(_report(raw_path, act8_path, run))
+
+    print(f"{len(pairs) - failed} of {len(pairs)} pairs done in {time.perf_counter() - start:.1f}s")
+    return 1 if failed else 0
+
+
+# In[ ]:
 
 
+if __name__ == "__main__":
+    sys.exit(main())